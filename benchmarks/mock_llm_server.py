@@ -0,0 +1,179 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Mock Ollama /api/generate servers for exercising the doc generators
+without a model:
+
+    python benchmarks/mock_llm_server.py --ports 11501 11502 --delay 0.5 --parallel 2
+
+Each port answers like one Ollama instance: at most `--parallel` requests
+are served at once (the rest wait, as with OLLAMA_NUM_PARALLEL), each takes
+`--delay` seconds and returns a short Markdown stub (one
+`=== BEGIN name ===` block per function for packed prompts). `--fail-rate` makes a
+fraction of the requests fail with HTTP 500; for a dead backend, list a
+port nothing listens on in `llm_url`. GET / returns the counters of a
+port as JSON.
+
+Streamed requests (`"stream": true`) get one NDJSON chunk per word.
+`--stall-rate` makes a fraction of them stop sending halfway (the
+connection stays open) and `--loop-rate` makes a fraction repeat the same
+sentence until the client hangs up.
+
+`--model-delay small=0.1` gives a model its own delay, to try model tiering
+(`llm_tiers`) with a fast and a slow model.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(port, args):
+    slots = threading.Semaphore(args.parallel)
+    lock = threading.Lock()
+    counters = {"requests": 0, "active": 0, "max_active": 0, "failed": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with lock:
+                self.reply(200, dict(counters, port=port))
+
+        def send_chunk(self, payload):
+            line = json.dumps(payload).encode("utf-8") + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def stream(self, data, text, delay):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = text.split(" ")
+            stall, loop = random.random() < args.stall_rate, random.random() < args.loop_rate
+            try:
+                for i, word in enumerate(words):
+                    if stall and i == len(words) // 2:
+                        time.sleep(3600)
+                    self.send_chunk({"model": data.get("model"), "response": word + " ", "done": False})
+                while loop:
+                    self.send_chunk({"model": data.get("model"), "response": "The value is updated. ", "done": False})
+                    time.sleep(0.001)
+                self.send_chunk({"model": data.get("model"), "response": "", "done": True,
+                                 "eval_count": len(words), "eval_duration": int(delay * 1e9)})
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            delay = args.model_delays.get(data.get("model"), args.delay)
+            with lock:
+                counters["requests"] += 1
+            with slots:
+                with lock:
+                    counters["active"] += 1
+                    counters["max_active"] = max(counters["max_active"], counters["active"])
+                time.sleep(delay)
+                with lock:
+                    counters["active"] -= 1
+
+            if random.random() < args.fail_rate:
+                with lock:
+                    counters["failed"] += 1
+                self.reply(500, {"error": "mock failure"})
+                return
+
+            prompt = data.get("prompt", "")
+            first = next((line for line in prompt.splitlines() if line.strip()), "")
+            text = f"# Mock response ({port})\n\n{first.strip()}\n\nPrompt: {len(prompt)} bytes.\n"
+            if "=== BEGIN" in prompt:
+                text = "".join(f"=== BEGIN {name} ===\n# {name}\n\n## Purpose\nMock ({port}).\n=== END {name} ===\n"
+                               for name in re.findall(r"^Function: (.+)$", prompt, re.M))
+            if data.get("stream"):
+                self.stream(data, text, delay)
+                return
+            self.reply(200, {
+                "model": data.get("model"),
+                "response": text,
+                "done": True,
+                "prompt_eval_count": len(prompt) // 4,
+                "eval_count": len(text.split()),
+                "eval_duration": int(delay * 1e9),
+            })
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Ollama servers")
+    parser.add_argument("--ports", type=int, nargs="+", default=[11501])
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds per request")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests served at once per port")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of streams that stop halfway")
+    parser.add_argument("--loop-rate", type=float, default=0.0, help="Fraction of streams that repeat themselves forever")
+    parser.add_argument("--model-delay", nargs="*", default=[], metavar="MODEL=SECONDS",
+                        help="Per-model delay instead of --delay")
+    args = parser.parse_args(argv)
+    args.model_delays = {m: float(d) for m, d in (spec.rsplit("=", 1) for spec in args.model_delay)}
+    return args
+
+
+def start(args):
+    """Serve every port on a background thread; returns the servers (shutdown() them when done)."""
+    servers = []
+    for port in args.ports:
+        server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(port, args))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def main():
+    args = parse_args()
+    servers = start(args)
+    for port in args.ports:
+        print(f"mock LLM on http://127.0.0.1:{port}/api/generate")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
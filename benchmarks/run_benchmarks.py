@@ -0,0 +1,251 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmark every pipeline step and the offline generators on synthetic
+projects (see synth_project.py) at several sizes.
+
+    # record a baseline on this machine
+    python benchmarks/run_benchmarks.py --sizes small medium --save-baseline
+
+    # later: compare, exit code 1 if a step got slower than the threshold
+    python benchmarks/run_benchmarks.py --sizes small medium
+
+Each step runs `--repeat` times from a clean analysis directory and the
+fastest run is kept. On `compile_commands` projects a `--since HEAD` run
+after editing one header is timed too; it fails the benchmark when it does
+not reparse exactly the TUs that include that header. A result is a
+regression when it is more than `--threshold` (relative) and `--min-delta`
+seconds (absolute) slower than the baseline. Baselines are machine specific
+and are not committed.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "extractor"))
+sys.path.insert(0, str(HERE.parent / "orchestrator" / "script"))
+
+from synth_project import KINDS, SynthSpec, generate
+from pipeline.base import PipelineContext, save_json
+from pipeline.header_deps import HeaderGraph, header_deps_path
+from pipeline.parallel_extractor import ParallelExtractor
+from pipeline.steps import build_steps, skip_reason
+from pipeline.tu_cache import cache_dir
+
+SIZES = {
+    "small": dict(files=10, functions=10, fan_out=3, threads=4, headers=5),
+    "medium": dict(files=50, functions=20, fan_out=4, threads=8, headers=20),
+    "large": dict(files=200, functions=30, fan_out=5, threads=16, headers=60),
+}
+
+# Generators that do not need an LLM endpoint
+OFFLINE_GENERATORS = ["report", "graph", "mermaid"]
+
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+
+def timed(fn, quiet):
+    out = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+        fn()
+    return time.perf_counter() - started
+
+
+def bench_since(config, args):
+    """
+    Commit the project, edit one header and time a `--since HEAD` extraction.
+    Returns (seconds, problem): problem is set when the run did not reparse
+    exactly the TUs that include the header.
+    """
+    root = config["project_root"]
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+    try:
+        with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("analysis/\nlogs/\n")
+        for cmd in (["init", "-q"], ["add", "-A"], ["commit", "-q", "--allow-empty", "-m", "synth"]):
+            subprocess.run(git + cmd, cwd=root, check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        return None, f"git unavailable: {e}"
+
+    cfg = dict(config, since="HEAD", jobs=1)
+    shutil.rmtree(cache_dir(cfg), ignore_errors=True)
+    timed(lambda: ParallelExtractor(cfg).run(PipelineContext()), quiet=not args.verbose)
+
+    header = os.path.join(root, "Inc", "hdr_000.h")
+    with open(header, "a", encoding="utf-8") as f:
+        f.write("/* edited */\n")
+    ctx = PipelineContext(run_summary={})
+    seconds = timed(lambda: ParallelExtractor(cfg).run(ctx), quiet=not args.verbose)
+
+    expected = len(HeaderGraph.load(header_deps_path(cfg)).tus_of(header))
+    reparsed = ctx["run_summary"]["since"]["tus_reparsed"]
+    if not expected or reparsed != expected:
+        return seconds, f"--since reparsed {reparsed} TU(s) after editing {header}, expected {expected}"
+    return seconds, None
+
+
+def bench_project(kind, size, work_dir, args):
+    results = {}
+    spec = SynthSpec(kind=kind, **SIZES[size])
+    project_dir = os.path.join(work_dir, f"{kind}_{size}")
+
+    seconds = timed(lambda: generate(project_dir, spec, args.libclang), quiet=True)
+    results[f"{kind}/{size}/synth_generate"] = seconds
+
+    config_path = os.path.join(project_dir, "config.json")
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    runs = {}
+    for _ in range(args.repeat):
+        # Cold runs: the detail and IR steps would otherwise reuse the previous outputs
+        shutil.rmtree(os.path.dirname(config["functions_index"]), ignore_errors=True)
+        ctx = PipelineContext()
+        for step in build_steps(config, force=True):
+            if skip_reason(config, ctx, step):
+                continue
+            runs.setdefault(step.name, []).append(timed(lambda: step.run(ctx), quiet=not args.verbose))
+
+    for name, times in runs.items():
+        results[f"{kind}/{size}/{name}"] = min(times)
+
+    if kind == "compile_commands":
+        seconds, problem = bench_since(config, args)
+        if problem:
+            print(f"  [FAIL] {kind}/{size}: {problem}")
+            args.failures.append(problem)
+        if seconds is not None:
+            results[f"{kind}/{size}/since_header_edit"] = seconds
+
+    if kind != "csharp":
+        from stages import run_in_process, script_path
+
+        for stage in args.generators:
+            times = []
+            for _ in range(args.repeat):
+                codes = []
+                try:
+                    times.append(timed(
+                        lambda: codes.append(run_in_process(script_path(stage), ["--config", config_path])),
+                        quiet=not args.verbose,
+                    ))
+                except ImportError as e:
+                    codes.append(f"missing dependency: {e.name}")
+                if codes[-1] != 0:
+                    print(f"  [skip] {stage} on {kind}/{size}: {codes[-1]}")
+                    break
+            else:
+                results[f"{kind}/{size}/gen_{stage}"] = min(times)
+
+    return results
+
+
+def compare(results, baseline, threshold, min_delta):
+    regressions = []
+    print(f"\n{'benchmark':<60} {'baseline':>9} {'current':>9} {'delta':>8}")
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<60} {'-':>9} {current:>9.3f} {'new':>8}")
+            continue
+        delta = (current - base) / base if base > 0 else 0.0
+        regressed = current > base * (1 + threshold) and current - base > min_delta
+        flag = "  << REGRESSION" if regressed else ""
+        print(f"{key:<60} {base:>9.3f} {current:>9.3f} {delta:>+7.0%}{flag}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Firmware Lens on synthetic projects")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--generators", nargs="*", default=OFFLINE_GENERATORS,
+                        help="Generator stages to time (docs/details need a running LLM)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown (default 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="Ignore slowdowns below this many seconds")
+    parser.add_argument("--out", help="Also write the results JSON here")
+    parser.add_argument("--work-dir", help="Where to generate projects (default: a temporary directory)")
+    parser.add_argument("--libclang", default=os.environ.get("LIBCLANG_PATH"))
+    parser.add_argument("--verbose", action="store_true", help="Show step output")
+    args = parser.parse_args()
+    args.failures = []
+
+    if args.libclang:
+        from clang.cindex import Config
+        Config.set_library_file(args.libclang)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fl_bench_") as tmp:
+        work_dir = args.work_dir or tmp
+        for size in args.sizes:
+            for kind in args.kinds:
+                print(f"=== {kind} / {size} ===")
+                results.update(bench_project(kind, size, work_dir, args))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "repeat": args.repeat,
+        },
+        "results": {k: round(v, 4) for k, v in results.items()},
+    }
+    if args.out:
+        save_json(args.out, report)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    regressions = compare(report["results"], baseline, args.threshold, args.min_delta)
+
+    if args.save_baseline:
+        save_json(args.baseline, report)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if args.failures:
+        print(f"\n{len(args.failures)} check(s) failed")
+        sys.exit(1)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Synthetic project generator for benchmarks.
+
+Writes a project of the requested toolchain plus a ready-to-use config JSON:
+
+    python benchmarks/synth_project.py --kind keil --files 50 --functions 20 --out /tmp/synth_keil
+    python extractor/pipeline_runner.py --config /tmp/synth_keil/config.json
+
+Kinds: keil (.uvprojx), visualgdb (.vcxproj), compile_commands, loose_cpp, csharp.
+C firmware projects include the analysis_stubs/keil5 headers (cmsis_os.h,
+stdint.h) and start their RTOS threads with osThreadDef/osThreadCreate.
+Output is deterministic for a given seed.
+"""
+
+import argparse
+import json
+import os
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+KEIL_STUBS = REPO_ROOT / "analysis_stubs" / "keil5"
+QT_STUBS = REPO_ROOT / "analysis_stubs" / "qt"
+
+KINDS = ["keil", "visualgdb", "compile_commands", "loose_cpp", "csharp"]
+
+# Directory, function prefix, share of files. Directory names drive the classifier categories.
+LAYERS = [
+    ("Application", "App", 0.6),
+    ("Drivers", "Driver_", 0.25),
+    ("Utils", "Util", 0.15),
+]
+
+
+@dataclass
+class SynthSpec:
+    kind: str = "compile_commands"
+    files: int = 20
+    functions: int = 10       # per file
+    fan_out: int = 3          # calls per function
+    threads: int = 4
+    headers: int = 10
+    seed: int = 0
+
+
+@dataclass
+class SynthFile:
+    layer: str
+    stem: str
+    functions: List[str]
+    header: int
+
+
+def plan(spec: SynthSpec) -> List[SynthFile]:
+    files = []
+    counts = [max(1, round(spec.files * share)) for _, _, share in LAYERS]
+    counts[0] += spec.files - sum(counts)
+
+    n = 0
+    for (layer, prefix, _), count in zip(LAYERS, counts):
+        for i in range(max(count, 0)):
+            stem = f"{layer.lower()}_{i:03d}"
+            names = [f"{prefix}{i:03d}_fn{j:03d}" for j in range(spec.functions)]
+            files.append(SynthFile(layer, stem, names, n % max(spec.headers, 1)))
+            n += 1
+    return files
+
+
+def pick_calls(spec: SynthSpec, files: List[SynthFile]) -> Dict[str, List[str]]:
+    rng = random.Random(spec.seed)
+    everything = [fn for f in files for fn in f.functions]
+    return {fn: rng.sample(everything, min(spec.fan_out, len(everything))) for fn in everything}
+
+
+def write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+# ============================================================
+# C / C++ SOURCES
+# ============================================================
+
+def write_c_sources(root: Path, spec: SynthSpec, files: List[SynthFile], ext: str, firmware: bool) -> List[Path]:
+    calls = pick_calls(spec, files)
+    owner = {fn: f for f in files for fn in f.functions}
+
+    # Headers: each declares the functions of the files assigned to it
+    decls = {h: [] for h in range(max(spec.headers, 1))}
+    for f in files:
+        decls[f.header].extend(f.functions)
+    for h, names in decls.items():
+        guard = f"SYNTH_HDR_{h:03d}_H"
+        lines = [f"#ifndef {guard}", f"#define {guard}", ""]
+        if firmware:
+            lines.append("#include <stdint.h>")
+            lines.append("")
+        lines += [f"int {fn}(int x);" for fn in names]
+        lines += ["", f"#endif /* {guard} */", ""]
+        write(root / "Inc" / f"hdr_{h:03d}.h", "\n".join(lines))
+
+    # Loose mode only adds -I<project_root> when building the call graph: include relative to the source
+    inc = "" if firmware else "../Inc/"
+
+    sources = []
+    for f in files:
+        needed = sorted({f.header} | {owner[c].header for fn in f.functions for c in calls[fn]})
+        lines = []
+        if firmware:
+            lines.append('#include "cmsis_os.h"')
+        lines += [f'#include "{inc}hdr_{h:03d}.h"' for h in needed]
+        lines.append("")
+        for fn in f.functions:
+            lines.append(f"int {fn}(int x)")
+            lines.append("{")
+            lines.append("    int acc = x;")
+            for k, callee in enumerate(calls[fn]):
+                lines.append(f"    if (acc > {k}) {{")
+                lines.append(f"        acc += {callee}(acc - {k + 1});")
+                lines.append("    }")
+            lines.append("    return acc;")
+            lines.append("}")
+            lines.append("")
+        path = root / f.layer / f"{f.stem}{ext}"
+        write(path, "\n".join(lines))
+        sources.append(path)
+
+    # Entry point (and RTOS threads for firmware)
+    app = [f for f in files if f.layer == "Application"] or files
+    lines = ['#include "cmsis_os.h"'] if firmware else []
+    lines += [f'#include "{inc}hdr_{h:03d}.h"' for h in sorted({f.header for f in app})]
+    lines.append("")
+    threads = spec.threads if firmware else 0
+    for t in range(threads):
+        target = app[t % len(app)].functions[0]
+        lines += [
+            f"void Thread{t:02d}(void const *argument)",
+            "{",
+            "    for (;;) {",
+            f"        {target}({t});",
+            "        osDelay(10);",
+            "    }",
+            "}",
+            "",
+        ]
+    lines += ["int main(void)", "{"]
+    for t in range(threads):
+        lines.append(f"    osThreadDef(Thread{t:02d}, osPriorityNormal, 1, 256);")
+        lines.append("    osThreadCreate(0, 0);")
+    lines.append(f"    return {app[0].functions[0]}(0);")
+    lines += ["}", ""]
+    main = root / "Application" / f"main{ext}"
+    write(main, "\n".join(lines))
+    sources.append(main)
+    return sources
+
+
+# ============================================================
+# PROJECT FILES
+# ============================================================
+
+def write_uvprojx(root: Path, sources: List[Path]) -> Path:
+    groups = {}
+    for s in sources:
+        groups.setdefault(s.parent.name, []).append(s)
+
+    out = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no" ?>',
+        '<Project xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="project_projx.xsd">',
+        "  <SchemaVersion>2.1</SchemaVersion>",
+        "  <Targets>",
+        "    <Target>",
+        "      <TargetName>Synth</TargetName>",
+        "      <TargetOption><TargetArmAds><Cads><VariousControls>",
+        "        <Define>USE_HAL_DRIVER</Define>",
+        "        <IncludePath>.\\Inc;.\\Application</IncludePath>",
+        "      </VariousControls></Cads></TargetArmAds></TargetOption>",
+        "      <Groups>",
+    ]
+    for name, files in groups.items():
+        out += ["        <Group>", f"          <GroupName>{name}</GroupName>", "          <Files>"]
+        for s in files:
+            rel = os.path.relpath(s, root).replace("/", "\\")
+            out += [
+                "            <File>",
+                f"              <FileName>{s.name}</FileName>",
+                "              <FileType>1</FileType>",
+                f"              <FilePath>.\\{rel}</FilePath>",
+                "            </File>",
+            ]
+        out += ["          </Files>", "        </Group>"]
+    out += ["      </Groups>", "    </Target>", "  </Targets>", "</Project>", ""]
+
+    path = root / "Synth.uvprojx"
+    write(path, "\n".join(out))
+    return path
+
+
+def write_vcxproj(root: Path, sources: List[Path]) -> Path:
+    out = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<Project DefaultTargets="Build" ToolsVersion="15.0" xmlns="http://schemas.microsoft.com/developer/msbuild/2003">',
+        "  <ItemDefinitionGroup>",
+        "    <ClCompile>",
+        f"      <AdditionalIncludeDirectories>Inc;{KEIL_STUBS.as_posix()};%(AdditionalIncludeDirectories)</AdditionalIncludeDirectories>",
+        "      <PreprocessorDefinitions>USE_HAL_DRIVER;%(PreprocessorDefinitions)</PreprocessorDefinitions>",
+        "    </ClCompile>",
+        "  </ItemDefinitionGroup>",
+        "  <ItemGroup>",
+    ]
+    out += [f'    <ClCompile Include="{os.path.relpath(s, root).replace(os.sep, "/")}" />' for s in sources]
+    out += ["  </ItemGroup>", "</Project>", ""]
+
+    path = root / "Synth.vcxproj"
+    write(path, "\n".join(out))
+    return path
+
+
+def write_compile_commands(root: Path, sources: List[Path]) -> Path:
+    entries = []
+    for s in sources:
+        entries.append({
+            "directory": str(root),
+            "file": str(s),
+            "arguments": [
+                "clang", "-c", "-nostdinc",
+                f"-I{KEIL_STUBS}", "-include", str(KEIL_STUBS / "keil_armcc_stubs.h"),
+                # Relative to "directory", as most build systems emit it
+                "-IInc", "-DUSE_HAL_DRIVER",
+                str(s),
+            ],
+        })
+    path = root / "build" / "compile_commands.json"
+    write(path, json.dumps(entries, indent=2))
+    return path
+
+
+def write_csharp(root: Path, spec: SynthSpec, files: List[SynthFile]) -> Path:
+    calls = pick_calls(spec, files)
+    owner = {fn: f for f in files for fn in f.functions}
+
+    def cls(f):
+        return "".join(p.capitalize() for p in f.stem.split("_"))
+
+    for f in files:
+        lines = ["namespace Synth", "{", f"    public static class {cls(f)}", "    {"]
+        for fn in f.functions:
+            lines.append(f"        public static int {fn}(int x)")
+            lines.append("        {")
+            lines.append("            var acc = x;")
+            for callee in calls[fn]:
+                lines.append(f"            acc += {cls(owner[callee])}.{callee}(acc);")
+            lines.append("            return acc;")
+            lines.append("        }")
+            lines.append("")
+        lines += ["    }", "}", ""]
+        write(root / f.layer / f"{cls(f)}.cs", "\n".join(lines))
+
+    path = root / "Synth.csproj"
+    write(path, "\n".join([
+        '<Project Sdk="Microsoft.NET.Sdk">',
+        "  <PropertyGroup>",
+        "    <TargetFramework>net8.0</TargetFramework>",
+        "  </PropertyGroup>",
+        "</Project>",
+        "",
+    ]))
+    return path
+
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+def base_config(root: Path, libclang: str = None) -> Dict:
+    analysis = root / "analysis"
+    config = {
+        "project_type": "firmware",
+        "project_root": str(root),
+        "log_dir": str(root / "logs"),
+        "functions_index": str(analysis / "functions_index.json"),
+        "function_categories": str(analysis / "function_categories.json"),
+        "call_graph": str(analysis / "call_graph.json"),
+        "tasks": str(analysis / "tasks.json"),
+        "task_call_graph": str(analysis / "task_call_graph.json"),
+        "firmware_ir": str(analysis / "firmware_ir.json"),
+        "functions_detail_dir": str(analysis / "functions_detail"),
+        "architecture_overview_md": str(analysis / "ARCHITECTURE_OVERVIEW.md"),
+        "architecture_dir": str(analysis / "architecture"),
+        "docs_dir": str(root / "docs"),
+        "compile_commands": str(root / "build" / "compile_commands.json"),
+    }
+    libclang = libclang or os.environ.get("LIBCLANG_PATH")
+    if libclang:
+        config["libclang"] = libclang
+    return config
+
+
+def generate(out_dir: str, spec: SynthSpec, libclang: str = None) -> str:
+    """Write the project and its config. Returns the config path."""
+    if spec.kind not in KINDS:
+        raise ValueError(f"Unsupported kind: {spec.kind} (expected one of {KINDS})")
+
+    root = Path(out_dir).resolve()
+    root.mkdir(parents=True, exist_ok=True)
+    files = plan(spec)
+    config = base_config(root, libclang)
+    config["toolchain"] = spec.kind
+
+    if spec.kind == "csharp":
+        config["project_type"] = "desktop"
+        config["csproj"] = str(write_csharp(root, spec, files))
+
+    elif spec.kind == "loose_cpp":
+        config["project_type"] = "desktop"
+        config["source_dir"] = str(root / "src")
+        config["loose_stub_dir"] = str(QT_STUBS)
+        write_c_sources(root / "src", spec, files, ".cpp", firmware=False)
+
+    else:
+        sources = write_c_sources(root, spec, files, ".c", firmware=True)
+        if spec.kind == "keil":
+            config["uvprojx"] = str(write_uvprojx(root, sources))
+            config["stub_dir"] = str(KEIL_STUBS)
+        elif spec.kind == "visualgdb":
+            config["vcxproj"] = str(write_vcxproj(root, sources))
+        else:
+            write_compile_commands(root, sources)
+
+    config_path = root / "config.json"
+    write(config_path, json.dumps(config, indent=2))
+    return str(config_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic project for Firmware Lens benchmarks")
+    parser.add_argument("--kind", choices=KINDS, default="compile_commands")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--functions", type=int, default=10, help="Functions per file")
+    parser.add_argument("--fan-out", type=int, default=3, help="Calls per function")
+    parser.add_argument("--threads", type=int, default=4, help="RTOS threads (firmware kinds)")
+    parser.add_argument("--headers", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--libclang", help="libclang path written to the config (default: LIBCLANG_PATH)")
+    args = parser.parse_args()
+
+    spec = SynthSpec(args.kind, args.files, args.functions, args.fan_out, args.threads, args.headers, args.seed)
+    config_path = generate(args.out, spec, args.libclang)
+    print(f"Generated {args.kind} project ({args.files} files x {args.functions} functions): {config_path}")
+
+
+if __name__ == "__main__":
+    main()
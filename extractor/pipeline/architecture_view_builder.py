@@ -16,6 +16,7 @@
 
 from collections import defaultdict
 from .base import PipelineStep, load_json, write_text, StepIO
+from .sampling import load_coverage
 
 class ArchitectureViewBuilder(PipelineStep):
     name = "07_generate_architecture_view"
@@ -43,6 +44,10 @@ class ArchitectureViewBuilder(PipelineStep):
         lines.append("This document provides a **task-centric architectural view** of the firmware.\n")
         lines.append("Each section describes a runtime task, its responsibilities, and the modules it interacts with.\n")
 
+        coverage = load_coverage(self.config)
+        if coverage.get("partial"):
+            lines.extend(self.coverage_section(coverage))
+
         for task, info in task_graph.items():
             entry = info["entry"]
             functions = info["reachable_functions"]
@@ -75,3 +80,24 @@ class ArchitectureViewBuilder(PipelineStep):
         write_text(out_path, "\n".join(lines))
         context["architecture_overview_md"] = out_path
         self.log("Generated ARCHITECTURE_OVERVIEW.md")
+
+    @staticmethod
+    def coverage_section(coverage):
+        lines = []
+        lines.append("\n> **Partial analysis (sampled run).** "
+                     f"{coverage['tus_analyzed']} of {coverage['tus_total']} translation units were analyzed "
+                     f"({coverage['byte_coverage']:.0%} of the source bytes). Tasks and call paths through "
+                     "files that were not sampled are missing.\n")
+        lines.append("\n## Coverage estimate\n")
+        lines.append("| Directory | Category | TUs analyzed | Source coverage | Functions found | Functions (est.) |")
+        lines.append("|-----------|----------|--------------|-----------------|-----------------|------------------|")
+        for row in coverage["strata"]:
+            estimated = row["functions_estimated"]
+            lines.append(
+                f"| `{row['directory']}` | {row['category']} | {row['analyzed']}/{row['tus']} | "
+                f"{row['byte_coverage']:.0%} | {row['functions_found']} | "
+                f"{'-' if estimated is None else f'~{estimated}'} |"
+            )
+        lines.append(f"\nEstimated total: **~{coverage['functions_estimated']} functions**, "
+                     "extrapolated per stratum from the share of source bytes analyzed.\n")
+        return lines
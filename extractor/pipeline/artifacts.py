@@ -0,0 +1,56 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Process-wide cache for read-only JSON artifacts.
+
+When several stages run in the same interpreter (see
+orchestrator/script/stages.py) they all read call_graph.json,
+functions_index.json, tasks.json... This cache returns the already parsed
+object as long as the file on disk is unchanged (same mtime and size).
+Callers must treat the returned data as read-only.
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+MAX_ENTRIES = 4096
+
+_cache = OrderedDict()
+
+
+def load_artifact(path):
+    path = os.path.abspath(str(path))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        _cache.move_to_end(path)
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    _cache[path] = (signature, data)
+    _cache.move_to_end(path)
+    while len(_cache) > MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return data
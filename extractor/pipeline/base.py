@@ -39,6 +39,14 @@ def write_text(path: str, text: str) -> None:
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
 
+def write_text_atomic(path: str, text: str) -> None:
+    """Write next to the target, then rename: readers see the old file or the new one, never a torn one."""
+    ensure_dir(os.path.dirname(path))
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
 def newest_mtime(paths: List[str]) -> float:
     mt = 0.0
     for p in paths:
@@ -79,6 +87,11 @@ class PipelineStep:
         self.config = config
         self.force = force
 
+    @property
+    def bounded_memory(self) -> bool:
+        """Dispose TUs eagerly and stream large intermediates to disk."""
+        return bool(self.config.get("bounded_memory"))
+
     def io(self, context: PipelineContext) -> StepIO:
         return StepIO(inputs=[], outputs=[])
 
@@ -0,0 +1,99 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Call-graph ordering for bottom-up documentation.
+
+Tarjan's algorithm (iterative, so deep call chains do not hit the recursion
+limit) splits the call graph into strongly connected components. It emits
+them callees-first, which is a reverse topological order of the
+condensation DAG. Functions of one component (mutual recursion) cannot wait
+for each other; every other callee is documented before its callers.
+"""
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def strongly_connected_components(graph: Dict[str, List[str]], nodes: Iterable[str]) -> List[List[str]]:
+    """Components of the subgraph induced by `nodes`, callees before callers."""
+    nodes = list(nodes)
+    node_set = set(nodes)
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+
+        while work:
+            v, callees = work[-1]
+            for w in callees:
+                if w not in node_set:
+                    continue
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(graph.get(w, ()))))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(sorted(component))
+
+    return components
+
+
+def bottom_up(graph: Dict[str, List[str]], nodes: Iterable[str], todo: Iterable[str]) -> Tuple[List[str], Dict[str, Set[str]]]:
+    """
+    Order `todo` callees-first over the call graph restricted to `nodes`.
+    Returns (order, waits_for): waits_for[f] are the callees of f in `todo`
+    outside f's own component, i.e. what f's prompt should wait for.
+    """
+    todo = set(todo)
+    component_of = {}
+    order = []
+    for i, component in enumerate(strongly_connected_components(graph, sorted(nodes))):
+        for fn in component:
+            component_of[fn] = i
+            if fn in todo:
+                order.append(fn)
+
+    waits_for = {
+        fn: {c for c in graph.get(fn, ()) if c in todo and component_of.get(c) != component_of[fn]}
+        for fn in order
+    }
+    return order, waits_for
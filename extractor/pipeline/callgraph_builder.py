@@ -14,9 +14,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import gc
 import os
+import time
 from clang.cindex import Index, CursorKind, TranslationUnit
-from .base import PipelineStep, load_json, save_json, StepIO
+from .base import PipelineStep, load_json, StepIO
+from .compile_db import entry_args, loose_sources
+from .trace import TRACER
+from .profiling import profile_tu
+from .edge_log import CallEdges, EdgeLog
+from .lexer_fallback import DefinedTracker, add_fallback_calls, has_errors, use_fallback
 
 
 class CallGraphBuilder(PipelineStep):
@@ -39,6 +46,55 @@ class CallGraphBuilder(PipelineStep):
             outputs=[self.config["call_graph"]],
         )
 
+    def make_edge_sink(self, out_path):
+        # Bounded-memory mode streams edges to disk instead of growing a dict
+        if self.bounded_memory:
+            return EdgeLog(out_path + ".edges.log")
+        return CallEdges()
+
+    def lexer_fill(self, src, edges, clang_defined=()):
+        """Heuristic call sites for a TU clang failed on, or parsed with errors."""
+        if use_fallback(self.config):
+            added = add_fallback_calls(edges, src, clang_defined)
+            if added:
+                self.log(f"[FALLBACK] {src}: calls of {added} function(s) from the lexer")
+
+    def visit_tu(self, tu, src, project_root, edges, stats):
+        if not use_fallback(self.config) or not has_errors(tu):
+            self.collect_calls(tu.cursor, project_root, edges, stats)
+            return
+        tracker = DefinedTracker(edges)
+        self.collect_calls(tu.cursor, project_root, tracker, stats)
+        self.lexer_fill(src, edges, tracker.defined)
+
+    # ============================================================
+    # AST VISIT
+    # ============================================================
+
+    @staticmethod
+    def collect_calls(node, project_root, edges, stats, current_function=None):
+        """Feed definitions and call sites under project_root to an edge sink."""
+        stats["cursors"] += 1
+
+        if node.kind == CursorKind.FUNCTION_DECL and node.is_definition():
+            if node.location.file is None:
+                return
+
+            file_path = os.path.normpath(node.location.file.name)
+            if not file_path.startswith(project_root):
+                return
+
+            current_function = node.spelling
+            edges.add_function(current_function)
+
+        elif node.kind == CursorKind.CALL_EXPR and current_function:
+            callee = node.spelling
+            if callee:
+                edges.add_call(current_function, callee)
+
+        for c in node.get_children():
+            CallGraphBuilder.collect_calls(c, project_root, edges, stats, current_function)
+
     # ============================================================
     # RUN
     # ============================================================
@@ -56,81 +112,58 @@ class CallGraphBuilder(PipelineStep):
         out_path = self.config["call_graph"]
 
         index = Index.create()
-        call_graph = {}
-
-        def visit(node, project_root, current_function=None):
-
-            if node.kind == CursorKind.FUNCTION_DECL and node.is_definition():
-                if node.location.file is None:
-                    return
-
-                file_path = os.path.normpath(node.location.file.name)
-                if not file_path.startswith(project_root):
-                    return
-
-                current_function = node.spelling
-                call_graph.setdefault(current_function, [])
-
-            elif node.kind == CursorKind.CALL_EXPR and current_function:
-                callee = node.spelling
-                if callee:
-                    call_graph[current_function].append(callee)
-
-            for c in node.get_children():
-                visit(c, project_root, current_function)
-
-        import shlex
+        edges = self.make_edge_sink(out_path)
+        stats = {"cursors": 0}
 
         for entry in compile_commands:
 
             src = entry["file"]
             project_root = os.path.normpath(entry["directory"])
+            src_path = os.path.normpath(os.path.join(project_root, src))
+            args = entry_args(entry)
 
-            # ---- Recupero args corretto ----
-            if "arguments" in entry:
-                args = entry["arguments"]
-            else:
-                args = shlex.split(entry["command"])
-
-            # ---- Rimuovi compilatore ----
-            if args and args[0].endswith(("gcc", "g++", "clang", "arm-none-eabi-gcc", "armcc")):
-                args = args[1:]
-
-            # ---- Rimuovi il file sorgente dagli args ----
-            args = [a for a in args if os.path.normpath(a) != os.path.normpath(src)]
+            with TRACER.span("parse_tu", cat="tu", tu=src, argc=len(args)) as span:
+                parse_started = time.perf_counter()
+                prev_cwd = os.getcwd()
+                try:
+                    os.chdir(project_root)
 
-            prev_cwd = os.getcwd()
-            try:
-                os.chdir(project_root)
+                    tu = index.parse(
+                        src,
+                        args=args,
+                        options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD,
+                    )
 
-                tu = index.parse(
-                    src,
-                    args=args,
-                    options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD,
-                )
+                except Exception as e:
+                    self.log(f"[WARN] Failed parsing {src}: {e}")
+                    self.lexer_fill(src_path, edges)
+                    continue
 
-            except Exception as e:
-                self.log(f"[WARN] Failed parsing {src}: {e}")
-                continue
+                finally:
+                    os.chdir(prev_cwd)
 
-            finally:
-                os.chdir(prev_cwd)
+                if tu is None:
+                    self.log(f"[NULL TU] {src}")
+                    self.lexer_fill(src_path, edges)
+                    continue
 
-            if tu is None:
-                self.log(f"[NULL TU] {src}")
-                continue
+                parse_seconds = time.perf_counter() - parse_started
 
-            for d in tu.diagnostics:
-                self.log(f"[CLANG] {src}: {d}")
+                for d in tu.diagnostics:
+                    self.log(f"[CLANG] {src}: {d}")
 
-            visit(tu.cursor, project_root)
+                before = stats["cursors"]
+                self.visit_tu(tu, src_path, project_root, edges, stats)
+                span["cursors"] = stats["cursors"] - before
+                profile_tu(context, self.name, src_path, project_root, tu, parse_seconds, span["cursors"])
 
-        for fn in call_graph:
-            call_graph[fn] = sorted(set(call_graph[fn]))
+                if self.bounded_memory:
+                    del tu
+                    gc.collect()
 
-        save_json(out_path, call_graph)
+        count = edges.finish(out_path)
         context["call_graph"] = out_path
-        self.log(f"Call graph generated for {len(call_graph)} functions")
+        self.log(f"Call graph generated for {count} functions")
 
     # ============================================================
     # 🔥 LOOSE MODE
@@ -146,41 +179,14 @@ class CallGraphBuilder(PipelineStep):
         out_path = self.config["call_graph"]
 
         index = Index.create()
-        call_graph = {}
-
-        def visit(node, current_function=None):
-
-            if node.kind == CursorKind.FUNCTION_DECL and node.is_definition():
-                if node.location.file is None:
-                    return
-
-                file_path = os.path.normpath(node.location.file.name)
-                if not file_path.startswith(project_root):
-                    return
-
-                current_function = node.spelling
-                call_graph.setdefault(current_function, [])
-
-            elif node.kind == CursorKind.CALL_EXPR and current_function:
-                callee = node.spelling
-                if callee:
-                    call_graph[current_function].append(callee)
-
-            for c in node.get_children():
-                visit(c, current_function)
-
-        for root, _, files in os.walk(source_dir):
-            for f in files:
-
-                if not f.endswith((".cpp", ".cc", ".c")):
-                    continue
-
-                if f.startswith(("moc_", "qrc_", "ui_")):
-                    continue
+        edges = self.make_edge_sink(out_path)
+        stats = {"cursors": 0}
 
-                file_path = os.path.join(root, f)
-                self.log(f"[loose_cpp] Parsing {file_path}")
+        for file_path in loose_sources(source_dir):
+            self.log(f"[loose_cpp] Parsing {file_path}")
 
+            with TRACER.span("parse_tu", cat="tu", tu=file_path, argc=2) as span:
+                parse_started = time.perf_counter()
                 try:
                     tu = index.parse(
                         file_path,
@@ -192,13 +198,19 @@ class CallGraphBuilder(PipelineStep):
                     )
                 except Exception as e:
                     self.log(f"[WARN] Failed parsing {file_path}: {e}")
+                    self.lexer_fill(file_path, edges)
                     continue
 
-                visit(tu.cursor)
+                parse_seconds = time.perf_counter() - parse_started
+                before = stats["cursors"]
+                self.visit_tu(tu, file_path, project_root, edges, stats)
+                span["cursors"] = stats["cursors"] - before
+                profile_tu(context, self.name, file_path, os.getcwd(), tu, parse_seconds, span["cursors"])
 
-        for fn in call_graph:
-            call_graph[fn] = sorted(set(call_graph[fn]))
+                if self.bounded_memory:
+                    del tu
+                    gc.collect()
 
-        save_json(out_path, call_graph)
+        count = edges.finish(out_path)
         context["call_graph"] = out_path
-        self.log(f"[loose_cpp] Call graph generated for {len(call_graph)} functions")
\ No newline at end of file
+        self.log(f"[loose_cpp] Call graph generated for {count} functions")
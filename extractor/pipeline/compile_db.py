@@ -0,0 +1,102 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Helpers shared by the clang-based steps to turn compile_commands entries
+(or a loose source tree) into libclang parse arguments.
+"""
+
+import os
+import shlex
+from typing import Dict, Iterator, List
+
+COMPILERS = ("gcc", "g++", "clang", "arm-none-eabi-gcc", "armcc")
+
+
+def entry_args(entry: Dict) -> List[str]:
+    """libclang arguments for a compile_commands entry (compiler and source removed)."""
+    src = entry["file"]
+
+    if "arguments" in entry:
+        args = entry["arguments"]
+    else:
+        args = shlex.split(entry["command"])
+
+    # Rimuovi compilatore
+    if args and args[0].endswith(COMPILERS):
+        args = args[1:]
+
+    # Rimuovi il file sorgente dagli argomenti
+    return [a for a in args if os.path.normpath(a) != os.path.normpath(src)]
+
+
+def loose_sources(source_dir: str) -> Iterator[str]:
+    """C/C++ sources under source_dir, skipping Qt generated files."""
+    for root, _, files in os.walk(source_dir):
+        for f in files:
+
+            if not f.endswith((".cpp", ".cc", ".c")):
+                continue
+
+            # Skip Qt generated files
+            if f.startswith(("moc_", "qrc_", "ui_")):
+                continue
+
+            yield os.path.join(root, f)
+
+
+def loose_parse_args(config: Dict, project_root: str, source_dir: str) -> List[str]:
+    """Parse arguments used for every file in loose_cpp mode."""
+    include_args = [
+        "-std=c++17",
+        "-ferror-limit=0",          # non fermarti ai primi errori
+        "-Wno-everything",          # riduci rumore
+        "-D__clang_analyzer__",     # modalità analisi
+    ]
+
+    # Neutralizza macro Qt (fondamentale)
+    qt_macro_neutralizers = [
+        "-DQ_OBJECT=",
+        "-Dsignals=public",
+        "-Dslots=",
+        "-Demit=",
+        "-DQ_INVOKABLE=",
+        "-DQ_ENUM(...)=",
+        "-DQ_PROPERTY(...)=",
+        "-DQ_GADGET=",
+    ]
+
+    include_args.extend(qt_macro_neutralizers)
+
+    # Include project root
+    include_args.append("-I" + project_root)
+
+    # Include stub dir (se presente)
+    stub_dir = config.get("loose_stub_dir")
+    if stub_dir:
+        include_args.append("-I" + stub_dir)
+
+    # Include tutte le sottocartelle sotto source
+    for root_dir, _, _ in os.walk(source_dir):
+        include_args.append("-I" + root_dir)
+
+    # Forza include di uno stub globale se esiste
+    if stub_dir:
+        global_stub = os.path.join(stub_dir, "qt_global_stub.h")
+        if os.path.exists(global_stub):
+            include_args.extend(["-include", global_stub])
+
+    return include_args
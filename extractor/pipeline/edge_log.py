@@ -0,0 +1,116 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Call edge sinks used by CallGraphBuilder.
+
+`CallEdges` keeps the graph in a dict (default). `EdgeLog` is the
+bounded-memory variant: edges are appended to a file on disk while TUs are
+visited, then sorted in fixed-size runs and k-way merged into call_graph.json,
+so memory use does not grow with the number of edges.
+"""
+
+import heapq
+import json
+import os
+import tempfile
+from itertools import groupby
+
+from .base import ensure_dir, save_json
+
+
+class CallEdges:
+
+    def __init__(self):
+        self.graph = {}
+
+    def add_function(self, fn: str) -> None:
+        self.graph.setdefault(fn, [])
+
+    def add_call(self, caller: str, callee: str) -> None:
+        self.graph.setdefault(caller, []).append(callee)
+
+    def finish(self, out_path: str) -> int:
+        for fn in self.graph:
+            self.graph[fn] = sorted(set(self.graph[fn]))
+        save_json(out_path, self.graph)
+        return len(self.graph)
+
+
+class EdgeLog:
+
+    def __init__(self, log_path: str, run_size: int = 200_000):
+        ensure_dir(os.path.dirname(log_path))
+        self.log_path = log_path
+        self.run_size = run_size
+        self._f = open(log_path, "w", encoding="utf-8")
+
+    def add_function(self, fn: str) -> None:
+        # An empty callee marks a definition, so leaf functions keep their key
+        self._f.write(f"{fn}\t\n")
+
+    def add_call(self, caller: str, callee: str) -> None:
+        self._f.write(f"{caller}\t{callee}\n")
+
+    def _sorted_runs(self, tmp_dir):
+        runs = []
+
+        def flush(chunk):
+            chunk.sort()
+            path = os.path.join(tmp_dir, f"run_{len(runs):05d}.txt")
+            with open(path, "w", encoding="utf-8") as out:
+                out.writelines(chunk)
+            runs.append(path)
+
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            chunk = []
+            for line in f:
+                chunk.append(line)
+                if len(chunk) >= self.run_size:
+                    flush(chunk)
+                    chunk = []
+            if chunk:
+                flush(chunk)
+        return runs
+
+    def finish(self, out_path: str) -> int:
+        """External merge of the edge log into call_graph.json. Returns the function count."""
+        self._f.close()
+        ensure_dir(os.path.dirname(out_path))
+
+        count = 0
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(self.log_path) or None) as tmp_dir:
+            run_files = [open(p, "r", encoding="utf-8") for p in self._sorted_runs(tmp_dir)]
+            try:
+                edges = (line.rstrip("\n").split("\t", 1) for line in heapq.merge(*run_files))
+
+                with open(out_path, "w", encoding="utf-8") as out:
+                    out.write("{")
+                    for caller, group in groupby(edges, key=lambda e: e[0]):
+                        callees = []
+                        for _, callee in group:
+                            if callee and (not callees or callees[-1] != callee):
+                                callees.append(callee)
+                        out.write(",\n" if count else "\n")
+                        out.write(f"  {json.dumps(caller)}: {json.dumps(callees)}")
+                        count += 1
+                    out.write("\n}\n")
+            finally:
+                for f in run_files:
+                    f.close()
+
+        os.remove(self.log_path)
+        return count
@@ -20,6 +20,8 @@ import json
 import hashlib
 from .base import PipelineStep, load_json, save_json, ensure_dir, StepIO
 
+CALL_RE = re.compile(r"\b([A-Za-z_]\w*)\s*\(")
+
 
 class FunctionDetailBuilder(PipelineStep):
     name = "08_generate_function_detail"
@@ -83,7 +85,7 @@ class FunctionDetailBuilder(PipelineStep):
         ensure_dir(out_dir)
 
         functions = load_json(fn_index_path)
-        all_function_names = list(functions.keys())
+        all_function_names = set(functions)
 
         def find_function_end(lines, start_line):
             brace_count = 0
@@ -110,13 +112,9 @@ class FunctionDetailBuilder(PipelineStep):
             return complexity
 
         def extract_calls(body, all_names, current_name):
-            calls = set()
-            for fname in all_names:
-                if fname == current_name:
-                    continue
-                pattern = rf"\b{re.escape(fname)}\s*\("
-                if re.search(pattern, body):
-                    calls.add(fname)
+            # One scan of the body instead of one regex per known function
+            calls = set(CALL_RE.findall(body)) & all_names
+            calls.discard(current_name)
             return list(calls)
 
         def detect_interrupt(name, body):
@@ -14,9 +14,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import gc
 import os
+import time
 from clang.cindex import Index, CursorKind, TranslationUnit
 from .base import PipelineStep, load_json, save_json, StepIO
+from .compile_db import entry_args, loose_sources, loose_parse_args
+from .header_deps import HeaderGraph, header_deps_path, includes_of
+from .lexer_fallback import fallback_functions, has_errors, prefer_clang, use_fallback
+from .trace import TRACER
+from .profiling import profile_tu
 
 
 class FunctionExtractor(PipelineStep):
@@ -41,6 +48,52 @@ class FunctionExtractor(PipelineStep):
             outputs=[self.config["functions_index"]],
         )
 
+    # ============================================================
+    # AST VISIT
+    # ============================================================
+
+    @staticmethod
+    def collect_functions(node, project_root, functions, stats):
+        """Add every function defined under project_root in this cursor tree to `functions`."""
+        stats["cursors"] += 1
+        if node.kind == CursorKind.FUNCTION_DECL:
+            if not node.is_definition():
+                return
+            if node.location.file is None:
+                return
+
+            file_path = os.path.normpath(node.location.file.name)
+
+            if not file_path.startswith(project_root):
+                return
+
+            name = node.spelling
+
+            functions[name] = {
+                "file": file_path,
+                "line": node.location.line,
+                "return": node.result_type.spelling,
+                "params": [
+                    {"name": p.spelling, "type": p.type.spelling}
+                    for p in node.get_arguments()
+                ],
+            }
+
+        for c in node.get_children():
+            FunctionExtractor.collect_functions(c, project_root, functions, stats)
+
+    def lexer_fill(self, src, clang_found):
+        """Heuristic definitions for a TU clang failed on, or parsed with errors."""
+        if not use_fallback(self.config):
+            return {}
+        extra = fallback_functions(src, clang_found)
+        if extra:
+            self.log(f"[FALLBACK] {src}: {len(extra)} function(s) from the lexer")
+        return extra
+
+    def lexer_only(self, src, functions, origin, position):
+        origin.update(dict.fromkeys(prefer_clang(functions, self.lexer_fill(src, {})), position))
+
     # ============================================================
     # MAIN RUN
     # ============================================================
@@ -57,80 +110,72 @@ class FunctionExtractor(PipelineStep):
 
         index = Index.create()
         functions = {}
+        stats = {"cursors": 0}
+        header_graph = HeaderGraph()
 
-        def visit(node, project_root):
-            if node.kind == CursorKind.FUNCTION_DECL:
-                if not node.is_definition():
-                    return
-                if node.location.file is None:
-                    return
-
-                file_path = os.path.normpath(node.location.file.name)
-
-                if not file_path.startswith(project_root):
-                    return
-
-                name = node.spelling
-
-                functions[name] = {
-                    "file": file_path,
-                    "line": node.location.line,
-                    "return": node.result_type.spelling,
-                    "params": [
-                        {"name": p.spelling, "type": p.type.spelling}
-                        for p in node.get_arguments()
-                    ],
-                }
+        # Sharded runs record which TU (position in the full database) provided each definition
+        origin_path = self.config.get("functions_origin")
+        origin = {}
 
-            for c in node.get_children():
-                visit(c, project_root)
-
-        import shlex
-
-        for entry in compile_commands:
+        for position, entry in enumerate(compile_commands):
 
             src = entry["file"]
             workdir = os.path.normpath(entry["directory"])
+            src_path = os.path.normpath(os.path.join(workdir, src))
+            args = entry_args(entry)
+            position = entry.get("index", position)
 
-            if "arguments" in entry:
-                args = entry["arguments"]
-            else:
-                args = shlex.split(entry["command"])
+            with TRACER.span("parse_tu", cat="tu", tu=src, argc=len(args)) as span:
+                parse_started = time.perf_counter()
+                prev_cwd = os.getcwd()
+                try:
+                    os.chdir(workdir)
 
-            # Rimuovi compilatore
-            if args and args[0].endswith(("gcc", "g++", "clang", "arm-none-eabi-gcc", "armcc")):
-                args = args[1:]
+                    tu = index.parse(
+                        src,
+                        args=args,
+                        options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD,
+                    )
 
-            # Rimuovi il file sorgente dagli argomenti
-            args = [a for a in args if os.path.normpath(a) != os.path.normpath(src)]
+                except Exception as e:
+                    self.log(f"[EXCEPTION] {src}: {e}")
+                    self.lexer_only(src_path, functions, origin, position)
+                    continue
 
-            prev_cwd = os.getcwd()
-            try:
-                os.chdir(workdir)
+                finally:
+                    os.chdir(prev_cwd)
 
-                tu = index.parse(
-                    src,
-                    args=args,
-                    options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD,
-                )
+                if tu is None:
+                    self.log(f"[NULL TU] {src}")
+                    self.lexer_only(src_path, functions, origin, position)
+                    continue
 
-            except Exception as e:
-                self.log(f"[EXCEPTION] {src}: {e}")
-                continue
+                parse_seconds = time.perf_counter() - parse_started
 
-            finally:
-                os.chdir(prev_cwd)
+                for d in tu.diagnostics:
+                    self.log(f"[CLANG] {src}: {d}")
 
-            if tu is None:
-                self.log(f"[NULL TU] {src}")
-                continue
+                header_graph.add(src_path, includes_of(tu, workdir))
 
-            for d in tu.diagnostics:
-                self.log(f"[CLANG] {src}: {d}")
+                before = stats["cursors"]
+                found = {}
+                self.collect_functions(tu.cursor, workdir, found, stats)
+                if has_errors(tu):
+                    found.update(self.lexer_fill(src_path, found))
+                taken = prefer_clang(functions, found)
+                if origin_path:
+                    origin.update(dict.fromkeys(taken, position))
+                span["cursors"] = stats["cursors"] - before
+                profile_tu(context, self.name, src_path, workdir, tu, parse_seconds, span["cursors"])
 
-            visit(tu.cursor, workdir)
+                if self.bounded_memory:
+                    del tu
+                    gc.collect()
 
         save_json(out_path, functions)
+        header_graph.save(header_deps_path(self.config))
+        if origin_path:
+            save_json(origin_path, origin)
         context["functions_index"] = out_path
         self.log(f"Extracted {len(functions)} functions")
 
@@ -152,92 +197,22 @@ class FunctionExtractor(PipelineStep):
 
         index = Index.create()
         functions = {}
+        stats = {"cursors": 0}
+        header_graph = HeaderGraph()
+        include_args = loose_parse_args(self.config, project_root, source_dir)
 
-        def visit(node):
-            if node.kind == CursorKind.FUNCTION_DECL:
-                if not node.is_definition():
-                    return
-                if node.location.file is None:
-                    return
-
-                file_path = os.path.normpath(node.location.file.name)
-
-                if not file_path.startswith(project_root):
-                    return
-
-                name = node.spelling
-
-                functions[name] = {
-                    "file": file_path,
-                    "line": node.location.line,
-                    "return": node.result_type.spelling,
-                    "params": [
-                        {"name": p.spelling, "type": p.type.spelling}
-                        for p in node.get_arguments()
-                    ],
-                }
-
-            for c in node.get_children():
-                visit(c)
-
-        for root, _, files in os.walk(source_dir):
-            for f in files:
-
-                if not f.endswith((".cpp", ".cc", ".c")):
-                    continue
-
-                # Skip Qt generated files
-                if f.startswith(("moc_", "qrc_", "ui_")):
-                    continue
-
-                file_path = os.path.join(root, f)
-                self.log(f"[loose_cpp] Parsing {file_path}")
+        for file_path in loose_sources(source_dir):
+            self.log(f"[loose_cpp] Parsing {file_path}")
 
+            with TRACER.span("parse_tu", cat="tu", tu=file_path, argc=len(include_args)) as span:
                 try:
-                    include_args = [
-                        "-std=c++17",
-                        "-ferror-limit=0",          # non fermarti ai primi errori
-                        "-Wno-everything",          # riduci rumore
-                        "-D__clang_analyzer__",     # modalità analisi
-                    ]
-
-                    # Neutralizza macro Qt (fondamentale)
-                    qt_macro_neutralizers = [
-                        "-DQ_OBJECT=",
-                        "-Dsignals=public",
-                        "-Dslots=",
-                        "-Demit=",
-                        "-DQ_INVOKABLE=",
-                        "-DQ_ENUM(...)=",
-                        "-DQ_PROPERTY(...)=",
-                        "-DQ_GADGET=",
-                    ]
-
-                    include_args.extend(qt_macro_neutralizers)
-
-                    # Include project root
-                    include_args.append("-I" + project_root)
-
-                    # Include stub dir (se presente)
-                    stub_dir = self.config.get("loose_stub_dir")
-                    if stub_dir:
-                        include_args.append("-I" + stub_dir)
-
-                    # Include tutte le sottocartelle sotto source
-                    for root_dir, _, _ in os.walk(source_dir):
-                        include_args.append("-I" + root_dir)
-
-                    # Forza include di uno stub globale se esiste
-                    if stub_dir:
-                        global_stub = os.path.join(stub_dir, "qt_global_stub.h")
-                        if os.path.exists(global_stub):
-                            include_args.extend(["-include", global_stub])
-
+                    parse_started = time.perf_counter()
                     tu = index.parse(
                         file_path,
                         args=include_args,
                         options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD,
                     )
+                    parse_seconds = time.perf_counter() - parse_started
 
                     # 🔎 DEBUG (temporaneo)
                     for d in tu.diagnostics:
@@ -245,10 +220,25 @@ class FunctionExtractor(PipelineStep):
 
                 except Exception as e:
                     self.log(f"[WARN] Failed parsing {file_path}: {e}")
+                    prefer_clang(functions, self.lexer_fill(file_path, {}))
                     continue
 
-                visit(tu.cursor)
+                header_graph.add(file_path, includes_of(tu, os.getcwd()))
+
+                before = stats["cursors"]
+                found = {}
+                self.collect_functions(tu.cursor, project_root, found, stats)
+                if has_errors(tu):
+                    found.update(self.lexer_fill(file_path, found))
+                prefer_clang(functions, found)
+                span["cursors"] = stats["cursors"] - before
+                profile_tu(context, self.name, file_path, os.getcwd(), tu, parse_seconds, span["cursors"])
+
+                if self.bounded_memory:
+                    del tu
+                    gc.collect()
 
         save_json(out_path, functions)
+        header_graph.save(header_deps_path(self.config))
         context["functions_index"] = out_path
-        self.log(f"[loose_cpp] Extracted {len(functions)} functions")
\ No newline at end of file
+        self.log(f"[loose_cpp] Extracted {len(functions)} functions")
@@ -0,0 +1,58 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Git-based change detection (`pipeline_runner.py --since <rev>`).
+
+The files changed between <rev> and the working tree (plus untracked files)
+decide which TUs are stale, instead of mtimes: a fresh CI checkout touches
+every file. The TUs that include a changed file are found through the
+dependency list stored with each TU in tu_cache.py; all other TUs keep the
+result of the base run.
+"""
+
+import os
+import subprocess
+from typing import Dict, List, Set
+
+
+def git(args: List[str], cwd: str) -> str:
+    try:
+        out = subprocess.run(
+            ["git", *args], cwd=cwd, capture_output=True, text=True, check=True,
+        )
+    except FileNotFoundError:
+        raise SystemExit("--since needs git on PATH")
+    except subprocess.CalledProcessError as e:
+        raise SystemExit(f"git {' '.join(args)} failed: {e.stderr.strip()}")
+    return out.stdout
+
+
+def repo_dir(config: Dict) -> str:
+    for key in ("project_root", "uvprojx", "vcxproj", "compile_commands"):
+        path = config.get(key)
+        if path:
+            return path if os.path.isdir(path) else os.path.dirname(path)
+    return os.getcwd()
+
+
+def changed_files(rev: str, cwd: str) -> Set[str]:
+    """Absolute real paths changed since `rev` (committed, staged, unstaged or untracked)."""
+    top = git(["rev-parse", "--show-toplevel"], cwd).strip()
+    names = git(["diff", "--name-only", rev, "--"], top).splitlines()
+    names += git(["ls-files", "--others", "--exclude-standard"], top).splitlines()
+    return {os.path.realpath(os.path.join(top, n)) for n in names if n}
@@ -0,0 +1,127 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Header dependency graph (`header_deps.json`), recorded while extracting.
+
+For every TU, the files it includes (directly or not) as reported by
+`tu.get_includes()`. TUs and headers are absolute, normalized paths, so the
+graph matches git and cache paths whatever directory a TU was parsed from.
+Paths are stored once in a table and both directions are integer-ID
+adjacency lists, so the file stays small with many headers:
+
+    {"paths": [...], "tus": [id, ...], "tu_headers": [[id, ...], ...],
+     "headers": [id, ...], "header_tus": [[id, ...], ...]}
+
+`tu_headers[i]` belongs to `tus[i]`, `header_tus[j]` to `headers[j]`; every
+id is an index into `paths`.
+"""
+
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .base import ensure_dir
+
+
+def header_deps_path(config: Dict) -> str:
+    return config.get("header_deps_json") or os.path.join(
+        os.path.dirname(config["functions_index"]), "header_deps.json"
+    )
+
+
+def includes_of(tu, workdir: str) -> List[str]:
+    """
+    Absolute, normalized paths of every file included by a parsed TU.
+
+    libclang reports headers found through a relative `-I` relative to the
+    directory the TU was parsed from (`workdir`), which is not the cwd of
+    whoever reads them later.
+    """
+    return sorted({
+        os.path.abspath(os.path.join(workdir, inc.include.name))
+        for inc in tu.get_includes() if inc.include is not None
+    })
+
+
+class HeaderGraph:
+
+    def __init__(self):
+        self.deps: Dict[str, Set[str]] = {}
+
+    def add(self, tu: str, headers: Iterable[str]) -> None:
+        self.deps.setdefault(os.path.abspath(tu), set()).update(os.path.abspath(h) for h in headers)
+
+    def update(self, other: "HeaderGraph") -> None:
+        for tu, headers in other.deps.items():
+            self.add(tu, headers)
+
+    # ============================================================
+    # QUERIES
+    # ============================================================
+
+    def headers_of(self, tu: str) -> List[str]:
+        return sorted(self.deps.get(os.path.abspath(tu), ()))
+
+    def reverse(self) -> Dict[str, Set[str]]:
+        rev = defaultdict(set)
+        for tu, headers in self.deps.items():
+            for h in headers:
+                rev[h].add(tu)
+        return rev
+
+    def tus_of(self, header: str) -> List[str]:
+        """TUs to reparse when `header` changes."""
+        return sorted(self.reverse().get(os.path.abspath(header), ()))
+
+    def most_included(self, top: int = 20) -> List[Tuple[str, int]]:
+        counts = [(h, len(tus)) for h, tus in self.reverse().items()]
+        return sorted(counts, key=lambda kv: (-kv[1], kv[0]))[:top]
+
+    # ============================================================
+    # STORAGE
+    # ============================================================
+
+    def save(self, path: str) -> None:
+        rev = self.reverse()
+        paths = sorted(set(self.deps) | set(rev))
+        ids = {p: i for i, p in enumerate(paths)}
+        tus = sorted(self.deps)
+        headers = sorted(rev)
+        data = {
+            "paths": paths,
+            "tus": [ids[t] for t in tus],
+            "tu_headers": [sorted(ids[h] for h in self.deps[t]) for t in tus],
+            "headers": [ids[h] for h in headers],
+            "header_tus": [sorted(ids[t] for t in rev[h]) for h in headers],
+        }
+        ensure_dir(os.path.dirname(path))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "HeaderGraph":
+        graph = cls()
+        if not os.path.exists(path):
+            return graph
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        paths = data["paths"]
+        for tu, headers in zip(data["tus"], data["tu_headers"]):
+            graph.deps[paths[tu]] = {paths[h] for h in headers}
+        return graph
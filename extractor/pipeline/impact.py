@@ -0,0 +1,149 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Impact analysis (step 09, `impact_set.json`).
+
+The changed, added and removed functions and the changed tasks are read
+from the change log of the IR (`firmware_ir.json["changes"]`, written by
+ir_builder.py), so there is a single definition of "changed". Changed
+functions are expanded to their transitive callers and to the tasks that
+reach them through the reverse call index of QueryIndex.
+
+Generators use `pending_impact()` to regenerate only what the changes touch.
+The impact set carries its own id and the id of the set before it; a
+consumer that missed a run (or never ran) gets None and regenerates
+everything.
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from .base import PipelineStep, StepIO, load_json, save_json
+from .query import QueryIndex
+
+
+def impact_path(config: Dict) -> str:
+    return config.get("impact_set_json") or os.path.join(
+        os.path.dirname(config["functions_index"]), "impact_set.json"
+    )
+
+
+def pending_impact(config: Dict, state_path: str, consumer: str) -> Optional[Dict]:
+    """
+    The changes this consumer has not handled yet, or None to regenerate everything.
+
+    Call mark_consumed() once the outputs are written.
+    """
+    impact = load_json(impact_path(config))
+    if not impact:
+        return None
+    seen = load_json(state_path).get(consumer)
+    if seen == impact["id"]:
+        # Nothing new since the last time this consumer ran
+        return {key: [] if isinstance(value, list) else value for key, value in impact.items()}
+    if impact.get("full") or seen != impact.get("previous_id"):
+        return None
+    return impact
+
+
+def mark_consumed(config: Dict, state_path: str, consumer: str) -> None:
+    impact = load_json(impact_path(config))
+    if not impact:
+        return
+    state = load_json(state_path)
+    state[consumer] = impact["id"]
+    save_json(state_path, state)
+
+
+class ImpactAnalyzer(PipelineStep):
+    name = "09_build_impact_set"
+
+    def io(self, context):
+        return StepIO(inputs=[self.config["firmware_ir"]], outputs=[impact_path(self.config)])
+
+    def run(self, context):
+        ir = load_json(self.config["firmware_ir"])
+        changes = ir.get("changes", {})
+        generated_at = ir.get("metadata", {}).get("generated_at")
+        old_impact = load_json(impact_path(self.config))
+
+        if old_impact and old_impact.get("ir_generated_at") == generated_at:
+            self.log("IR unchanged since the last impact set")
+            return
+
+        # The change log only covers the last IR run: an IR run this step missed means starting over
+        full = (
+            not changes or changes.get("full_rebuild")
+            or changes.get("previous_generated_at") != old_impact.get("ir_generated_at")
+        )
+
+        fn_changes = changes.get("functions", {})
+        if full:
+            added, removed = sorted(ir.get("functions", {})), []
+            changed = structural = set(added)
+            tasks_changed = sorted(ir.get("tasks", {}))
+        else:
+            added, removed = fn_changes.get("added", []), fn_changes.get("removed", [])
+            changed = set(added) | set(removed) | set(fn_changes.get("changed", []))
+            structural = set(fn_changes.get("structural", []))
+            task_changes = changes.get("tasks", {})
+            tasks_changed = sorted(
+                set(task_changes.get("added", [])) | set(task_changes.get("removed", []))
+                | set(task_changes.get("changed", []))
+            )
+
+        reach = QueryIndex(ir).impact(sorted(changed))
+
+        logged_files = fn_changes.get("files", {})
+        ir_functions = ir.get("functions", {})
+
+        def files_of(names):
+            files = set()
+            for n in names:
+                paths = logged_files.get(n) or [ir_functions.get(n, {}).get("file")]
+                files.update(os.path.normpath(p) for p in paths if p)
+            return sorted(files)
+
+        impact = {
+            "id": datetime.utcnow().isoformat() + "Z",
+            "previous_id": old_impact.get("id"),
+            "ir_generated_at": generated_at,
+            "full": bool(full),
+            "changed_functions": sorted(changed),
+            "added_functions": added,
+            "removed_functions": removed,
+            "structural_functions": sorted(structural),
+            "impacted_callers": reach["callers"],
+            "impacted_tasks": sorted(set(reach["tasks"]) | set(tasks_changed)),
+            "tasks_changed": tasks_changed,
+            "changed_files": files_of(changed),
+            "structural_files": files_of(structural),
+            "impacted_files": files_of(changed | set(reach["callers"])),
+        }
+
+        save_json(impact_path(self.config), impact)
+        context["impact_set"] = impact_path(self.config)
+
+        if impact["full"]:
+            self.log(f"Full rebuild: everything is impacted ({len(added)} functions)")
+        else:
+            self.log(
+                f"{len(changed)} changed function(s) ({len(structural)} structural), "
+                f"{len(reach['callers'])} transitive caller(s), {len(impact['impacted_tasks'])} task(s) impacted"
+            )
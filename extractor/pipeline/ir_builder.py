@@ -14,13 +14,29 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import glob
+import os
 from datetime import datetime
 from .base import PipelineStep, load_json, save_json, StepIO
+from .function_detail_builder import FunctionDetailBuilder
+from .sampling import load_coverage
+
+
+def diff_entries(old: dict, new: dict) -> dict:
+    """Compare two name -> entry maps and list added, removed and changed names."""
+    return {
+        "added": sorted(k for k in new if k not in old),
+        "removed": sorted(k for k in old if k not in new),
+        "changed": sorted(k for k in new if k in old and old[k] != new[k]),
+    }
+
 
 class IRBuilder(PipelineStep):
     name = "01_build_firmware_ir"
 
     def io(self, context):
+        # Body hashes come from the function details, rewritten in place when a body changes
+        details = glob.glob(os.path.join(self.config["functions_detail_dir"], "*.json"))
         return StepIO(
             inputs=[
                 self.config["tasks"],
@@ -28,20 +44,19 @@ class IRBuilder(PipelineStep):
                 self.config["functions_index"],
                 self.config["function_categories"],
                 self.config["call_graph"],
-            ],
+            ] + details,
             outputs=[self.config["firmware_ir"]]
         )
 
-    def run(self, context):
-        tasks = load_json(self.config["tasks"])
-        task_call_graph = load_json(self.config["task_call_graph"])
-        functions_index = load_json(self.config["functions_index"])
-        function_categories = load_json(self.config["function_categories"])
-        call_graph = load_json(self.config["call_graph"])
+    # ============================================================
+    # IR SECTIONS
+    # ============================================================
 
-        ir = {
+    @staticmethod
+    def empty_ir():
+        return {
             "metadata": {
-                "generated_at": datetime.utcnow().isoformat() + "Z",
+                "generated_at": None,
                 "source": "static analysis (clang + heuristics)",
                 "language": "C / C++",
                 "target": "embedded firmware",
@@ -49,21 +64,42 @@ class IRBuilder(PipelineStep):
             },
             "tasks": {},
             "functions": {},
-            "call_graph": call_graph
+            "call_graph": {}
         }
 
+    def body_hashes(self, functions_index):
+        """body_hash of every function, from its function detail (step 08 runs first)."""
+        detail_dir = self.config["functions_detail_dir"]
+        hashes = {}
+        for fn in functions_index:
+            path = os.path.join(detail_dir, FunctionDetailBuilder.sanitize_filename(fn) + ".json")
+            if os.path.exists(path):
+                hashes[fn] = load_json(path).get("body_hash")
+        return hashes
+
+    def build_functions(self, functions_index, function_categories):
+        hashes = self.body_hashes(functions_index)
+        functions = {}
         for fn, info in functions_index.items():
-            ir["functions"][fn] = {
+            functions[fn] = {
                 "file": info.get("file"),
                 "line": info.get("line"),
-                "category": function_categories.get(fn, "unknown")
+                "category": function_categories.get(fn, "unknown"),
+                "body_hash": hashes.get(fn),
             }
+            # Found by the lexer fallback, not by clang
+            if info.get("heuristic"):
+                functions[fn]["heuristic"] = True
+        return functions
 
+    @staticmethod
+    def build_tasks(tasks, task_call_graph, function_categories):
+        ir_tasks = {}
         for task_name, task_info in tasks.items():
             entry = task_info["entry_function"]
             reachable = task_call_graph.get(task_name, {}).get("reachable_functions", [])
 
-            ir["tasks"][task_name] = {
+            ir_tasks[task_name] = {
                 "entry_function": entry,
                 "defined_in": {"file": task_info.get("file"), "line": task_info.get("line")},
                 "reachable_functions": reachable,
@@ -78,9 +114,145 @@ class IRBuilder(PipelineStep):
 
             for fn in reachable:
                 cat = function_categories.get(fn, "unknown")
-                ir["tasks"][task_name]["function_categories"][cat].append(fn)
+                ir_tasks[task_name]["function_categories"][cat].append(fn)
+        return ir_tasks
+
+    # ============================================================
+    # DELTA
+    # ============================================================
+
+    @staticmethod
+    def compute_delta(previous, functions, ir_tasks, call_graph):
+        """
+        A function is keyed on its IR entry (file, category, body hash) plus
+        its callee list, so any body edit is reported as "changed". The line
+        is left out: inserting a line must not mark every later function of
+        the file as changed. A task changes when its reachable set does.
+
+        Functions also list the "structural" subset (added, removed, moved to
+        another file or with different callees) and the "files" each touched
+        function lives in, before and after.
+        """
+        prev_functions = previous.get("functions", {})
+        prev_call_graph = previous.get("call_graph", {})
+
+        def fn_view(fns, cg):
+            return {
+                name: {
+                    "entry": {k: v for k, v in (fns.get(name) or {}).items() if k != "line"},
+                    "calls": cg.get(name),
+                }
+                for name in set(fns) | set(cg)
+            }
+
+        def task_view(tasks):
+            return {name: sorted(t.get("reachable_functions", [])) for name, t in tasks.items()}
+
+        old, new = fn_view(prev_functions, prev_call_graph), fn_view(functions, call_graph)
+        fn_delta = diff_entries(old, new)
+        fn_delta["structural"] = sorted(set(fn_delta["added"]) | set(fn_delta["removed"]) | {
+            n for n in fn_delta["changed"]
+            if old[n]["entry"].get("file") != new[n]["entry"].get("file") or old[n]["calls"] != new[n]["calls"]
+        })
+        fn_delta["files"] = {
+            n: sorted({view[n]["entry"].get("file") for view in (old, new) if n in view} - {None})
+            for n in fn_delta["added"] + fn_delta["removed"] + fn_delta["changed"]
+        }
+
+        return {
+            "functions": fn_delta,
+            "tasks": diff_entries(task_view(previous.get("tasks", {})), task_view(ir_tasks)),
+        }
+
+    @staticmethod
+    def apply_delta(ir, delta, functions, ir_tasks, call_graph):
+        fn_delta = delta["functions"]
+        for name in fn_delta["removed"]:
+            ir["functions"].pop(name, None)
+            ir["call_graph"].pop(name, None)
+
+        for name in fn_delta["added"] + fn_delta["changed"]:
+            for section, source in (("functions", functions), ("call_graph", call_graph)):
+                if name in source:
+                    ir[section][name] = source[name]
+                else:
+                    ir[section].pop(name, None)
+
+        # Functions that only moved are not in the delta but keep their line current
+        for name, entry in functions.items():
+            if name in ir["functions"]:
+                ir["functions"][name]["line"] = entry.get("line")
+
+        task_delta = delta["tasks"]
+        for name in task_delta["removed"]:
+            ir["tasks"].pop(name, None)
+        # Entries are refreshed as a whole; only the reachable set decides what is reported
+        ir["tasks"].update(ir_tasks)
+
+        return ir
+
+    # ============================================================
+    # RUN
+    # ============================================================
+
+    def run(self, context):
+        tasks = load_json(self.config["tasks"])
+        task_call_graph = load_json(self.config["task_call_graph"])
+        functions_index = load_json(self.config["functions_index"])
+        function_categories = load_json(self.config["function_categories"])
+        call_graph = load_json(self.config["call_graph"])
+
+        functions = self.build_functions(functions_index, function_categories)
+        ir_tasks = self.build_tasks(tasks, task_call_graph, function_categories)
+
+        previous = {} if self.force else load_json(self.config["firmware_ir"])
+        full_rebuild = not all(k in previous for k in ("functions", "tasks", "call_graph"))
+        if full_rebuild:
+            previous = {}
+
+        delta = self.compute_delta(previous, functions, ir_tasks, call_graph)
+
+        if full_rebuild:
+            ir = self.empty_ir()
+        else:
+            ir = previous
+
+        # An IR written before metadata existed still patches cleanly
+        previous_generated_at = ir.get("metadata", {}).get("generated_at")
+        ir.setdefault("metadata", self.empty_ir()["metadata"])
+        ir["metadata"]["generated_at"] = datetime.utcnow().isoformat() + "Z"
+
+        self.apply_delta(ir, delta, functions, ir_tasks, call_graph)
+
+        # --sample runs only see part of the code base
+        coverage = load_coverage(self.config)
+        ir["metadata"]["partial"] = bool(coverage.get("partial"))
+        if ir["metadata"]["partial"]:
+            ir["metadata"]["coverage"] = {
+                k: coverage[k] for k in
+                ("sample_fraction", "tus_total", "tus_analyzed", "byte_coverage", "functions_estimated")
+            }
+        else:
+            ir["metadata"].pop("coverage", None)
+
+        # Change log consumed by downstream generators to limit regeneration
+        ir["changes"] = {
+            "full_rebuild": full_rebuild,
+            "previous_generated_at": previous_generated_at,
+            "functions": delta["functions"],
+            "tasks": delta["tasks"],
+        }
 
         save_json(self.config["firmware_ir"], ir)
         context["firmware_ir"] = self.config["firmware_ir"]
-        self.log("Generated firmware_ir.json")
+        context["firmware_ir_changes"] = ir["changes"]
 
+        fn_delta = delta["functions"]
+        if full_rebuild:
+            self.log(f"Generated firmware_ir.json ({len(ir['functions'])} functions)")
+        else:
+            self.log(
+                f"Patched firmware_ir.json: +{len(fn_delta['added'])} "
+                f"-{len(fn_delta['removed'])} ~{len(fn_delta['changed'])} functions, "
+                f"{len(delta['tasks']['changed'])} tasks changed"
+            )
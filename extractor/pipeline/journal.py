@@ -0,0 +1,69 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Append-only JSON-lines journal, fsync'd after every record.
+
+Used as a write-ahead log for work that is expensive to redo (LLM
+generations): a record is durable as soon as append() returns, so a crash,
+timeout or Ctrl-C loses nothing that had completed. On the next run,
+replay() returns the records (a torn last line from a crash is ignored),
+the caller re-applies them, and clear() compacts the journal once their
+effects are saved elsewhere.
+"""
+
+import json
+import os
+from typing import Dict, List
+
+
+class Journal:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = None
+
+    def append(self, record: Dict) -> None:
+        if self._f is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def replay(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn write at the moment of the crash: that generation never completed
+                    break
+        return records
+
+    def clear(self) -> None:
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
@@ -0,0 +1,355 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Pure-Python lexer extraction: a fallback when libclang fails on a TU, and
+the engine of `pipeline_runner.py --fast`.
+
+Comments, string/char literals and preprocessor lines are blanked (line
+breaks are kept so line numbers stay right), then the declarations at
+file / namespace / extern "C" scope are tokenized. A `{` that follows
+`name(...)` without an `=` opens a function definition; its body is skipped
+by brace matching and every `ident(` in it is a call site. Class, struct,
+enum and initializer bodies are skipped. Like the clang steps, only free
+functions are reported (qualified `A::b` definitions are methods).
+
+`--fast` runs this step in place of the clang steps and writes to
+`<artifacts>/fast/`; `--lexer-fallback` makes the clang steps add what the
+lexer finds in TUs that fail to parse or parse with errors.
+
+Everything produced here is marked `"heuristic": true` in functions_index.
+Macros are not expanded: a function-like macro call is reported as a call,
+and definitions generated by macros are not seen.
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from clang.cindex import Diagnostic
+
+from .base import PipelineStep, StepIO, load_json, save_json
+from .compile_db import loose_sources
+from .edge_log import CallEdges
+
+STRIP_RE = re.compile(
+    r"//[^\n]*"
+    r"|/\*.*?\*/"
+    r'|"(?:\\.|[^"\\\n])*"'
+    r"|'(?:\\.|[^'\\\n])*'"
+    r"|^[ \t]*#(?:[^\n]*\\\n)*[^\n]*",
+    re.S | re.M,
+)
+
+TOKEN_RE = re.compile(r"[A-Za-z_]\w*(?:\s*::\s*~?[A-Za-z_]\w*)*|[{}();=,]")
+
+IDENT_RE = re.compile(r"[A-Za-z_]\w*")
+
+BRACE_RE = re.compile(r"[{}]")
+
+CALL_RE = re.compile(r"\b([A-Za-z_]\w*(?:\s*::\s*~?[A-Za-z_]\w*)*)\s*\(")
+
+# Identifiers followed by "(" that are not calls or function names
+NOT_CALLS = {
+    "if", "for", "while", "switch", "return", "sizeof", "catch", "do", "else", "case",
+    "defined", "alignof", "_Alignof", "__alignof__", "typeof", "__typeof__", "decltype",
+    "typeid", "static_assert", "_Static_assert", "new", "delete", "throw", "noexcept",
+    "static_cast", "dynamic_cast", "reinterpret_cast", "const_cast", "asm", "__asm", "__asm__",
+    "__attribute__", "__declspec", "alignas", "_Pragma", "operator", "void",
+}
+
+# Words in front of a function name that are not part of its return type
+STORAGE = {"static", "inline", "extern", "__inline", "__inline__", "__forceinline",
+           "__STATIC_INLINE", "__STATIC_FORCEINLINE", "__INLINE", "constexpr", "virtual"}
+
+RTOS_TASK_RE = re.compile(r"\b(osThreadNew|osThreadDef|xTaskCreate|xTaskCreateStatic)\s*\(\s*([A-Za-z_]\w*)")
+
+
+def strip_code(text: str) -> str:
+    """Blank comments, literals and preprocessor lines, keeping line breaks."""
+    return STRIP_RE.sub(lambda m: "\n" * m.group().count("\n"), text)
+
+
+def function_head(head: List[tuple], code: str) -> Optional[Dict]:
+    """If the tokens before a `{` are a function declarator, its name, return type and params."""
+    depth = 0
+    name_at = None
+    for i, (tok, _) in enumerate(head):
+        if tok == "(":
+            if depth == 0 and name_at is None and i > 0:
+                prev = head[i - 1][0]
+                if IDENT_RE.fullmatch(prev) and prev not in NOT_CALLS:
+                    name_at = i - 1
+            depth += 1
+        elif tok == ")":
+            depth -= 1
+        elif tok == "=" and depth == 0:
+            return None
+    if name_at is None or depth != 0:
+        return None
+
+    # Parameter text: between the name's "(" and its matching ")"
+    open_pos = head[name_at + 1][1]
+    depth = 0
+    close_pos = open_pos
+    for tok, pos in head[name_at + 1:]:
+        depth += tok == "("
+        depth -= tok == ")"
+        if depth == 0:
+            close_pos = pos
+            break
+
+    params = []
+    raw = " ".join(code[open_pos + 1:close_pos].split())
+    if raw and raw != "void":
+        for part in raw.split(","):
+            part = part.strip()
+            names = IDENT_RE.findall(part)
+            if not names or part == "...":
+                continue
+            pname = names[-1] if len(names) > 1 else ""
+            ptype = part[: part.rfind(pname)].strip() if pname else part
+            params.append({"name": pname, "type": ptype})
+
+    ret = [t for t, _ in head[:name_at] if t not in STORAGE and t not in "(),"]
+    return {"name": head[name_at][0], "pos": head[name_at][1], "return": " ".join(ret), "params": params}
+
+
+def block_end(code: str, pos: int) -> int:
+    """Position of the `}` closing the block whose `{` is just before `pos`."""
+    depth = 1
+    for m in BRACE_RE.finditer(code, pos):
+        depth += 1 if m.group() == "{" else -1
+        if depth == 0:
+            return m.start()
+    return len(code)
+
+
+def scan_text(text: str, path: str) -> Dict:
+    """Functions, calls and RTOS tasks found in one source text."""
+    code = strip_code(text)
+    functions, calls, tasks = {}, {}, {}
+
+    line, line_pos = 1, 0
+
+    def line_of(pos):
+        nonlocal line, line_pos
+        line += code.count("\n", line_pos, pos)
+        line_pos = pos
+        return line
+
+    # Only declarations at file / namespace scope are tokenized; bodies are skipped by brace matching
+    head: List[tuple] = []
+    pos = 0
+    while True:
+        m = TOKEN_RE.search(code, pos)
+        if m is None:
+            break
+        tok, pos = m.group(), m.end()
+
+        if tok == "{":
+            words = [t for t, _ in head]
+            fn = function_head(head, code)
+            head = []
+            if fn is not None and "::" not in fn["name"] and "typedef" not in words:
+                end = block_end(code, pos)
+                functions[fn["name"]] = {
+                    "file": path,
+                    "line": line_of(fn["pos"]),
+                    "return": fn["return"],
+                    "params": fn["params"],
+                    "heuristic": True,
+                }
+                callees = (c.rsplit("::", 1)[-1].strip() for c in CALL_RE.findall(code, pos, end))
+                calls[fn["name"]] = sorted({c for c in callees if c not in NOT_CALLS})
+                pos = end + 1
+            elif "namespace" in words or words == ["extern"]:
+                continue
+            else:
+                # class / struct / enum bodies, initializers
+                pos = block_end(code, pos) + 1
+        elif tok in "};":
+            head = []
+        else:
+            head.append((tok, m.start()))
+
+    for m in RTOS_TASK_RE.finditer(code):
+        kind, entry = m.groups()
+        if entry not in tasks:
+            tasks[entry] = {
+                "entry_function": entry,
+                "file": path,
+                "line": code.count("\n", 0, m.start()) + 1,
+                "type": "CMSIS_v1" if kind == "osThreadDef" else ("CMSIS_v2" if kind == "osThreadNew" else "FreeRTOS"),
+                "heuristic": True,
+            }
+
+    return {"functions": functions, "calls": calls, "tasks": tasks}
+
+
+def scan_file(path: str) -> Dict:
+    path = os.path.normpath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {"functions": {}, "calls": {}, "tasks": {}}
+    # Keyed on mtime and size too, so long-lived processes (watch mode) see edits
+    return _scan_cached(path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=256)
+def _scan_cached(path: str, mtime_ns: int, size: int) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return scan_text(f.read(), path)
+    except OSError:
+        return {"functions": {}, "calls": {}, "tasks": {}}
+
+
+# ============================================================
+# FALLBACK FOR CLANG STEPS
+# ============================================================
+
+def use_fallback(config: Dict) -> bool:
+    return bool(config.get("lexer_fallback"))
+
+
+def has_errors(tu) -> bool:
+    return any(d.severity >= Diagnostic.Error for d in tu.diagnostics)
+
+
+def fallback_functions(src: str, clang_found: Dict) -> Dict:
+    """Lexer functions of `src` that clang did not report (all of them if it failed)."""
+    return {n: info for n, info in scan_file(src)["functions"].items() if n not in clang_found}
+
+
+def fallback_calls(src: str, clang_defined) -> Dict[str, List[str]]:
+    return {n: c for n, c in scan_file(src)["calls"].items() if n not in clang_defined}
+
+
+class DefinedTracker:
+    """Edge sink wrapper remembering which functions clang defined in the current TU."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.defined = set()
+
+    def add_function(self, name):
+        self.defined.add(name)
+        self.sink.add_function(name)
+
+    def add_call(self, caller, callee):
+        self.sink.add_call(caller, callee)
+
+
+def add_fallback_calls(edges, src: str, clang_defined=()) -> int:
+    calls = fallback_calls(src, clang_defined)
+    for fn, callees in calls.items():
+        edges.add_function(fn)
+        for callee in callees:
+            edges.add_call(fn, callee)
+    return len(calls)
+
+
+def prefer_clang(functions: Dict, found: Dict) -> Dict:
+    """functions.update(found), except that heuristic entries never replace clang ones. Returns what was taken."""
+    taken = {
+        n: info for n, info in found.items()
+        if not (info.get("heuristic") and n in functions and not functions[n].get("heuristic"))
+    }
+    functions.update(taken)
+    return taken
+
+
+# ============================================================
+# --fast
+# ============================================================
+
+def fast_config(config: Dict) -> Dict:
+    """Config for --fast: artifacts go to <artifacts>/fast/ so clang runs never mistake them for their own."""
+    artifacts = os.path.dirname(config["functions_index"])
+    fast_dir = os.path.join(artifacts, "fast")
+    cfg = dict(config, fast=True)
+    for key, value in config.items():
+        if key != "compile_commands" and isinstance(value, str) and value.startswith(artifacts + os.sep):
+            cfg[key] = os.path.join(fast_dir, os.path.relpath(value, artifacts))
+    return cfg
+
+
+class LexerExtractor(PipelineStep):
+    name = "02_extract_fast"
+
+    @property
+    def loose(self) -> bool:
+        return self.config.get("toolchain") == "loose_cpp"
+
+    @property
+    def with_tasks(self) -> bool:
+        return not self.loose and self.config.get("project_type") == "firmware"
+
+    def io(self, context):
+        outputs = [self.config["functions_index"], self.config["call_graph"]]
+        if self.with_tasks:
+            outputs.append(self.config["tasks"])
+        inputs = [] if self.loose else [self.config["compile_commands"]]
+        return StepIO(inputs=inputs, outputs=outputs)
+
+    def should_skip(self, context) -> bool:
+        # Source edits do not show in the compile_commands mtime, and a scan is cheap
+        return False
+
+    def sources(self) -> List[str]:
+        if self.loose:
+            project_root = os.path.normpath(self.config["project_root"])
+            source_dir = os.path.normpath(os.path.join(project_root, self.config["source_dir"]))
+            return [os.path.normpath(p) for p in loose_sources(source_dir)]
+        return [
+            os.path.normpath(os.path.join(e["directory"], e["file"]))
+            for e in load_json(self.config["compile_commands"])
+        ]
+
+    def run(self, context):
+        sources = self.sources()
+        jobs = int(self.config.get("jobs") or 1)
+        if jobs > 1 and len(sources) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(scan_file, sources, chunksize=64))
+        else:
+            results = [scan_file(src) for src in sources]
+
+        functions, tasks = {}, {}
+        edges = CallEdges()
+        for result in results:
+            functions.update(result["functions"])
+            for fn, callees in result["calls"].items():
+                edges.add_function(fn)
+                for callee in callees:
+                    edges.add_call(fn, callee)
+            for name, task in result["tasks"].items():
+                tasks.setdefault(name, task)
+
+        save_json(self.config["functions_index"], functions)
+        context["functions_index"] = self.config["functions_index"]
+        edges.finish(self.config["call_graph"])
+        context["call_graph"] = self.config["call_graph"]
+        if self.with_tasks:
+            save_json(self.config["tasks"], tasks)
+            context["tasks"] = self.config["tasks"]
+
+        self.log(f"Scanned {len(sources)} files: {len(functions)} functions, {len(tasks)} tasks (heuristic)")
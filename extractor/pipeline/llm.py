@@ -0,0 +1,435 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Pooled LLM client for the documentation generators (Ollama /api/generate).
+
+`llm_url` may list several servers (e.g. one Ollama instance per socket or
+host). Each backend has its own keep-alive connection pool and a capacity
+(`llm_concurrency`, or "concurrency" in its entry), to match what the server
+runs in parallel (OLLAMA_NUM_PARALLEL). A prompt goes to the least-loaded
+healthy backend. A failed request puts its backend in a cooldown and is
+retried on another one. `generate_async()` runs requests on a thread pool
+sized to the total capacity, which bounds the requests in flight. With a
+ResponseCache (llm_cache.py), a prompt sent before is answered from it.
+
+With `stream=True` the answer is read token by token. It is spooled to
+`<spool_dir>/<prompt hash>-<request id>.part` as it arrives (the file stays after a
+failed or killed generation, to show how far it got), a gap of `stall_timeout`
+seconds between tokens fails the request at once instead of after the full
+`timeout`, and a generation caught looping on the same text is cut off.
+Time to first token and Ollama's eval_count / eval_duration rate are
+reported per backend.
+
+A request may name another model than the client's (model tiering, see
+tiering.py); token counts and durations are then also kept per model.
+
+`map_ordered()` starts a whole list of prompts at once but hands the results
+back in list order, in the event loop thread: callers write files and update
+caches there without locks, and the output order does not depend on which
+request finished first.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .llm_cache import ResponseCache
+from .tiering import estimated_saving
+from .trace import TRACER
+
+DEFAULT_URL = "http://localhost:11434/api/generate"
+DEFAULT_CONCURRENCY = 4
+
+# Seconds a backend is left alone after a failed request
+COOLDOWN = 30.0
+
+# Streaming: seconds to connect, default seconds allowed between two tokens
+CONNECT_TIMEOUT = 10.0
+DEFAULT_STALL_TIMEOUT = 60.0
+
+# A streamed answer whose tail is one chunk of up to REPEAT_MAX_PERIOD characters
+# repeated over at least REPEAT_MIN_SPAN characters (and REPEAT_MIN_COUNT times) is cut
+REPEAT_MAX_PERIOD = 200
+REPEAT_MIN_SPAN = 400
+REPEAT_MIN_COUNT = 4
+REPEAT_CHECK_EVERY = 256
+
+
+def concurrency_from(config: Dict, override: Optional[int] = None) -> int:
+    """--concurrency, else `llm_concurrency` from the project config (per backend)."""
+    return max(1, int(override or config.get("llm_concurrency") or DEFAULT_CONCURRENCY))
+
+
+class Backend:
+    """One server: its own connection pool, in-flight count, health and throughput counters."""
+
+    def __init__(self, url: str, capacity: int):
+        self.url = url
+        self.capacity = max(1, capacity)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.capacity)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.in_flight = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self.eval_tokens = 0
+        self.eval_seconds = 0.0
+        self.first_token_seconds = 0.0
+        self.streamed = 0
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.capacity
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def stats(self, elapsed: float) -> Dict:
+        done = self.requests - self.failures
+        return {
+            "url": self.url,
+            "requests": self.requests,
+            "failures": self.failures,
+            "mean_latency_s": round(self.busy_seconds / self.requests, 3) if self.requests else None,
+            "prompts_per_min": round(done * 60.0 / elapsed, 2) if elapsed else None,
+            "tokens_per_s": round(self.eval_tokens / elapsed, 1) if elapsed else None,
+            "ttft_s": round(self.first_token_seconds / self.streamed, 3) if self.streamed else None,
+            "decode_tokens_per_s": round(self.eval_tokens / self.eval_seconds, 1) if self.eval_seconds else None,
+        }
+
+
+def repetition_start(text: str) -> Optional[int]:
+    """Where the looping tail of `text` starts (after its first occurrence), or None."""
+    for period in range(1, min(REPEAT_MAX_PERIOD, len(text) // REPEAT_MIN_COUNT) + 1):
+        count = max(REPEAT_MIN_COUNT, -(-REPEAT_MIN_SPAN // period))
+        span = period * count
+        if span > len(text):
+            continue
+        unit = text[-period:]
+        if text[-span:] == unit * count:
+            start = len(text) - span
+            while start >= period and text[start - period:start] == unit:
+                start -= period
+            return start + period
+    return None
+
+
+def parse_backends(llm_url: Union[str, List], concurrency: int) -> List[Backend]:
+    """`llm_url` is one URL or a list of URLs / {"url": ..., "concurrency": N} entries."""
+    entries = llm_url if isinstance(llm_url, list) else [llm_url]
+    backends = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            backends.append(Backend(entry["url"], int(entry.get("concurrency") or concurrency)))
+        else:
+            backends.append(Backend(entry, concurrency))
+    if not backends:
+        raise ValueError("llm_url: no endpoint configured")
+    return backends
+
+
+class LLMClient:
+
+    def __init__(self, url: Union[str, List], model: str, concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = 600, options: Optional[Dict] = None, cache: Optional[ResponseCache] = None,
+                 stream: bool = False, stall_timeout: float = DEFAULT_STALL_TIMEOUT, spool_dir: Optional[str] = None):
+        self.model = model
+        self.cache = cache
+        self.timeout = timeout
+        self.stream = stream
+        self.stall_timeout = stall_timeout
+        self.spool_dir = spool_dir
+        self.repetition_cuts = 0
+        self.models = {}
+        self.options = options or {}
+        self.backends = parse_backends(url, concurrency)
+        self.concurrency = sum(b.capacity for b in self.backends)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._started = None
+
+    # ------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------
+
+    def acquire(self, tried) -> Backend:
+        """Least-loaded healthy backend not tried yet for this prompt (the soonest back up if none is healthy)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            candidates = [b for b in self.backends if b not in tried]
+            healthy = [b for b in candidates if b.healthy(now)]
+            if healthy:
+                backend = min(healthy, key=lambda b: b.load)
+            else:
+                backend = min(candidates, key=lambda b: b.down_until)
+            backend.in_flight += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, seconds: float, failed: bool = False, data: Optional[Dict] = None,
+                first_token: Optional[float] = None, model: Optional[str] = None) -> None:
+        with self._lock:
+            if data:
+                m = self.models.setdefault(model or self.model, {
+                    "requests": 0, "seconds": 0.0, "eval_tokens": 0, "eval_seconds": 0.0,
+                    "prompt_tokens": 0, "prompt_seconds": 0.0,
+                })
+                m["requests"] += 1
+                m["seconds"] += seconds
+                m["eval_tokens"] += data.get("eval_count", 0)
+                m["eval_seconds"] += data.get("eval_duration", 0) / 1e9
+                m["prompt_tokens"] += data.get("prompt_eval_count", 0)
+                m["prompt_seconds"] += data.get("prompt_eval_duration", 0) / 1e9
+            backend.in_flight -= 1
+            backend.busy_seconds += seconds
+            if data:
+                backend.eval_tokens += data.get("eval_count", 0)
+                backend.eval_seconds += data.get("eval_duration", 0) / 1e9
+            if first_token is not None:
+                backend.first_token_seconds += first_token
+                backend.streamed += 1
+            if failed:
+                backend.failures += 1
+                backend.down_until = time.monotonic() + COOLDOWN
+            else:
+                backend.down_until = 0.0
+
+    def generate(self, prompt: str, options: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        """
+        Blocking request, answered from the response cache when the same
+        prompt was sent before. A failed request (connection error, timeout,
+        HTTP error, bad JSON) is retried once on each other backend; the last
+        error is raised when all of them failed.
+        """
+        model = model or self.model
+        options = dict(self.options, **(options or {}))
+        if self.cache is not None:
+            cached = self.cache.get(model, options, prompt)
+            if cached is not None:
+                return cached
+
+        tried = set()
+        error = None
+        while len(tried) < len(self.backends):
+            backend = self.acquire(tried)
+            tried.add(backend)
+            started = time.perf_counter()
+            try:
+                with TRACER.span("llm_request", cat="llm", model=model, backend=backend.url,
+                                 prompt_length=len(prompt), stream=self.stream) as span:
+                    try:
+                        if self.stream:
+                            response, data, first_token, cut = self._stream(backend, model, prompt, options, started)
+                        else:
+                            response, data, first_token, cut = self._post(backend, model, prompt, options)
+                    except (requests.RequestException, ValueError) as e:
+                        span["error"] = str(e)
+                        raise
+                    span["response_length"] = len(response)
+                    if first_token is not None:
+                        span["ttft_s"] = round(first_token, 3)
+                    if cut:
+                        span["repetition_cut"] = True
+            except (requests.RequestException, ValueError) as e:
+                self.release(backend, time.perf_counter() - started, failed=True)
+                error = e
+                continue
+            self.release(backend, time.perf_counter() - started, data=data, first_token=first_token, model=model)
+            # A cut answer may come out whole next time: do not make it permanent
+            if self.cache is not None and not cut:
+                self.cache.put(model, options, prompt, response)
+            return response
+        raise error
+
+    def _post(self, backend: Backend, model: str, prompt: str, options: Dict):
+        r = backend.session.post(
+            backend.url,
+            json={
+                "model": model,
+                "prompt": prompt,
+                "stream": False,
+                "options": options,
+            },
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        data = r.json()
+        return data.get("response", ""), data, None, False
+
+    def _stream(self, backend: Backend, model: str, prompt: str, options: Dict, started: float):
+        """Read the NDJSON chunks; returns (response, last chunk, time to first token, cut for repetition)."""
+        spool = None
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # Unique per request: the same prompt may be streaming on another thread
+            name = f"{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]}-{uuid.uuid4().hex[:8]}.part"
+            spool_path = os.path.join(self.spool_dir, name)
+            spool = open(spool_path, "w", encoding="utf-8")
+
+        parts, size, next_check = [], 0, REPEAT_CHECK_EVERY
+        data, first_token, cut = {}, None, False
+        try:
+            # The read timeout applies to every socket read, i.e. between two chunks
+            with backend.session.post(
+                backend.url,
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": True,
+                    "options": options,
+                },
+                timeout=(CONNECT_TIMEOUT, self.stall_timeout),
+                stream=True,
+            ) as r:
+                r.raise_for_status()
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise ValueError(f"LLM error: {data['error']}")
+                    chunk = data.get("response", "")
+                    if chunk:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(chunk)
+                        size += len(chunk)
+                        if spool is not None:
+                            spool.write(chunk)
+                            spool.flush()
+                    if data.get("done"):
+                        break
+                    if size >= next_check:
+                        next_check = size + REPEAT_CHECK_EVERY
+                        text = "".join(parts)
+                        start = repetition_start(text)
+                        if start is not None:
+                            # Closing the stream makes Ollama stop generating
+                            parts, cut = [text[:start]], True
+                            with self._lock:
+                                self.repetition_cuts += 1
+                            break
+                    if time.perf_counter() - started > self.timeout:
+                        raise requests.Timeout(f"no complete answer after {self.timeout}s")
+        except requests.ConnectionError as e:
+            # urllib3 reports a read timeout in the middle of a stream as a connection error
+            if "timed out" in str(e).lower():
+                raise requests.Timeout(f"stalled: no token for {self.stall_timeout}s") from e
+            raise
+        finally:
+            if spool is not None:
+                spool.close()
+
+        if not cut and not data.get("done"):
+            raise ValueError("stream ended before the answer was done")
+        # Kept after a failure, to see where the generation got stuck
+        if spool is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(spool.name)
+        return "".join(parts), data, first_token, cut
+
+    def report(self) -> List[Dict]:
+        """Per-backend counters and throughput since the first request."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+            return [b.stats(elapsed) for b in self.backends]
+
+    def report_lines(self) -> List[str]:
+        """Throughput table (and response cache counters); empty when nothing was asked."""
+        lines = []
+        if self.cache is not None and (self.cache.hits or self.cache.misses):
+            c = self.cache.stats()
+            lines.append(f"LLM cache: {c['hits']} hits, {c['misses']} misses, {c['evicted']} evicted "
+                         f"({c['entries']} entries, {c['stored_mb']} MB in {c['path']})")
+        if self._started is None:
+            return lines
+        lines += [f"{'backend':<40} {'requests':>8} {'failed':>6} {'latency (s)':>11} {'ttft (s)':>8} "
+                  f"{'prompts/min':>11} {'tokens/s':>9} {'decode tok/s':>12}"]
+        for row in self.report():
+            lines.append(
+                f"{row['url']:<40} {row['requests']:>8} {row['failures']:>6} {str(row['mean_latency_s']):>11} "
+                f"{str(row['ttft_s'] or '-'):>8} {str(row['prompts_per_min']):>11} {str(row['tokens_per_s']):>9} "
+                f"{str(row['decode_tokens_per_s'] or '-'):>12}"
+            )
+        if self.repetition_cuts:
+            lines.append(f"{self.repetition_cuts} streamed answer(s) cut off for repeating themselves")
+        if any(model != self.model for model in self.models):
+            lines += self.tier_lines()
+        return lines
+
+    def tier_lines(self) -> List[str]:
+        """Requests and time per model, and the estimated saving against the default model alone."""
+        lines = [f"{'model':<40} {'requests':>8} {'time (s)':>9} {'decode tok/s':>12}"]
+        for model, m in sorted(self.models.items()):
+            rate = round(m["eval_tokens"] / m["eval_seconds"], 1) if m["eval_seconds"] else "-"
+            lines.append(f"{model:<40} {m['requests']:>8} {m['seconds']:>9.1f} {str(rate):>12}")
+        saved = estimated_saving(self.models, self.model)
+        if saved is None:
+            lines.append(f"Tiering saving unknown: no timed answer from {self.model} in this run")
+        else:
+            lines.append(f"Model tiering saved ~{saved:.1f} s of generation compared with {self.model} alone")
+        return lines
+
+    async def generate_async(self, prompt: str, options: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.generate, prompt, options, model)
+
+    async def map_ordered(self, items: Sequence, run: Callable[[object], Awaitable],
+                          on_result: Callable[[object, object], None]) -> List[Tuple[object, Exception]]:
+        """
+        Await run(item) for every item concurrently; call on_result(item, result)
+        in item order. A failed item does not stop the others: the failures are
+        returned as (item, exception) pairs.
+        """
+        tasks = [asyncio.ensure_future(run(item)) for item in items]
+        failures = []
+        try:
+            for item, task in zip(items, tasks):
+                try:
+                    result = await task
+                except Exception as e:
+                    failures.append((item, e))
+                    continue
+                on_result(item, result)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return failures
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for backend in self.backends:
+            backend.session.close()
+        if self.cache is not None:
+            self.cache.close()
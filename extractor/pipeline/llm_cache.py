@@ -0,0 +1,127 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Content-addressed store of LLM responses, shared by every generator.
+
+A response is keyed on (model, options, sha256 of the prompt): any prompt
+byte-identical to an earlier one, sent with the same model and options, is
+answered from here without a request. Rows live in SQLite (WAL, so the
+generators can run side by side) at `llm_cache_db`, default
+`<artifacts>/llm_cache.sqlite`. When the stored responses exceed
+`llm_cache_max_mb` (default 256), the least recently used ones are evicted.
+Set `"llm_cache": false` in the config to bypass it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_MAX_MB = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def cache_key(model: str, options: Dict, prompt: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    canonical = json.dumps([model, options or {}, prompt_hash], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def response_cache_from(config: Dict) -> Optional["ResponseCache"]:
+    if config.get("llm_cache") is False:
+        return None
+    path = config.get("llm_cache_db") or os.path.join(
+        os.path.dirname(config.get("functions_index", "analysis/functions_index.json")), "llm_cache.sqlite"
+    )
+    return ResponseCache(path, int(float(config.get("llm_cache_max_mb", DEFAULT_MAX_MB)) * 1024 * 1024))
+
+
+class ResponseCache:
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection used from the client's worker threads, serialized by the lock
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, model: str, options: Dict, prompt: str) -> Optional[str]:
+        key = cache_key(model, options, prompt)
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, model: str, options: Dict, prompt: str, response: str) -> None:
+        key = cache_key(model, options, prompt)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used rows until the stored responses fit in max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evicted += len(victims)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                "entries": rows, "stored_mb": round(size / (1024 * 1024), 2)}
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,117 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Per-step memory sampling for the run summary.
+
+RSS is read from /proc on Linux, from psutil when it is installed, and
+falls back to the ru_maxrss high-water mark elsewhere. tracemalloc is only
+started on request because it slows Python allocations down noticeably.
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Dict, Optional
+
+MB = 1024 * 1024
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+
+    return peak_rss()
+
+
+def peak_rss() -> Optional[int]:
+    """Lifetime peak RSS of this process in bytes, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """
+    Samples RSS on a background thread while a step runs.
+
+    Use as a context manager; the result is available from `summary()`.
+    """
+
+    def __init__(self, interval: float = 0.1, use_tracemalloc: bool = False):
+        self.interval = interval
+        self.use_tracemalloc = use_tracemalloc
+        self.rss_start = None
+        self.rss_end = None
+        self.rss_peak = None
+        self.tracemalloc_peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None:
+                self.rss_peak = max(self.rss_peak or 0, rss)
+
+    def __enter__(self):
+        self.rss_start = current_rss()
+        self.rss_peak = self.rss_start
+        if self.use_tracemalloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.rss_end = current_rss()
+        if self.rss_end is not None:
+            self.rss_peak = max(self.rss_peak or 0, self.rss_end)
+        if self.use_tracemalloc:
+            _, self.tracemalloc_peak = tracemalloc.get_traced_memory()
+        return False
+
+    def summary(self) -> Dict:
+        def mb(v):
+            return round(v / MB, 1) if v is not None else None
+
+        data = {
+            "rss_start_mb": mb(self.rss_start),
+            "rss_end_mb": mb(self.rss_end),
+            "rss_peak_mb": mb(self.rss_peak),
+        }
+        if self.use_tracemalloc:
+            data["tracemalloc_peak_mb"] = mb(self.tracemalloc_peak)
+        return data
@@ -0,0 +1,369 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Per-TU clang extraction (`pipeline_runner.py --jobs N`, `--sample`).
+
+Replaces steps 02/04/05: each TU is parsed once, in a worker process, and
+visited by the function, call-graph and task collectors of those steps (as
+in watch mode). Results are kept per TU in tu_cache.py, so only TUs whose
+source, headers or arguments changed are parsed again. TUs are submitted
+longest-first using the cost history in scheduling.py; results are merged
+in build order so the artifacts match a sequential run. The run summary
+reports the predicted makespan next to the measured one.
+
+The step is used whenever --jobs, --sample or --since is given, when the
+config sets `"tu_cache": true`, and after a --sample run so that the next run
+completes the partial extraction from the cache. It is never picked just
+because a TU cache is left over from an earlier run.
+
+Processes rather than threads: parsing changes the working directory, which
+is process-wide, and the AST visits hold the GIL.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from .base import PipelineStep, StepIO, load_json, save_json
+from .callgraph_builder import CallGraphBuilder
+from .compile_db import entry_args, loose_parse_args, loose_sources
+from .edge_log import CallEdges
+from .function_extractor import FunctionExtractor
+from .git_changes import changed_files, repo_dir
+from .header_deps import HeaderGraph, header_deps_path, includes_of
+from .lexer_fallback import fallback_calls, fallback_functions, has_errors, prefer_clang, use_fallback
+from .sampling import build_coverage, coverage_path, load_coverage, select_sample
+from .scheduling import CostHistory, history_path, longest_first, makespan
+from .task_extractor import TaskExtractor
+from .trace import TRACER
+from .tu_cache import TUCache, cache_dir
+
+# Per-process state set by init_worker()
+_WORKER: Dict = {}
+
+
+def init_worker(libclang: Optional[str], config: Dict, with_tasks: bool) -> None:
+    from clang.cindex import Config, Index
+
+    if libclang and not Config.loaded:
+        Config.set_library_file(libclang)
+    _WORKER["index"] = Index.create()
+    _WORKER["tasks"] = TaskExtractor(config) if with_tasks else None
+    _WORKER["fallback"] = use_fallback(config)
+
+
+def extract_tu(src: str, workdir: str, args: List[str]) -> Dict:
+    """Parse one TU and run the collectors. Returns plain data (picklable)."""
+    from clang.cindex import TranslationUnit
+
+    started = time.time()
+    t0 = time.perf_counter()
+    result = {"src": src, "pid": os.getpid(), "tid": threading.get_native_id(), "started": started}
+
+    prev_cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        tu = _WORKER["index"].parse(src, args=args, options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD)
+    except Exception as e:
+        if not _WORKER["fallback"]:
+            result.update(error=str(e), seconds=time.perf_counter() - t0)
+            return result
+        functions = fallback_functions(os.path.join(workdir, src), {})
+        result.update(
+            functions=functions,
+            calls=fallback_calls(os.path.join(workdir, src), ()),
+            tasks={},
+            diagnostics=[f"parse failed: {e}"],
+            headers=[],
+            parse_seconds=0.0,
+            cursors=0,
+            fallback=len(functions),
+            lexer_only=True,
+            seconds=time.perf_counter() - t0,
+        )
+        return result
+    finally:
+        os.chdir(prev_cwd)
+
+    parse_seconds = time.perf_counter() - t0
+    stats = {"cursors": 0}
+
+    functions = {}
+    FunctionExtractor.collect_functions(tu.cursor, workdir, functions, stats)
+
+    edges = CallEdges()
+    CallGraphBuilder.collect_calls(tu.cursor, workdir, edges, stats)
+
+    tasks = {}
+    if _WORKER["tasks"] is not None:
+        _WORKER["tasks"].collect_tasks(tu.cursor, workdir, tasks, stats)
+
+    if _WORKER["fallback"] and has_errors(tu):
+        extra = fallback_functions(os.path.join(workdir, src), functions)
+        functions.update(extra)
+        for fn, callees in fallback_calls(os.path.join(workdir, src), edges.graph).items():
+            edges.add_function(fn)
+            for callee in callees:
+                edges.add_call(fn, callee)
+        result["fallback"] = len(extra)
+
+    result.update(
+        functions=functions,
+        calls=edges.graph,
+        tasks=tasks,
+        diagnostics=[str(d) for d in tu.diagnostics],
+        headers=includes_of(tu, workdir),
+        parse_seconds=parse_seconds,
+        cursors=stats["cursors"],
+        seconds=time.perf_counter() - t0,
+    )
+    return result
+
+
+def use_tu_extractor(config: Dict) -> bool:
+    if config.get("jobs") or config.get("sample") or config.get("since") or config.get("tu_cache"):
+        return True
+    # The sequential steps would skip on mtimes and keep a sampled extraction as is
+    return bool(load_coverage(config).get("partial"))
+
+
+class ParallelExtractor(PipelineStep):
+    name = "02_extract_parallel"
+
+    @property
+    def jobs(self) -> int:
+        return int(self.config.get("jobs") or os.cpu_count() or 1)
+
+    @property
+    def loose(self) -> bool:
+        return self.config.get("toolchain") == "loose_cpp"
+
+    @property
+    def with_tasks(self) -> bool:
+        return not self.loose and self.config.get("project_type") == "firmware"
+
+    def io(self, context):
+        outputs = [self.config["functions_index"], self.config["call_graph"], coverage_path(self.config)]
+        if self.with_tasks:
+            outputs.append(self.config["tasks"])
+
+        if self.loose:
+            return StepIO(inputs=[], outputs=outputs)
+        return StepIO(inputs=[self.config["compile_commands"]], outputs=outputs)
+
+    def should_skip(self, context):
+        # --since trusts git, not mtimes
+        if self.config.get("since"):
+            return False
+        # A sampled result is not up to date for a full run, and the other way round
+        if load_json(coverage_path(self.config)).get("sample_fraction") != self.config.get("sample"):
+            return False
+        return super().should_skip(context)
+
+    # ============================================================
+    # WORK LIST
+    # ============================================================
+
+    def units(self) -> List[Tuple[str, str, List[str], int]]:
+        """(src, workdir, args, position) per TU, in build order."""
+        if self.loose:
+            project_root = os.path.normpath(self.config["project_root"])
+            source_dir = os.path.normpath(os.path.join(project_root, self.config["source_dir"]))
+            if not os.path.exists(source_dir):
+                raise FileNotFoundError(f"Source directory not found: {source_dir}")
+            args = loose_parse_args(self.config, project_root, source_dir)
+            return [(os.path.normpath(p), project_root, args, i) for i, p in enumerate(loose_sources(source_dir))]
+
+        units = []
+        for position, entry in enumerate(load_json(self.config["compile_commands"])):
+            workdir = os.path.normpath(entry["directory"])
+            src = os.path.normpath(os.path.join(workdir, entry["file"]))
+            units.append((src, workdir, entry_args(entry), entry.get("index", position)))
+        return units
+
+    # ============================================================
+    # RUN
+    # ============================================================
+
+    def run(self, context):
+        units = self.units()
+        srcs = [u[0] for u in units]
+        root = os.path.normpath(self.config.get("project_root") or (os.path.commonpath(srcs) if srcs else ""))
+
+        selected = list(range(len(units)))
+        fraction = self.config.get("sample")
+        if fraction:
+            sample = select_sample(srcs, fraction, root)
+            selected = [i for i in selected if i in sample]
+            self.log(f"Sampling {len(selected)} of {len(units)} TUs ({fraction:.0%} of each directory/category)")
+
+        changed = None
+        since = self.config.get("since")
+        if since:
+            changed = changed_files(since, repo_dir(self.config))
+            self.log(f"{len(changed)} file(s) changed since {since}")
+
+        cache = TUCache(cache_dir(self.config))
+        results: List[Optional[Dict]] = [None] * len(units)
+        pending = []
+        for i in selected:
+            src, workdir, args, _ = units[i]
+            results[i] = cache.get(src, workdir, args, changed)
+            if results[i] is None:
+                pending.append(i)
+        if len(pending) < len(selected):
+            self.log(f"Reusing {len(selected) - len(pending)} unchanged TU(s) from {cache.path}")
+        summary = context.get("run_summary")
+        if since and summary is not None:
+            summary["since"] = {
+                "rev": since, "changed_files": len(changed), "tus_reparsed": len(pending), "tus_total": len(selected),
+            }
+
+        if pending:
+            self.parse_units(context, units, pending, results, cache)
+
+        self.merge(context, [units[i] for i in selected], [results[i] for i in selected])
+
+        functions_per_tu = {
+            i: list(results[i]["functions"]) for i in selected
+            if results[i] is not None and "error" not in results[i]
+        }
+        coverage = build_coverage(srcs, set(selected), functions_per_tu, root, fraction)
+        save_json(coverage_path(self.config), coverage)
+        if coverage["partial"]:
+            self.log(f"PARTIAL: {coverage['tus_analyzed']}/{coverage['tus_total']} TUs, "
+                     f"{coverage['byte_coverage']:.0%} of source bytes, "
+                     f"~{coverage['functions_estimated']} functions estimated in total")
+
+    def parse_units(self, context, units, pending, results, cache) -> None:
+        srcs = [units[i][0] for i in pending]
+        jobs = max(1, min(self.jobs, len(pending)))
+
+        history = CostHistory(history_path(self.config))
+        predicted, estimated = history.estimate(srcs)
+        order = [pending[k] for k in longest_first(srcs, predicted)]
+        predicted_makespan = makespan([predicted[units[i][0]] for i in order], jobs) / 1000.0
+
+        self.log(f"{len(pending)} TUs on {jobs} workers ({estimated} without history), "
+                 f"predicted makespan {predicted_makespan:.2f}s")
+
+        from clang.cindex import Config
+        libclang = self.config.get("libclang") or os.environ.get("LIBCLANG_PATH") or Config.library_file
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_worker,
+            initargs=(libclang, self.config, self.with_tasks),
+        ) as pool:
+            # The pool hands work out in submission order: longest TUs start first
+            futures = {pool.submit(extract_tu, *units[i][:3]): i for i in order}
+            for future in as_completed(futures):
+                results[futures[future]] = self.collect(context, future.result())
+        actual_makespan = time.perf_counter() - started
+
+        for i in pending:
+            result = results[i]
+            # A TU that only the lexer could read is parsed again next run
+            if "error" not in result and not result.get("lexer_only"):
+                history.update(result["src"], result["seconds"] * 1000.0)
+                cache.put(*units[i][:3], result)
+        history.save()
+
+        work = sum(results[i]["seconds"] for i in pending)
+        schedule = {
+            "jobs": jobs,
+            "tus": len(pending),
+            "estimated_from_size": estimated,
+            "predicted_makespan_s": round(predicted_makespan, 3),
+            "actual_makespan_s": round(actual_makespan, 3),
+            "total_tu_time_s": round(work, 3),
+            "efficiency": round(work / (jobs * actual_makespan), 3) if actual_makespan else None,
+        }
+        summary = context.get("run_summary")
+        if summary is not None:
+            summary["schedule"] = schedule
+        self.log(f"Makespan predicted {predicted_makespan:.2f}s, actual {actual_makespan:.2f}s "
+                 f"({work:.2f}s of TU work, efficiency {schedule['efficiency']})")
+
+    def collect(self, context, result: Dict) -> Dict:
+        """Log, trace and profile one finished TU (in the parent process)."""
+        src = result["src"]
+        if "error" in result:
+            self.log(f"[EXCEPTION] {src}: {result['error']}")
+            return result
+
+        for d in result["diagnostics"]:
+            self.log(f"[CLANG] {src}: {d}")
+        if result.get("fallback"):
+            self.log(f"[FALLBACK] {src}: {result['fallback']} function(s) from the lexer")
+
+        TRACER.record(
+            "parse_tu", result["started"] * 1e6, result["seconds"] * 1e6, cat="tu",
+            pid=result["pid"], tid=result["tid"], tu=src, cursors=result["cursors"],
+        )
+        profiler = context.get("parse_profiler")
+        if profiler is not None:
+            profiler.record_parsed(self.name, src, result["parse_seconds"], result["cursors"],
+                                   len(result["diagnostics"]), result["headers"])
+        return result
+
+    # ============================================================
+    # MERGE (build order)
+    # ============================================================
+
+    def merge(self, context, units, results) -> None:
+        functions, tasks = {}, {}
+        function_origin, task_origin = {}, {}
+        edges = CallGraphBuilder(self.config).make_edge_sink(self.config["call_graph"])
+        header_graph = HeaderGraph()
+
+        for (src, _, _, position), result in zip(units, results):
+            if result is None or "error" in result:
+                continue
+            # Cached entries keep their includes in "deps"
+            header_graph.add(src, result.get("headers") or [d for d in result.get("deps", {}) if d != os.path.abspath(src)])
+            taken = prefer_clang(functions, result["functions"])
+            function_origin.update(dict.fromkeys(taken, position))
+            for fn, callees in result["calls"].items():
+                edges.add_function(fn)
+                for callee in callees:
+                    edges.add_call(fn, callee)
+            for name, task in result["tasks"].items():
+                if name not in tasks:
+                    tasks[name] = task
+                    task_origin[name] = position
+
+        save_json(self.config["functions_index"], functions)
+        context["functions_index"] = self.config["functions_index"]
+        header_graph.save(header_deps_path(self.config))
+        if self.config.get("functions_origin"):
+            save_json(self.config["functions_origin"], function_origin)
+
+        edges.finish(self.config["call_graph"])
+        context["call_graph"] = self.config["call_graph"]
+
+        if self.with_tasks:
+            save_json(self.config["tasks"], tasks)
+            context["tasks"] = self.config["tasks"]
+            if self.config.get("tasks_origin"):
+                save_json(self.config["tasks_origin"], task_origin)
+
+        self.log(f"Extracted {len(functions)} functions, {len(tasks)} tasks")
@@ -0,0 +1,160 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Per-TU and per-header parse cost attribution.
+
+Enabled with `pipeline_runner.py --profile`. Every clang-based step reports
+each parsed TU; header cost is attributed by splitting a TU's parse time
+across the main file and its includes proportionally to their size.
+"""
+
+import csv
+import os
+from collections import defaultdict
+from typing import Dict, List
+
+from .base import ensure_dir, write_text
+from .header_deps import includes_of
+
+
+def file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class ParseProfiler:
+
+    def __init__(self, stub_dirs: List[str] = None):
+        self.tus: List[Dict] = []
+        self.headers: Dict[str, Dict] = defaultdict(
+            lambda: {"attributed_ms": 0.0, "tu_count": 0, "size": 0}
+        )
+        self.stub_dirs = [os.path.abspath(d) for d in (stub_dirs or []) if d]
+
+    def is_stub(self, path: str) -> bool:
+        p = os.path.normpath(path)
+        if "analysis_stubs" in p.replace("\\", "/"):
+            return True
+        return any(p.startswith(d) for d in self.stub_dirs)
+
+    def record(self, step: str, src: str, workdir: str, tu, parse_seconds: float, cursors: int) -> None:
+        self.record_parsed(step, src, parse_seconds, cursors, len(list(tu.diagnostics)), includes_of(tu, workdir))
+
+    def record_parsed(self, step: str, src: str, parse_seconds: float, cursors: int,
+                      diagnostics: int, headers) -> None:
+        """Same as record() for a TU parsed elsewhere (e.g. in a worker process)."""
+        headers = set(headers)
+        parse_ms = parse_seconds * 1000.0
+        self.tus.append({
+            "step": step,
+            "tu": os.path.abspath(src),
+            "parse_ms": round(parse_ms, 3),
+            "diagnostics": diagnostics,
+            "includes": len(headers),
+            "cursors": cursors,
+        })
+
+        total_bytes = file_size(src) + sum(file_size(h) for h in headers)
+        for h in headers:
+            entry = self.headers[h]
+            entry["size"] = file_size(h)
+            entry["tu_count"] += 1
+            if total_bytes:
+                entry["attributed_ms"] += parse_ms * entry["size"] / total_bytes
+
+    # --------------------------------------------------------
+    # REPORTS
+    # --------------------------------------------------------
+
+    def ranked_tus(self) -> List[Dict]:
+        return sorted(self.tus, key=lambda r: r["parse_ms"], reverse=True)
+
+    def ranked_headers(self) -> List[Dict]:
+        rows = []
+        for h, e in self.headers.items():
+            rows.append({
+                "header": h,
+                "attributed_ms": round(e["attributed_ms"], 3),
+                "tu_count": e["tu_count"],
+                "size_bytes": e["size"],
+                "is_stub": self.is_stub(h),
+            })
+        return sorted(rows, key=lambda r: r["attributed_ms"], reverse=True)
+
+    def write_reports(self, out_dir: str, top: int = 25) -> None:
+        ensure_dir(out_dir)
+        tus = self.ranked_tus()
+        headers = self.ranked_headers()
+
+        for name, rows, fields in (
+            ("parse_profile_tus.csv", tus, ["step", "tu", "parse_ms", "diagnostics", "includes", "cursors"]),
+            ("parse_profile_headers.csv", headers, ["header", "attributed_ms", "tu_count", "size_bytes", "is_stub"]),
+        ):
+            with open(os.path.join(out_dir, name), "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+
+        per_step = defaultdict(float)
+        for r in tus:
+            per_step[r["step"]] += r["parse_ms"]
+
+        lines = []
+        lines.append("# Parse Cost Report\n")
+        lines.append(
+            "Header cost is the share of each including TU's parse time proportional "
+            "to the header size, summed over all TUs that include it.\n"
+        )
+        lines.append("## Parse time per step\n")
+        lines.append("| Step | TUs | Parse time (s) |")
+        lines.append("|------|-----|----------------|")
+        for step, ms in sorted(per_step.items()):
+            count = sum(1 for r in tus if r["step"] == step)
+            lines.append(f"| {step} | {count} | {ms / 1000.0:.2f} |")
+
+        lines.append(f"\n## Slowest TUs (top {top})\n")
+        lines.append("| Rank | TU | Step | Parse (ms) | Diagnostics | Includes | Cursors |")
+        lines.append("|------|----|------|------------|-------------|----------|---------|")
+        for i, r in enumerate(tus[:top], 1):
+            lines.append(
+                f"| {i} | `{r['tu']}` | {r['step']} | {r['parse_ms']:.1f} | "
+                f"{r['diagnostics']} | {r['includes']} | {r['cursors']} |"
+            )
+
+        lines.append(f"\n## Most expensive headers (top {top})\n")
+        lines.append("| Rank | Header | Attributed (ms) | Included by TUs | Size (KB) | Stub |")
+        lines.append("|------|--------|-----------------|-----------------|-----------|------|")
+        for i, r in enumerate(headers[:top], 1):
+            lines.append(
+                f"| {i} | `{r['header']}` | {r['attributed_ms']:.1f} | {r['tu_count']} | "
+                f"{r['size_bytes'] / 1024.0:.1f} | {'yes' if r['is_stub'] else ''} |"
+            )
+
+        write_text(os.path.join(out_dir, "PARSE_PROFILE.md"), "\n".join(lines) + "\n")
+
+
+def profile_tu(context, step: str, src: str, workdir: str, tu, parse_seconds: float, cursors: int) -> None:
+    """
+    Report a parsed TU to the profiler, if profiling is enabled for this run.
+    `src` is the TU's path resolved against `workdir`, the directory it was
+    parsed from, so it matches the paths the schedulers look costs up by.
+    """
+    profiler = context.get("parse_profiler")
+    if profiler is not None:
+        profiler.record(step, src, workdir, tu, parse_seconds, cursors)
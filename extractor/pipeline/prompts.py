@@ -0,0 +1,234 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Prompt size in tokens, and the builder the function prompts go through.
+
+Prompts are bounded by the model context, not by string length: a prompt
+gets `llm_context_tokens` (an int, or a {model: tokens} map, default 4096)
+minus the tokens reserved for the answer (num_predict). Token counts are
+estimated at ~4 characters per token, which is close enough for the
+Llama/Mistral tokenizers on code and English without depending on them.
+
+PromptBuilder never sends the same data twice (detail fields the prompt
+already states, raw_body next to the code), writes JSON compactly, and
+trims an oversized prompt in order of least information lost: comments and
+blank lines of the code first, then low-value detail fields, then the tail
+of the code.
+
+Packed prompts document several small functions at once; the answer holds
+one `=== BEGIN name ===` ... `=== END name ===` block per function and is
+split back with split_packed().
+"""
+
+import json
+import re
+import threading
+from typing import Dict, Iterable, List
+
+DEFAULT_CONTEXT_TOKENS = 4096
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def context_tokens(config: Dict, model: str) -> int:
+    value = config.get("llm_context_tokens", DEFAULT_CONTEXT_TOKENS)
+    if isinstance(value, dict):
+        value = value.get(model, value.get("default", DEFAULT_CONTEXT_TOKENS))
+    return int(value)
+
+
+def prompt_budget(config: Dict, model: str, num_predict: int) -> int:
+    """Tokens available for the prompt once the answer is reserved."""
+    return max(context_tokens(config, model) - num_predict, 256)
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Cut at a line boundary (a word one for a single long line) to fit `budget` tokens."""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    cut = cut.rsplit("\n", 1)[0] if "\n" in cut else cut.rsplit(" ", 1)[0]
+    return cut + "\n[...]"
+
+
+def pack(items: List[str], budget: int) -> List[List[str]]:
+    """
+    Split items (one line or paragraph each) into consecutive groups of at
+    most `budget` tokens, joined with newlines. An item bigger than the
+    whole budget is truncated into a group of its own.
+    """
+    groups, current, used = [], [], 0
+    for item in items:
+        cost = estimate_tokens(item) + 1
+        if cost > budget:
+            item = truncate_tokens(item, budget - 3)
+            cost = estimate_tokens(item) + 1
+        if current and used + cost > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current or not groups:
+        groups.append(current)
+    return groups
+
+
+# ============================================================
+# PROMPT BUILDER
+# ============================================================
+
+# Detail fields a function prompt states elsewhere (header lines, Code section) or that mean nothing to a model
+FUNCTION_PROMPT_FIELDS = ("name", "return", "params", "calls", "raw_body", "body_hash")
+
+# Dropped when the prompt is over budget, before any code is cut
+OPTIONAL_FIELDS = ("file", "line_start", "line_end", "fan_out")
+
+# Comments and blank lines go; string and char literals are kept as they are
+COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/|(\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*')", re.S)
+
+
+def format_params(params: List[Dict]) -> str:
+    """[{"name": "x", "type": "int"}] -> "int x" instead of the list's repr."""
+    return ", ".join(f"{p.get('type', '')} {p.get('name', '')}".strip() for p in params or []) or "void"
+
+
+def strip_comments(code: str) -> str:
+    code = COMMENT_RE.sub(lambda m: m.group(1) or " ", code)
+    return "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
+
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class PromptStats:
+    """Estimated tokens before (pretty JSON, duplicated fields, raw code) and after minimization."""
+
+    def __init__(self):
+        self.prompts = 0
+        self.naive_tokens = 0
+        self.sent_tokens = 0
+        self.trimmed = 0
+        self._lock = threading.Lock()
+
+    def add(self, naive: int, sent: int, trimmed: bool) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.naive_tokens += naive
+            self.sent_tokens += sent
+            self.trimmed += trimmed
+
+    def report_line(self) -> str:
+        if not self.prompts:
+            return ""
+        saved = 1 - self.sent_tokens / self.naive_tokens if self.naive_tokens else 0.0
+        return (f"Function prompts: {self.prompts}, ~{self.naive_tokens // self.prompts} -> "
+                f"~{self.sent_tokens // self.prompts} tokens each ({saved:.0%} saved), "
+                f"{self.trimmed} trimmed to the budget")
+
+
+class PromptBuilder:
+    """
+    Text, JSON and code parts joined in order. build() returns the prompt
+    within `budget` tokens and records the saving in `stats`.
+    """
+
+    def __init__(self, budget: int, strip: bool = False, stats: PromptStats = None):
+        self.budget = budget
+        self.strip = strip
+        self.stats = stats
+        self.parts = []
+        self.naive = []
+
+    def add(self, text: str) -> "PromptBuilder":
+        self.parts.append(["text", text])
+        self.naive.append(text)
+        return self
+
+    def add_json(self, data: Dict, omit: Iterable[str] = ()) -> "PromptBuilder":
+        omit = set(omit)
+        self.parts.append(["json", {k: v for k, v in data.items() if k not in omit}])
+        self.naive.append(json.dumps(data, indent=2))
+        return self
+
+    def add_code(self, body: str) -> "PromptBuilder":
+        self.parts.append(["code", strip_comments(body) if self.strip else body])
+        self.naive.append(body)
+        return self
+
+    def render(self) -> str:
+        return "".join(compact_json(value) if kind == "json" else value for kind, value in self.parts)
+
+    def build(self) -> str:
+        prompt = self.render()
+        trimmed = False
+        for trim in (self._strip_code, self._drop_optional, self._cut_code):
+            excess = estimate_tokens(prompt) - self.budget
+            if excess <= 0:
+                break
+            trim(excess)
+            prompt = self.render()
+            trimmed = True
+
+        if estimate_tokens(prompt) > self.budget:
+            prompt = truncate_tokens(prompt, self.budget - 2)
+        if self.stats is not None:
+            self.stats.add(estimate_tokens("".join(self.naive)), estimate_tokens(prompt), trimmed)
+        return prompt
+
+    def _strip_code(self, excess: int) -> None:
+        for part in self.parts:
+            if part[0] == "code":
+                part[1] = strip_comments(part[1])
+
+    def _drop_optional(self, excess: int) -> None:
+        for part in self.parts:
+            if part[0] == "json":
+                part[1] = {k: v for k, v in part[1].items() if k not in OPTIONAL_FIELDS}
+
+    def _cut_code(self, excess: int) -> None:
+        # Keep the head: signature, declarations and the main flow come first
+        for part in self.parts:
+            if part[0] == "code" and excess > 0:
+                keep = max(estimate_tokens(part[1]) - excess - 2, 0)
+                cut = truncate_tokens(part[1], keep) if keep else "[...]"
+                excess -= estimate_tokens(part[1]) - estimate_tokens(cut)
+                part[1] = cut
+
+
+# ============================================================
+# PACKED PROMPTS
+# ============================================================
+
+PACK_BEGIN = "=== BEGIN {} ==="
+PACK_END = "=== END {} ==="
+PACKED_RE = re.compile(r"^=== BEGIN (.+?) ===[ \t]*\n(.*?)\n=== END \1 ===[ \t]*$", re.M | re.S)
+
+
+def split_packed(response: str, names: Iterable[str]) -> Dict[str, str]:
+    """Doc per function of a packed answer; functions without a (non-empty) block are left out."""
+    wanted = set(names)
+    docs = {}
+    for name, doc in PACKED_RE.findall(response):
+        if name in wanted and name not in docs and doc.strip():
+            docs[name] = doc.strip() + "\n"
+    return docs
@@ -0,0 +1,258 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+In-memory query index over firmware_ir.json, plus the client for
+extractor/query_server.py.
+
+    from pipeline.query import QueryClient
+    q = QueryClient()                       # http://127.0.0.1:8765
+    q.callers("HAL_UART_Transmit", transitive=True)
+    q.path("main", "HAL_UART_Transmit")
+
+`QueryIndex` can also be used directly when a script wants the same answers
+without a server.
+"""
+
+import http.client
+import json
+import os
+import socket
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+from urllib.parse import urlencode, urlparse
+
+from .base import load_json
+
+
+class QueryIndex:
+
+    def __init__(self, ir: Dict):
+        self.functions: Dict[str, Dict] = ir.get("functions", {})
+        self.tasks: Dict[str, Dict] = ir.get("tasks", {})
+        self.generated_at = ir.get("metadata", {}).get("generated_at")
+
+        self.forward: Dict[str, List[str]] = {
+            fn: list(callees) for fn, callees in ir.get("call_graph", {}).items()
+        }
+
+        reverse = defaultdict(set)
+        for caller, callees in self.forward.items():
+            for callee in callees:
+                reverse[callee].add(caller)
+        self.reverse: Dict[str, List[str]] = {fn: sorted(c) for fn, c in reverse.items()}
+
+        by_file = defaultdict(list)
+        for fn, info in self.functions.items():
+            if info.get("file"):
+                by_file[os.path.normpath(info["file"])].append(fn)
+        self.by_file: Dict[str, List[str]] = {
+            f: sorted(fns, key=lambda n: self.functions[n].get("line") or 0)
+            for f, fns in by_file.items()
+        }
+
+        reachable_from = defaultdict(list)
+        for task, info in self.tasks.items():
+            for fn in info.get("reachable_functions", []):
+                reachable_from[fn].append(task)
+        self.task_of: Dict[str, List[str]] = dict(reachable_from)
+
+    @classmethod
+    def load(cls, ir_path: str) -> "QueryIndex":
+        return cls(load_json(ir_path))
+
+    # ============================================================
+    # QUERIES
+    # ============================================================
+
+    def _walk(self, edges: Dict[str, List[str]], fn: str, depth: Optional[int]) -> List[str]:
+        seen = {fn}
+        queue = deque([(fn, 0)])
+        out = []
+        while queue:
+            node, d = queue.popleft()
+            if depth is not None and d >= depth:
+                continue
+            for nxt in edges.get(node, []):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    out.append(nxt)
+                    queue.append((nxt, d + 1))
+        return out
+
+    def callees(self, fn: str, transitive: bool = False, depth: Optional[int] = None) -> List[str]:
+        if not transitive:
+            return list(self.forward.get(fn, []))
+        return self._walk(self.forward, fn, depth)
+
+    def callers(self, fn: str, transitive: bool = False, depth: Optional[int] = None) -> List[str]:
+        if not transitive:
+            return list(self.reverse.get(fn, []))
+        return self._walk(self.reverse, fn, depth)
+
+    def impact(self, functions: List[str]) -> Dict[str, List[str]]:
+        """Transitive callers of a set of changed functions, and the tasks that reach any of them."""
+        changed = set(functions)
+        callers = set()
+        queue = deque(changed)
+        while queue:
+            for caller in self.reverse.get(queue.popleft(), []):
+                if caller not in changed and caller not in callers:
+                    callers.add(caller)
+                    queue.append(caller)
+
+        tasks = set()
+        for fn in changed:
+            tasks.update(self.task_of.get(fn, []))
+        tasks.update(t for t, info in self.tasks.items() if info.get("entry_function") in changed)
+        return {"callers": sorted(callers), "tasks": sorted(tasks)}
+
+    def tasks_reaching(self, fn: str) -> List[str]:
+        """Tasks whose entry point reaches `fn`."""
+        return sorted(self.task_of.get(fn, []))
+
+    def task_functions(self, task: str) -> List[str]:
+        return list(self.tasks.get(task, {}).get("reachable_functions", []))
+
+    def path(self, src: str, dst: str) -> Optional[List[str]]:
+        """Shortest call chain src -> ... -> dst, or None."""
+        if src == dst:
+            return [src]
+        parent = {src: None}
+        queue = deque([src])
+        while queue:
+            node = queue.popleft()
+            for nxt in self.forward.get(node, []):
+                if nxt in parent:
+                    continue
+                parent[nxt] = node
+                if nxt == dst:
+                    chain = [dst]
+                    while parent[chain[-1]] is not None:
+                        chain.append(parent[chain[-1]])
+                    return chain[::-1]
+                queue.append(nxt)
+        return None
+
+    def functions_in(self, file: str) -> Dict[str, List[str]]:
+        """Functions per file. `file` may be a full path or a path suffix (e.g. 'src/main.c')."""
+        key = os.path.normpath(file)
+        if key in self.by_file:
+            return {key: self.by_file[key]}
+        suffix = os.sep + key.lstrip(os.sep)
+        return {f: fns for f, fns in self.by_file.items() if f.endswith(suffix)}
+
+    def function(self, name: str) -> Optional[Dict]:
+        info = self.functions.get(name)
+        if info is None:
+            return None
+        return dict(info, name=name, tasks=self.tasks_reaching(name))
+
+    def stats(self) -> Dict:
+        return {
+            "generated_at": self.generated_at,
+            "functions": len(self.functions),
+            "call_graph_nodes": len(self.forward),
+            "edges": sum(len(c) for c in self.forward.values()),
+            "tasks": len(self.tasks),
+            "files": len(self.by_file),
+        }
+
+
+# ============================================================
+# CLIENT
+# ============================================================
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class QueryError(RuntimeError):
+    pass
+
+
+class QueryClient:
+    """Keeps one keep-alive connection to the query server."""
+
+    def __init__(self, url: str = "http://127.0.0.1:8765", socket_path: str = None, timeout: float = 5.0):
+        if socket_path:
+            self._connect = lambda: UnixHTTPConnection(socket_path, timeout)
+        else:
+            parsed = urlparse(url)
+            self._connect = lambda: http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        self._conn = None
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, endpoint: str, **params):
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        target = f"/{endpoint}" + (f"?{query}" if query else "")
+
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.request("GET", target)
+                resp = self._conn.getresponse()
+                body = json.loads(resp.read().decode("utf-8"))
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed the idle connection: reconnect once
+                self.close()
+                if attempt:
+                    raise
+
+        if resp.status != 200:
+            raise QueryError(body.get("error", f"HTTP {resp.status}"))
+        return body["result"]
+
+    def callers(self, fn: str, transitive: bool = False, depth: int = None) -> List[str]:
+        return self.get("callers", fn=fn, transitive=int(transitive), depth=depth)
+
+    def callees(self, fn: str, transitive: bool = False, depth: int = None) -> List[str]:
+        return self.get("callees", fn=fn, transitive=int(transitive), depth=depth)
+
+    def tasks_reaching(self, fn: str) -> List[str]:
+        return self.get("tasks", fn=fn)
+
+    def impact(self, functions: List[str]) -> Dict[str, List[str]]:
+        return self.get("impact", fn=",".join(functions))
+
+    def task_functions(self, task: str) -> List[str]:
+        return self.get("reachable", task=task)
+
+    def path(self, src: str, dst: str) -> Optional[List[str]]:
+        return self.get("path", src=src, dst=dst)
+
+    def functions_in(self, file: str) -> Dict[str, List[str]]:
+        return self.get("file", path=file)
+
+    def function(self, name: str) -> Optional[Dict]:
+        return self.get("function", name=name)
+
+    def stats(self) -> Dict:
+        return self.get("stats")
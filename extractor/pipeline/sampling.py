@@ -0,0 +1,124 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Quick-look sampling (`pipeline_runner.py --sample [FRACTION]`).
+
+TUs are grouped into strata by directory and by category (the path rules of
+the function classifier: application / driver / rtos / utility). Each
+stratum contributes `ceil(FRACTION * size)` TUs, at least one, chosen by a
+stable hash of the path so the same sample is drawn on every run.
+
+The TU extractor records what was analyzed in `extraction_coverage.json`;
+the IR metadata and the architecture overview mark the results as partial
+and extrapolate totals from the sampled share of source bytes.
+"""
+
+import hashlib
+import math
+import os
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from .base import load_json
+from .classifier import classify_function
+from .profiling import file_size
+
+
+def coverage_path(config: Dict) -> str:
+    return config.get("extraction_coverage_json") or os.path.join(
+        os.path.dirname(config["functions_index"]), "extraction_coverage.json"
+    )
+
+
+def stratum(src: str, root: str) -> Tuple[str, str]:
+    directory = os.path.dirname(src)
+    if root and directory.startswith(root):
+        directory = os.path.relpath(directory, root)
+    return directory.replace("\\", "/"), classify_function("", src)
+
+
+def select_sample(srcs: List[str], fraction: float, root: str) -> Set[int]:
+    """Indexes of the sampled TUs."""
+    strata: Dict[Tuple[str, str], List[int]] = OrderedDict()
+    for i, src in enumerate(srcs):
+        strata.setdefault(stratum(src, root), []).append(i)
+
+    selected = set()
+    for members in strata.values():
+        count = max(1, math.ceil(fraction * len(members)))
+        members = sorted(members, key=lambda i: hashlib.sha1(srcs[i].encode("utf-8")).hexdigest())
+        selected.update(members[:count])
+    return selected
+
+
+def build_coverage(srcs: List[str], analyzed: Set[int], functions_per_tu: Dict[int, List[str]],
+                   root: str, fraction: float = None) -> Dict:
+    """Per-stratum counts of analyzed TUs and bytes, with extrapolated function totals."""
+    strata: Dict[Tuple[str, str], Dict] = OrderedDict()
+    for i, src in enumerate(srcs):
+        s = strata.setdefault(stratum(src, root), {"tus": 0, "analyzed": 0, "bytes": 0,
+                                                    "analyzed_bytes": 0, "functions": set()})
+        size = file_size(src)
+        s["tus"] += 1
+        s["bytes"] += size
+        if i in analyzed:
+            s["analyzed"] += 1
+            s["analyzed_bytes"] += size
+            s["functions"].update(functions_per_tu.get(i, []))
+
+    rows = []
+    for (directory, category), s in sorted(strata.items()):
+        found = len(s["functions"])
+        share = s["analyzed_bytes"] / s["bytes"] if s["bytes"] else (1.0 if s["analyzed"] else 0.0)
+        rows.append({
+            "directory": directory,
+            "category": category,
+            "tus": s["tus"],
+            "analyzed": s["analyzed"],
+            "byte_coverage": round(share, 3),
+            "functions_found": found,
+            "functions_estimated": round(found / share) if share else None,
+        })
+
+    total_bytes = sum(s["bytes"] for s in strata.values())
+    analyzed_bytes = sum(s["analyzed_bytes"] for s in strata.values())
+    return {
+        "partial": len(analyzed) < len(srcs),
+        "sample_fraction": fraction,
+        "tus_total": len(srcs),
+        "tus_analyzed": len(analyzed),
+        "byte_coverage": round(analyzed_bytes / total_bytes, 3) if total_bytes else 1.0,
+        "functions_estimated": sum(r["functions_estimated"] or 0 for r in rows),
+        "strata": rows,
+    }
+
+
+def load_coverage(config: Dict) -> Dict:
+    """
+    Coverage of the current functions_index, or {} if unknown.
+
+    The file is ignored when functions_index is newer than it, i.e. when a
+    sequential extraction (which does not write coverage) ran afterwards.
+    """
+    path = coverage_path(config)
+    index = config["functions_index"]
+    if not os.path.exists(path) or not os.path.exists(index):
+        return {}
+    if os.path.getmtime(path) < os.path.getmtime(index):
+        return {}
+    return load_json(path)
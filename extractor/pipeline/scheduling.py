@@ -0,0 +1,96 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Cost-aware TU scheduling for parallel extraction (`pipeline_runner.py --jobs N`).
+
+Every parallel run stores the measured cost of each TU (parse + AST visits,
+in ms) in `<artifacts>/tu_cost_history.json`. The next run orders TUs by
+that cost, longest first, so the slow TUs start early and the tail of the
+run is made of short ones. TUs without history get an estimate from their
+source size, scaled by the ms-per-byte ratio of the TUs that do have one.
+"""
+
+import heapq
+import os
+from typing import Dict, List, Tuple
+
+from .base import load_json, save_json
+from .profiling import file_size
+
+# Used for the size estimate until a run has measured something
+DEFAULT_MS_PER_BYTE = 0.1
+
+# Weight of the newest measurement in the smoothed cost
+SMOOTHING = 0.5
+
+
+def history_path(config: Dict) -> str:
+    return config.get("tu_cost_history_json") or os.path.join(
+        os.path.dirname(config["functions_index"]), "tu_cost_history.json"
+    )
+
+
+class CostHistory:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tus: Dict[str, Dict] = load_json(path).get("tus", {})
+
+    def ms_per_byte(self) -> float:
+        total_ms = sum(t["cost_ms"] for t in self.tus.values() if t.get("size"))
+        total_bytes = sum(t["size"] for t in self.tus.values() if t.get("size"))
+        return total_ms / total_bytes if total_bytes else DEFAULT_MS_PER_BYTE
+
+    def estimate(self, srcs: List[str]) -> Tuple[Dict[str, float], int]:
+        """Predicted cost in ms per TU, and how many of them were estimated from size."""
+        ratio = self.ms_per_byte()
+        costs, estimated = {}, 0
+        for src in srcs:
+            known = self.tus.get(src)
+            if known is not None:
+                costs[src] = known["cost_ms"]
+            else:
+                costs[src] = file_size(src) * ratio
+                estimated += 1
+        return costs, estimated
+
+    def update(self, src: str, cost_ms: float) -> None:
+        known = self.tus.get(src)
+        if known is not None:
+            cost_ms = SMOOTHING * cost_ms + (1 - SMOOTHING) * known["cost_ms"]
+        self.tus[src] = {
+            "cost_ms": round(cost_ms, 3),
+            "size": file_size(src),
+            "runs": (known or {}).get("runs", 0) + 1,
+        }
+
+    def save(self) -> None:
+        save_json(self.path, {"tus": self.tus})
+
+
+def longest_first(srcs: List[str], costs: Dict[str, float]) -> List[int]:
+    """Indexes of `srcs` by decreasing cost (ties in build order)."""
+    return sorted(range(len(srcs)), key=lambda i: (-costs[srcs[i]], i))
+
+
+def makespan(durations: List[float], workers: int) -> float:
+    """Finish time of list scheduling: each duration goes to the first free worker."""
+    free = [0.0] * max(1, workers)
+    for d in durations:
+        heapq.heapreplace(free, free[0] + d)
+    return max(free)
@@ -0,0 +1,193 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Sharded extraction (`pipeline_runner.py --shard i/N`, `--merge-shards N`).
+
+compile_commands entries are split deterministically into N shards of
+similar cost (greedy longest-first). The weight of a TU is its parse time
+from earlier `--profile` reports when known, its file size otherwise. Each
+shard runs the clang steps on its own entries and writes to
+`<artifacts>/shards/<i>of<N>/`; shard entries carry their position in the
+full database so the merge can resolve duplicate definitions exactly like
+a single run would (last TU wins for functions, first TU for tasks).
+"""
+
+import csv
+import glob
+import heapq
+import json
+import os
+from typing import Dict, List, Tuple
+
+from .base import load_json, save_json
+from .edge_log import CallEdges
+from .header_deps import HeaderGraph, header_deps_path
+from .profiling import file_size
+
+SHARD_OUTPUTS = ["functions_index", "call_graph", "tasks"]
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'2/4' -> (2, 4). Shards are numbered from 1."""
+    try:
+        index, count = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise SystemExit(f"--shard expects i/N (e.g. 1/4), got '{spec}'")
+    if count < 1 or not 1 <= index <= count:
+        raise SystemExit(f"--shard {spec}: index must be between 1 and {max(count, 1)}")
+    return index, count
+
+
+def shard_dir(config: Dict, index: int, count: int) -> str:
+    base = config.get("shards_dir") or os.path.join(os.path.dirname(config["functions_index"]), "shards")
+    return os.path.join(base, f"{index}of{count}")
+
+
+def shard_config(config: Dict, index: int, count: int) -> Dict:
+    """Config for one shard: clang outputs (and origin maps) go to the shard directory."""
+    out_dir = shard_dir(config, index, count)
+    cfg = dict(config)
+    for key in SHARD_OUTPUTS:
+        cfg[key] = os.path.join(out_dir, os.path.basename(config[key]))
+    cfg["compile_commands"] = os.path.join(out_dir, "compile_commands.json")
+    cfg["functions_origin"] = os.path.join(out_dir, "functions_origin.json")
+    cfg["tasks_origin"] = os.path.join(out_dir, "tasks_origin.json")
+    cfg["header_deps_json"] = os.path.join(out_dir, os.path.basename(header_deps_path(config)))
+    return cfg
+
+
+# ============================================================
+# PARTITION
+# ============================================================
+
+def previous_costs(config: Dict) -> Dict[str, float]:
+    """Parse ms per TU (all steps summed) from the latest --profile reports, including shard runs."""
+    artifacts = os.path.dirname(config["functions_index"])
+    profile_dir = config.get("profile_dir") or os.path.join(artifacts, "profile")
+    paths = [os.path.join(profile_dir, "parse_profile_tus.csv")]
+    paths += glob.glob(os.path.join(artifacts, "shards", "*", "profile", "parse_profile_tus.csv"))
+
+    # Newer reports win: a TU may appear in a full-run profile and in a shard profile
+    costs: Dict[str, float] = {}
+    for path in sorted((p for p in paths if os.path.exists(p)), key=os.path.getmtime):
+        report: Dict[str, float] = {}
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                tu = os.path.normpath(row["tu"])
+                report[tu] = report.get(tu, 0.0) + float(row["parse_ms"] or 0)
+        costs.update(report)
+    return costs
+
+
+def entry_source(entry: Dict) -> str:
+    return os.path.normpath(os.path.join(entry["directory"], entry["file"]))
+
+
+def partition(entries: List[Dict], count: int, costs: Dict[str, float] = None) -> List[List[int]]:
+    """Assign entry indexes to `count` shards, heaviest TU first onto the lightest shard."""
+    costs = costs or {}
+
+    # Parse cost and size are not comparable: only use costs when every TU has one
+    srcs = [entry_source(e) for e in entries]
+    if srcs and all(s in costs for s in srcs):
+        weights = [costs[s] for s in srcs]
+    else:
+        weights = [float(file_size(s)) for s in srcs]
+
+    order = sorted(range(len(entries)), key=lambda i: (-weights[i], srcs[i], i))
+    loads = [(0.0, shard) for shard in range(count)]
+    heapq.heapify(loads)
+    shards = [[] for _ in range(count)]
+    for i in order:
+        load, shard = heapq.heappop(loads)
+        shards[shard].append(i)
+        heapq.heappush(loads, (load + weights[i], shard))
+
+    return [sorted(s) for s in shards]
+
+
+def write_shard_commands(entries: List[Dict], indexes: List[int], out_path: str) -> bool:
+    """Write the shard's compile_commands (with "index"); only touch the file when it changes."""
+    shard_entries = [dict(entries[i], index=i) for i in indexes]
+    if os.path.exists(out_path) and load_json(out_path) == shard_entries:
+        return False
+    save_json(out_path, shard_entries)
+    return True
+
+
+# ============================================================
+# MERGE
+# ============================================================
+
+def merge_shards(config: Dict, count: int, log=print) -> Dict[str, int]:
+    dirs = [shard_dir(config, i, count) for i in range(1, count + 1)]
+    missing = [d for d in dirs if not os.path.exists(os.path.join(d, os.path.basename(config["functions_index"])))]
+    if missing:
+        raise SystemExit(f"Missing shard outputs (run --shard i/{count} first): {', '.join(missing)}")
+
+    functions, function_origin = {}, {}
+    tasks, task_origin = {}, {}
+    graph = {}
+    header_graph = HeaderGraph()
+    duplicates = 0
+
+    for i, d in enumerate(dirs, 1):
+        cfg = shard_config(config, i, count)
+        shard_functions = load_json(cfg["functions_index"])
+        origins = load_json(cfg["functions_origin"])
+        for name, info in shard_functions.items():
+            pos = origins.get(name, -1)
+            if name in functions:
+                duplicates += 1
+                # Clang definitions beat lexer fallback ones (--lexer-fallback), then the last TU wins
+                rank = (not info.get("heuristic"), pos)
+                if rank <= (not functions[name].get("heuristic"), function_origin[name]):
+                    continue
+            functions[name] = info
+            function_origin[name] = pos
+
+        for caller, callees in load_json(cfg["call_graph"]).items():
+            graph.setdefault(caller, set()).update(callees)
+
+        header_graph.update(HeaderGraph.load(cfg["header_deps_json"]))
+
+        origins = load_json(cfg["tasks_origin"])
+        for name, info in load_json(cfg["tasks"]).items():
+            pos = origins.get(name, -1)
+            if name not in tasks or pos < task_origin[name]:
+                tasks[name] = info
+                task_origin[name] = pos
+
+    # Deterministic order whatever the shard count: by the TU that provided the definition
+    functions = dict(sorted(functions.items(), key=lambda kv: (function_origin[kv[0]], kv[0])))
+    save_json(config["functions_index"], functions)
+
+    edges = CallEdges()
+    for caller in sorted(graph):
+        edges.add_function(caller)
+        for callee in graph[caller]:
+            edges.add_call(caller, callee)
+    edges.finish(config["call_graph"])
+    header_graph.save(header_deps_path(config))
+
+    if config.get("project_type") == "firmware":
+        save_json(config["tasks"], dict(sorted(tasks.items(), key=lambda kv: (task_origin[kv[0]], kv[0]))))
+
+    stats = {"shards": count, "functions": len(functions), "duplicates": duplicates,
+             "call_graph": len(graph), "tasks": len(tasks)}
+    log(f"[merge-shards] {json.dumps(stats)}")
+    return stats
@@ -0,0 +1,137 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Pipeline step list, shared by pipeline_runner.py and the benchmarks.
+"""
+
+from .function_extractor import FunctionExtractor
+from .classifier import FunctionClassifier
+from .callgraph_builder import CallGraphBuilder
+from .task_extractor import TaskExtractor
+from .task_callgraph_builder import TaskCallGraphBuilder
+from .ir_builder import IRBuilder
+from .function_detail_builder import FunctionDetailBuilder
+from .impact import ImpactAnalyzer
+from .architecture_view_builder import ArchitectureViewBuilder
+from .parallel_extractor import ParallelExtractor, use_tu_extractor
+from .lexer_fallback import LexerExtractor
+
+# ---------------------------
+# TOOLCHAIN FACTORY
+# ---------------------------
+
+def build_compile_step(config, force):
+    toolchain = config.get("toolchain", "keil").lower()
+
+    if toolchain == "keil":
+        from .keil_to_compile import KeilToCompileCommands
+        return KeilToCompileCommands(config, force=force)
+
+    elif toolchain == "visualgdb":
+        from .visualgdb_to_compile import VisualGDBToCompileCommands
+        return VisualGDBToCompileCommands(config, force=force)
+
+    elif toolchain == "csharp":
+        from .csharp_to_compile import CSharpToCompileCommands
+        return CSharpToCompileCommands(config, force=force)
+
+    elif toolchain == "compile_commands":
+        from .commands_to_compile import CompileCommandsLoader
+        return CompileCommandsLoader(config, force=force)
+
+    elif toolchain == "loose_cpp":
+        # 🔥 Loose mode does not need a compile step
+        return None
+
+    else:
+        raise ValueError(f"Unsupported toolchain: {toolchain}")
+
+# ---------------------------
+# PIPELINE BUILD
+# ---------------------------
+
+def build_steps(config, force: bool):
+
+    compile_step = build_compile_step(config, force)
+
+    steps = []
+
+    if compile_step is not None:
+        steps.append(compile_step)
+
+    # --fast: lexer scan instead of clang; --jobs / --sample / --since / tu_cache / sampled result: one cached parse per TU
+    if config.get("fast"):
+        clang_steps = [LexerExtractor(config, force=force), FunctionClassifier(config, force=force)]
+    elif use_tu_extractor(config):
+        clang_steps = [ParallelExtractor(config, force=force), FunctionClassifier(config, force=force)]
+    else:
+        clang_steps = [
+            FunctionExtractor(config, force=force),
+            FunctionClassifier(config, force=force),
+            CallGraphBuilder(config, force=force),
+            TaskExtractor(config, force=force),
+        ]
+
+    steps.extend(clang_steps)
+    steps.extend([
+        TaskCallGraphBuilder(config, force=force),
+        # The IR takes each function's body hash from its detail
+        FunctionDetailBuilder(config, force=force),
+        IRBuilder(config, force=force),
+        ImpactAnalyzer(config, force=force),
+        ArchitectureViewBuilder(config, force=force),
+    ])
+
+    return steps
+
+
+def skip_reason(config, ctx, step):
+    """Why a step does not apply to this project, or None."""
+
+    # ----------------------------------------
+    # Skip clang-based steps if C# extractor ran
+    # ----------------------------------------
+    if ctx.get("skip_clang") and step.name in [
+        "02_extract_all_functions",
+        "02_extract_parallel",
+        "02_extract_fast",
+        "03_classify_functions",
+        "04_build_callgraph",
+        "05_extract_task",
+        "06_build_task_callgraph",
+    ]:
+        return "not applicable for C#"
+
+    # ----------------------------------------
+    # Skip firmware-only steps in loose mode
+    # ----------------------------------------
+    if config.get("toolchain") == "loose_cpp" and step.name in [
+        "05_extract_task",
+        "06_build_task_callgraph",
+    ]:
+        return "not supported in loose_cpp mode"
+
+    # ----------------------------------------
+    # Skip task-related steps if not firmware
+    # ----------------------------------------
+    if config.get("project_type") != "firmware" and step.name in [
+        "05_extract_task",
+        "06_build_task_callgraph",
+    ]:
+        return "not a firmware project"
+
+    return None
@@ -0,0 +1,101 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Model tiering: simple functions go to a small, fast model.
+
+`llm_tiers` in the project config lists models from the smallest up, each
+with the limits a function must stay within to be sent to it:
+
+    "llm_tiers": [
+        {"model": "qwen2.5-coder:1.5b", "max_complexity": 3, "max_lines": 25, "max_fan_out": 4},
+        {"model": "qwen2.5-coder:7b", "max_complexity": 10, "max_lines": 120}
+    ]
+
+A function goes to the first tier whose limits it meets (a missing limit
+does not constrain), otherwise to `llm_model`. Interrupt handlers always go
+to `llm_model` unless a tier sets "interrupts": true. Limits are checked
+against the function detail (cyclomatic_complexity, fan_out, is_interrupt
+and the line count of raw_body).
+"""
+
+from typing import Dict, List, Optional
+
+
+def tiers_from(config: Dict) -> List[Dict]:
+    tiers = config.get("llm_tiers") or []
+    for tier in tiers:
+        if not tier.get("model"):
+            raise SystemExit(f"llm_tiers: every tier needs a model, got {tier}")
+    return tiers
+
+
+def body_lines(detail: Dict) -> int:
+    body = detail.get("raw_body", "")
+    if body:
+        return body.count("\n") + 1
+    if detail.get("line_start") and detail.get("line_end"):
+        return detail["line_end"] - detail["line_start"] + 1
+    return 0
+
+
+def route(detail: Dict, tiers: List[Dict], default: str) -> str:
+    """Model for a function, from its detail (an empty detail is unknown: the default model)."""
+    if not detail:
+        return default
+    for tier in tiers:
+        if detail.get("is_interrupt") and not tier.get("interrupts"):
+            continue
+        limits = (
+            ("max_complexity", detail.get("cyclomatic_complexity", 0)),
+            ("max_lines", body_lines(detail)),
+            ("max_fan_out", detail.get("fan_out", len(detail.get("calls", [])))),
+        )
+        if all(tier.get(key) is None or value <= tier[key] for key, value in limits):
+            return tier["model"]
+    return default
+
+
+def largest(models: List[str], tiers: List[Dict], default: str) -> str:
+    """The biggest of several routed models (for a prompt covering several functions)."""
+    rank = {tier["model"]: i for i, tier in enumerate(tiers)}
+    return max(models, key=lambda m: rank.get(m, len(tiers)) if m != default else len(tiers))
+
+
+def estimated_saving(models: Dict[str, Dict], default: str) -> Optional[float]:
+    """
+    Seconds saved by the tier models compared with sending their prompts to `default`:
+    their prompt and answer tokens timed at the rates the default model showed in this
+    run, minus the time they actually took. None without rates for the default model.
+    """
+    base = models.get(default)
+    if not base or not base["eval_seconds"]:
+        return None
+    decode_rate = base["eval_tokens"] / base["eval_seconds"]
+    prompt_rate = base["prompt_tokens"] / base["prompt_seconds"] if base["prompt_seconds"] else None
+
+    saved = 0.0
+    for model, m in models.items():
+        if model == default or not m["eval_seconds"]:
+            continue
+        would_take = m["eval_tokens"] / decode_rate
+        took = m["eval_seconds"]
+        if prompt_rate and m["prompt_seconds"]:
+            would_take += m["prompt_tokens"] / prompt_rate
+            took += m["prompt_seconds"]
+        saved += would_take - took
+    return saved
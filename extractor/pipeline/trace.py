@@ -0,0 +1,128 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Timeline instrumentation written as Chrome trace event JSON.
+
+The output opens in https://ui.perfetto.dev or chrome://tracing.
+Spans are recorded as "X" (complete) events; timestamps are wall-clock
+microseconds so traces written by different processes line up when merged.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .base import ensure_dir
+
+
+class Tracer:
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.events: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def enable(self, path: str, process_name: Optional[str] = None) -> None:
+        self.path = path
+        if process_name:
+            self.events.append({
+                "name": "process_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "args": {"name": process_name},
+            })
+
+    @contextmanager
+    def span(self, name: str, cat: str = "pipeline", **attrs):
+        """
+        Record a span around the enclosed block.
+
+        The yielded dict is stored as the event "args", so callers can add
+        attributes known only at the end (e.g. cursor count after a visit).
+        """
+        if not self.enabled:
+            yield attrs
+            return
+
+        ts = time.time() * 1e6
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            event = {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": ts,
+                "dur": (time.perf_counter() - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": attrs,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def record(self, name: str, ts: float, dur: float, cat: str = "pipeline",
+               pid: Optional[int] = None, tid: Optional[int] = None, **attrs) -> None:
+        """Add a span measured elsewhere (e.g. in a worker process); times in microseconds."""
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": ts,
+            "dur": dur,
+            "pid": pid if pid is not None else os.getpid(),
+            "tid": tid if tid is not None else threading.get_native_id(),
+            "args": attrs,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+        ensure_dir(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def merge_traces(paths: List[str], out_path: str) -> int:
+    """Concatenate the events of several trace files into one. Returns the event count."""
+    events = []
+    for p in paths:
+        if not p or not os.path.exists(p):
+            continue
+        with open(p, "r", encoding="utf-8") as f:
+            events.extend(json.load(f).get("traceEvents", []))
+
+    ensure_dir(os.path.dirname(out_path))
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+# Process-wide tracer, disabled until enable() is called
+TRACER = Tracer()
@@ -0,0 +1,89 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Per-TU extraction results, reused by later runs of the TU extractor.
+
+Each parsed TU is stored in `<artifacts>/tu_cache/<hash>.json` with its
+functions, calls and tasks, the arguments it was parsed with and the
+mtime/size of the source and of every header it included. An entry is reused
+while all of those are unchanged, so a run only parses the TUs affected by
+an edit (and a full run after `--sample` only parses the TUs not sampled).
+"""
+
+import hashlib
+import os
+from typing import Dict, List, Optional, Set
+
+from .base import load_json, save_json
+
+
+def cache_dir(config: Dict) -> str:
+    return config.get("tu_cache_dir") or os.path.join(
+        os.path.dirname(config["functions_index"]), "tu_cache"
+    )
+
+
+def file_stamp(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class TUCache:
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def entry_path(self, src: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(src.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    def get(self, src: str, workdir: str, args: List[str], changed: Optional[Set[str]] = None) -> Optional[Dict]:
+        """
+        The stored result for this TU, if its inputs did not change since.
+
+        With `changed` (absolute real paths, e.g. from git), a TU is stale
+        when one of its dependencies is in that set; mtimes are not looked
+        at. A dependency that could not be stamped (missing file) always
+        makes it stale.
+        """
+        entry = load_json(self.entry_path(src))
+        if not entry or entry.get("src") != src or entry.get("workdir") != workdir or entry.get("args") != args:
+            return None
+        if changed is not None:
+            # Entries from before deps were stored absolute cannot be matched
+            if not all(os.path.isabs(d) for d in entry["deps"]):
+                return None
+            return None if changed.intersection(map(os.path.realpath, entry["deps"])) else entry
+        for dep, stamp in entry["deps"].items():
+            if stamp is None or file_stamp(dep) != stamp:
+                return None
+        return entry
+
+    def put(self, src: str, workdir: str, args: List[str], result: Dict) -> None:
+        deps = [os.path.abspath(d) for d in [src] + result.get("headers", [])]
+        save_json(self.entry_path(src), {
+            "src": src,
+            "workdir": workdir,
+            "args": list(args),
+            "deps": {d: file_stamp(d) for d in deps},
+            "functions": result["functions"],
+            "calls": result["calls"],
+            "tasks": result["tasks"],
+        })
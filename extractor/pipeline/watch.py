@@ -0,0 +1,277 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Watch mode (`pipeline_runner.py --watch`).
+
+One libclang Index and every parsed TU stay in memory. Each TU is parsed
+once and visited by the function, call-graph and task collectors of the
+regular steps. Sources and the headers each TU includes are polled for
+mtime changes; only the TUs that depend on a changed file are reparsed
+(`tu.reparse()`, which reuses the precompiled preamble), their contribution
+is replaced, and functions_index / call_graph / tasks are rewritten before
+the downstream steps run again.
+
+In loose_cpp mode the call graph uses the same parse arguments as the
+function index (the batch step parses with a reduced set).
+"""
+
+import os
+import time
+from typing import Callable, Dict, Set
+
+from clang.cindex import Index, TranslationUnit
+
+from .base import load_json, save_json
+from .callgraph_builder import CallGraphBuilder
+from .compile_db import entry_args, loose_parse_args, loose_sources
+from .edge_log import CallEdges
+from .function_extractor import FunctionExtractor
+from .header_deps import HeaderGraph, header_deps_path, includes_of
+from .task_extractor import TaskExtractor
+from .trace import TRACER
+
+PARSE_OPTIONS = (
+    TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+    | TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+)
+
+
+class WatchedTU:
+
+    def __init__(self, src: str, workdir: str, args):
+        self.src = src
+        self.workdir = workdir
+        self.args = args
+        self.tu = None
+        self.functions: Dict = {}
+        self.calls: Dict = {}
+        self.tasks: Dict = {}
+        self.deps: Set[str] = {src}
+
+
+class WatchSession:
+
+    def __init__(self, config: Dict, context, on_update: Callable, interval: float = 0.5):
+        self.config = config
+        self.context = context
+        self.on_update = on_update
+        self.interval = interval
+
+        self.loose = config.get("toolchain") == "loose_cpp"
+        self.with_tasks = not self.loose and config.get("project_type") == "firmware"
+        self.task_extractor = TaskExtractor(config)
+
+        if self.loose:
+            self.project_root = os.path.normpath(config["project_root"])
+            self.source_dir = os.path.normpath(os.path.join(self.project_root, config["source_dir"]))
+            self.loose_args = loose_parse_args(config, self.project_root, self.source_dir)
+
+        self.index = Index.create()
+        self.units: Dict[str, WatchedTU] = {}
+        self.mtimes: Dict[str, int] = {}
+
+    def log(self, msg: str) -> None:
+        print(f"[watch] {msg}")
+
+    # ============================================================
+    # TU SET
+    # ============================================================
+
+    def discover(self) -> Dict:
+        """Current translation units as {src: (workdir, args)}, in build order."""
+        if self.loose:
+            return {
+                os.path.normpath(p): (self.project_root, self.loose_args)
+                for p in loose_sources(self.source_dir)
+            }
+
+        units = {}
+        for entry in load_json(self.config["compile_commands"]):
+            workdir = os.path.normpath(entry["directory"])
+            src = os.path.normpath(os.path.join(workdir, entry["file"]))
+            units[src] = (workdir, entry_args(entry))
+        return units
+
+    def sync_units(self) -> Set[str]:
+        """Add new TUs and drop removed ones. Returns the sources that need a parse."""
+        found = self.discover()
+
+        for src in list(self.units):
+            if src not in found:
+                self.log(f"TU removed: {src}")
+                del self.units[src]
+
+        added = set()
+        units = {}
+        for src, (workdir, args) in found.items():
+            unit = self.units.get(src)
+            if unit is None or unit.args != args or unit.workdir != workdir:
+                unit = WatchedTU(src, workdir, args)
+                added.add(src)
+            units[src] = unit
+        self.units = units
+        return added
+
+    # ============================================================
+    # PARSE + COLLECT
+    # ============================================================
+
+    def refresh(self, unit: WatchedTU) -> None:
+        with TRACER.span("parse_tu", cat="tu", tu=unit.src, reparse=unit.tu is not None) as span:
+            prev_cwd = os.getcwd()
+            try:
+                os.chdir(unit.workdir)
+                if unit.tu is None:
+                    unit.tu = self.index.parse(unit.src, args=unit.args, options=PARSE_OPTIONS)
+                else:
+                    unit.tu.reparse()
+            except Exception as e:
+                self.log(f"[WARN] Failed parsing {unit.src}: {e}")
+                unit.tu = None
+                unit.functions, unit.calls, unit.tasks = {}, {}, {}
+                # Keep the previous deps: fixing a broken header must trigger a reparse
+                return
+            finally:
+                os.chdir(prev_cwd)
+
+            stats = {"cursors": 0}
+            cursor = unit.tu.cursor
+
+            functions = {}
+            FunctionExtractor.collect_functions(cursor, unit.workdir, functions, stats)
+
+            edges = CallEdges()
+            CallGraphBuilder.collect_calls(cursor, unit.workdir, edges, stats)
+
+            tasks = {}
+            if self.with_tasks:
+                self.task_extractor.collect_tasks(cursor, unit.workdir, tasks, stats)
+
+            unit.functions, unit.calls, unit.tasks = functions, edges.graph, tasks
+            unit.deps = {unit.src} | set(includes_of(unit.tu, unit.workdir))
+            span["cursors"] = stats["cursors"]
+
+    def write_outputs(self) -> None:
+        """Merge per-TU contributions in build order, as the batch steps do."""
+        functions = {}
+        edges = CallEdges()
+        tasks = {}
+        header_graph = HeaderGraph()
+
+        for unit in self.units.values():
+            header_graph.add(unit.src, unit.deps - {unit.src})
+            functions.update(unit.functions)
+            for fn, callees in unit.calls.items():
+                edges.add_function(fn)
+                for callee in callees:
+                    edges.add_call(fn, callee)
+            for name, task in unit.tasks.items():
+                tasks.setdefault(name, task)
+
+        save_json(self.config["functions_index"], functions)
+        self.context["functions_index"] = self.config["functions_index"]
+        header_graph.save(header_deps_path(self.config))
+
+        edges.finish(self.config["call_graph"])
+        self.context["call_graph"] = self.config["call_graph"]
+
+        if self.with_tasks:
+            save_json(self.config["tasks"], tasks)
+            self.context["tasks"] = self.config["tasks"]
+
+        self.log(f"{len(functions)} functions, {len(edges.graph)} call graph nodes, {len(tasks)} tasks")
+
+    # ============================================================
+    # POLLING
+    # ============================================================
+
+    def watched_files(self) -> Set[str]:
+        files = set()
+        for unit in self.units.values():
+            files |= unit.deps
+        if not self.loose:
+            files.add(os.path.normpath(self.config["compile_commands"]))
+        return files
+
+    def snapshot(self) -> Dict[str, int]:
+        mtimes = {}
+        for path in self.watched_files():
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def poll(self) -> Set[str]:
+        current = self.snapshot()
+        changed = {p for p, m in current.items() if self.mtimes.get(p, m) != m}
+        self.mtimes = current
+
+        # New or deleted sources are not in the watched set yet
+        if self.loose and set(self.discover()) != set(self.units):
+            changed.add(self.source_dir)
+        return changed
+
+    # ============================================================
+    # LOOP
+    # ============================================================
+
+    def update(self, changed: Set[str]) -> None:
+        started = time.perf_counter()
+        with TRACER.span("watch_update", cat="watch", changed=len(changed)) as span:
+            stale = set()
+            if self.loose or os.path.normpath(self.config["compile_commands"]) in changed:
+                stale |= self.sync_units()
+
+            stale |= {src for src, unit in self.units.items() if unit.deps & changed}
+            for src in stale:
+                self.refresh(self.units[src])
+
+            self.write_outputs()
+            self.on_update(self.context)
+            span["reparsed"] = len(stale)
+
+        seconds = time.perf_counter() - started
+        self.context.setdefault("watch_updates", []).append({
+            "changed": sorted(changed),
+            "reparsed": len(stale),
+            "seconds": round(seconds, 3),
+        })
+        self.log(f"Updated {len(stale)} TU(s) in {seconds:.2f}s")
+
+    def start(self) -> None:
+        started = time.perf_counter()
+        self.sync_units()
+        for unit in self.units.values():
+            self.refresh(unit)
+        self.write_outputs()
+        self.on_update(self.context)
+        self.mtimes = self.snapshot()
+        self.log(f"Parsed {len(self.units)} TU(s) in {time.perf_counter() - started:.2f}s")
+
+    def run(self) -> None:
+        self.start()
+        self.log(f"Watching {len(self.mtimes)} files (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self.poll()
+                if changed:
+                    self.log(f"Changed: {', '.join(sorted(changed))}")
+                    self.update(changed)
+        except KeyboardInterrupt:
+            self.log("Stopped")
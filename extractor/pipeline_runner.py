@@ -17,6 +17,7 @@
 import argparse
 import json
 import os
+import time
 
 # ---------------------------
 # ARGUMENT PARSING EARLY
@@ -28,6 +29,23 @@ ap.add_argument("--force", action="store_true", help="Run all steps ignoring up-
 ap.add_argument("--only", nargs="+", help="Run only these step names (space separated)")
 ap.add_argument("--from", dest="start", help="Run from this step name")
 ap.add_argument("--to", dest="end", help="Run until this step name (inclusive)")
+ap.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
+ap.add_argument("--profile", action="store_true", help="Record per-TU / per-header parse cost and write a ranked report")
+ap.add_argument("--memory", action="store_true", help="Add tracemalloc peaks to the per-step memory figures in the run summary")
+ap.add_argument("--bounded-memory", action="store_true", help="Dispose each TU after visiting it and stream call edges to disk")
+ap.add_argument("--watch", action="store_true", help="Keep TUs parsed in memory and update artifacts when sources or headers change")
+ap.add_argument("--watch-interval", type=float, default=0.5, help="Polling interval in seconds for --watch")
+ap.add_argument("--shard", metavar="I/N", help="Run clang extraction for shard I of N (1-based) into <artifacts>/shards/")
+ap.add_argument("--merge-shards", type=int, metavar="N", help="Merge the outputs of N shards, then run the remaining steps")
+ap.add_argument("--sample", type=float, nargs="?", const=0.1, metavar="FRACTION",
+                help="Quick look: analyze about FRACTION of the TUs of each directory/category (default 0.1)")
+ap.add_argument("--since", metavar="GIT_REV",
+                help="Reparse only the TUs affected by files changed since GIT_REV; reuse the rest from the TU cache")
+ap.add_argument("--jobs", type=int, metavar="N", help="Parse TUs in N worker processes, longest first (0 = one per CPU)")
+ap.add_argument("--fast", action="store_true",
+                help="Lexer-only scan instead of clang (heuristic, no preprocessing) into <artifacts>/fast/")
+ap.add_argument("--lexer-fallback", action="store_true",
+                help="Fill in functions and calls with the lexer for TUs clang fails on or parses with errors")
 args = ap.parse_args()
 
 # ---------------------------
@@ -59,6 +77,23 @@ for key in CONFIG:
     
     print(f"key: {CONFIG[key]}")
 
+if args.bounded_memory:
+    CONFIG["bounded_memory"] = True
+
+if args.sample is not None:
+    if not 0 < args.sample <= 1:
+        raise SystemExit("--sample expects a fraction in (0, 1]")
+    CONFIG["sample"] = args.sample
+
+if args.since:
+    CONFIG["since"] = args.since
+
+if args.jobs is not None:
+    CONFIG["jobs"] = args.jobs or os.cpu_count() or 1
+
+if args.lexer_fallback:
+    CONFIG["lexer_fallback"] = True
+
 # ---------------------------
 # SET LIBCLANG EARLY
 # ---------------------------
@@ -74,70 +109,23 @@ if libclang_path:
 # ---------------------------
 
 from pipeline.function_extractor import FunctionExtractor
-from pipeline.classifier import FunctionClassifier
 from pipeline.callgraph_builder import CallGraphBuilder
 from pipeline.task_extractor import TaskExtractor
-from pipeline.task_callgraph_builder import TaskCallGraphBuilder
-from pipeline.ir_builder import IRBuilder
-from pipeline.function_detail_builder import FunctionDetailBuilder
-from pipeline.architecture_view_builder import ArchitectureViewBuilder
-from pipeline.base import PipelineContext
-
-# ---------------------------
-# TOOLCHAIN FACTORY
-# ---------------------------
-
-def build_compile_step(config, force):
-    toolchain = config.get("toolchain", "keil").lower()
-
-    if toolchain == "keil":
-        from pipeline.keil_to_compile import KeilToCompileCommands
-        return KeilToCompileCommands(config, force=force)
-
-    elif toolchain == "visualgdb":
-        from pipeline.visualgdb_to_compile import VisualGDBToCompileCommands
-        return VisualGDBToCompileCommands(config, force=force)
-
-    elif toolchain == "csharp":
-        from pipeline.csharp_to_compile import CSharpToCompileCommands
-        return CSharpToCompileCommands(config, force=force)
-
-    elif toolchain == "compile_commands":
-        from pipeline.commands_to_compile import CompileCommandsLoader
-        return CompileCommandsLoader(config, force=force)
-
-    elif toolchain == "loose_cpp":
-        # 🔥 Loose mode does not need a compile step
-        return None
-
-    else:
-        raise ValueError(f"Unsupported toolchain: {toolchain}")
-
-# ---------------------------
-# PIPELINE BUILD
-# ---------------------------
-
-def build_steps(config, force: bool):
-
-    compile_step = build_compile_step(config, force)
-
-    steps = []
-
-    if compile_step is not None:
-        steps.append(compile_step)
-
-    steps.extend([
-        FunctionExtractor(config, force=force),
-        FunctionClassifier(config, force=force),
-        CallGraphBuilder(config, force=force),
-        TaskExtractor(config, force=force),
-        TaskCallGraphBuilder(config, force=force),
-        IRBuilder(config, force=force),
-        FunctionDetailBuilder(config, force=force),
-        ArchitectureViewBuilder(config, force=force),
-    ])
-
-    return steps
+from pipeline.parallel_extractor import ParallelExtractor, use_tu_extractor
+from pipeline.steps import build_compile_step, build_steps, skip_reason
+from pipeline.sharding import (
+    merge_shards, parse_shard, partition, previous_costs, shard_config, shard_dir, write_shard_commands,
+)
+from pipeline.lexer_fallback import LexerExtractor, fast_config
+from pipeline.base import PipelineContext, load_json, save_json
+from pipeline.trace import TRACER
+from pipeline.profiling import ParseProfiler
+from pipeline.memory import MemorySampler
+
+if args.fast:
+    if args.watch or args.shard or args.merge_shards:
+        raise SystemExit("--fast cannot be combined with --watch, --shard or --merge-shards")
+    CONFIG = fast_config(CONFIG)
 
 # ---------------------------
 # STEP FILTERING
@@ -169,57 +157,196 @@ def filter_steps(steps, only=None, start=None, end=None):
 # MAIN EXECUTION
 # ---------------------------
 
+def artifact_dir():
+    return os.path.dirname(CONFIG["functions_index"])
+
+
+def write_run_summary(summary):
+    print("\n=== RUN SUMMARY ===")
+    print(f"{'step':<34} {'status':<10} {'time (s)':>9} {'rss peak (MB)':>14} {'tracemalloc (MB)':>17}")
+    for s in summary["steps"]:
+        print(
+            f"{s['name']:<34} {s['status']:<10} {s.get('seconds', 0):>9.2f} "
+            f"{str(s.get('rss_peak_mb', '-')):>14} {str(s.get('tracemalloc_peak_mb', '-')):>17}"
+        )
+
+    schedule = summary.get("schedule")
+    if schedule:
+        print(
+            f"\nTU schedule: {schedule['tus']} TUs on {schedule['jobs']} workers, makespan "
+            f"predicted {schedule['predicted_makespan_s']:.2f}s / actual {schedule['actual_makespan_s']:.2f}s"
+        )
+
+    path = CONFIG.get("run_summary_json") or os.path.join(artifact_dir(), "run_summary.json")
+    save_json(path, summary)
+    print(f"Run summary written to {path}")
+
+
 def main():
     ctx = PipelineContext()
-
-    steps = build_steps(CONFIG, force=args.force)
-    steps = filter_steps(steps, only=args.only, start=args.start, end=args.end)
+    ctx["run_summary"] = {
+        "config": os.path.abspath(args.config),
+        "bounded_memory": bool(CONFIG.get("bounded_memory")),
+        "steps": [],
+    }
+
+    if args.trace:
+        TRACER.enable(normalize_path(args.trace), process_name="pipeline_runner")
+
+    if args.profile:
+        ctx["parse_profiler"] = ParseProfiler(
+            stub_dirs=[CONFIG.get("stub_dir"), CONFIG.get("loose_stub_dir")]
+        )
+
+    try:
+        if args.watch:
+            run_watch(ctx)
+        elif args.shard:
+            run_shard(ctx)
+        elif args.merge_shards:
+            run_merge_shards(ctx)
+        else:
+            run_pipeline(ctx)
+    finally:
+        if TRACER.enabled:
+            TRACER.save()
+            print(f"Trace written to {TRACER.path}")
+
+        write_run_summary(ctx["run_summary"])
+
+        if "parse_profiler" in ctx:
+            profile_dir = CONFIG.get("profile_dir") or os.path.join(artifact_dir(), "profile")
+            ctx["parse_profiler"].write_reports(profile_dir)
+            print(f"Parse profile written to {profile_dir}")
+
+
+def run_steps(ctx, steps, config):
 
     for step in steps:
         print(f"\n=== {step.name} ===")
+        record = {"name": step.name, "status": "skipped"}
+        ctx["run_summary"]["steps"].append(record)
 
-        # ----------------------------------------
-        # Skip clang-based steps if C# extractor ran
-        # ----------------------------------------
-        if ctx.get("skip_clang") and step.name in [
-            "02_extract_all_functions",
-            "03_classify_functions",
-            "04_build_callgraph",
-            "05_extract_task",
-            "06_build_task_callgraph",
-        ]:
-            print(f"[{step.name}] SKIP (not applicable for C#)")
-            continue
-
-        # ----------------------------------------
-        # Skip firmware-only steps in loose mode
-        # ----------------------------------------
-        if CONFIG.get("toolchain") == "loose_cpp" and step.name in [
-            "05_extract_task",
-            "06_build_task_callgraph",
-        ]:
-            print(f"[{step.name}] SKIP (not supported in loose_cpp mode)")
-            continue
-
-        # ----------------------------------------
-        # Skip task-related steps if not firmware
-        # ----------------------------------------
-        if CONFIG.get("project_type") != "firmware" and step.name in [
-            "05_extract_task",
-            "06_build_task_callgraph",
-        ]:
-            print(f"[{step.name}] SKIP (not a firmware project)")
+        reason = skip_reason(config, ctx, step)
+        if reason:
+            print(f"[{step.name}] SKIP ({reason})")
             continue
 
         if step.should_skip(ctx):
             print(f"[{step.name}] SKIP (up-to-date)")
             continue
 
-        step.run(ctx)
+        record["status"] = "failed"
+        started = time.perf_counter()
+        with TRACER.span(step.name, cat="step") as span, \
+                MemorySampler(use_tracemalloc=args.memory) as mem:
+            step.run(ctx)
+        record["status"] = "ran"
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        record.update(mem.summary())
+        span.update(mem.summary())
+
+
+def downstream_steps(force):
+    """Steps that run on the extracted artifacts (everything after the clang steps)."""
+    compile_step = build_compile_step(CONFIG, force=force)
+    clang_steps = {FunctionExtractor.name, CallGraphBuilder.name, TaskExtractor.name, ParallelExtractor.name,
+                   LexerExtractor.name}
+    steps = [
+        s for s in build_steps(CONFIG, force=force)
+        if s.name not in clang_steps
+        and (compile_step is None or s.name != compile_step.name)
+    ]
+    return filter_steps(steps, only=args.only)
+
+
+def run_pipeline(ctx):
+
+    steps = build_steps(CONFIG, force=args.force)
+    steps = filter_steps(steps, only=args.only, start=args.start, end=args.end)
+    run_steps(ctx, steps, CONFIG)
+
+    print("\nDONE")
+
+
+def run_shard(ctx):
+    index, count = parse_shard(args.shard)
+    toolchain = CONFIG.get("toolchain", "keil").lower()
+    if toolchain in ("loose_cpp", "csharp"):
+        raise SystemExit(f"--shard needs a compile_commands based toolchain, not '{toolchain}'")
+
+    out_dir = shard_dir(CONFIG, index, count)
+    costs = previous_costs(CONFIG)
+
+    # Shard-local summary and profile: N processes run side by side
+    CONFIG["run_summary_json"] = os.path.join(out_dir, "run_summary.json")
+    CONFIG["profile_dir"] = os.path.join(out_dir, "profile")
+
+    # Every shard converts the project file itself (cheap) instead of racing on one output
+    full_commands = CONFIG["compile_commands"]
+    if toolchain != "compile_commands":
+        full_commands = os.path.join(out_dir, "compile_commands.full.json")
+        compile_step = build_compile_step(dict(CONFIG, compile_commands=full_commands), force=args.force)
+        run_steps(ctx, [compile_step], CONFIG)
+
+    cfg = shard_config(CONFIG, index, count)
+    entries = load_json(full_commands)
+    assigned = partition(entries, count, costs)[index - 1]
+    write_shard_commands(entries, assigned, cfg["compile_commands"])
+    print(f"[shard {index}/{count}] {len(assigned)} of {len(entries)} TUs -> {out_dir}")
+    ctx["run_summary"]["shard"] = {"index": index, "count": count, "tus": len(assigned)}
+
+    if use_tu_extractor(cfg):
+        steps = [ParallelExtractor(cfg, force=args.force)]
+    else:
+        steps = [
+            FunctionExtractor(cfg, force=args.force),
+            CallGraphBuilder(cfg, force=args.force),
+            TaskExtractor(cfg, force=args.force),
+        ]
+    run_steps(ctx, steps, cfg)
+
+    print("\nDONE")
+
+
+def run_merge_shards(ctx):
+    with TRACER.span("merge_shards", cat="step", shards=args.merge_shards):
+        ctx["run_summary"]["merge_shards"] = merge_shards(CONFIG, args.merge_shards)
+    run_steps(ctx, downstream_steps(force=args.force), CONFIG)
 
     print("\nDONE")
 
 
+def run_watch(ctx):
+    from pipeline.watch import WatchSession
+
+    compile_step = build_compile_step(CONFIG, force=args.force)
+    if compile_step is not None:
+        print(f"\n=== {compile_step.name} ===")
+        if compile_step.should_skip(ctx):
+            print(f"[{compile_step.name}] SKIP (up-to-date)")
+        else:
+            compile_step.run(ctx)
+
+    if ctx.get("skip_clang"):
+        raise SystemExit("--watch needs a clang-based toolchain")
+
+    # The watch session replaces the clang steps; everything after them is rerun on change.
+    # Not forced: the rewritten artifacts are newer than their outputs, and a forced
+    # IR builder would drop the previous IR and log the whole tree as changed.
+    downstream = downstream_steps(force=False)
+
+    def on_update(context):
+        for step in downstream:
+            if skip_reason(CONFIG, context, step) or step.should_skip(context):
+                continue
+            with TRACER.span(step.name, cat="step"):
+                step.run(context)
+
+    WatchSession(CONFIG, ctx, on_update, interval=args.watch_interval).run()
+    ctx["run_summary"]["watch_updates"] = ctx.get("watch_updates", [])
+
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,190 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Local query server over firmware_ir.json.
+
+    python extractor/query_server.py --config config.json
+    python extractor/query_server.py --config config.json --socket /tmp/firmware-lens.sock
+
+Endpoints (GET, JSON responses):
+    /callers?fn=X[&transitive=1&depth=N]   /callees?fn=X[&transitive=1&depth=N]
+    /tasks?fn=X           tasks reaching X
+    /impact?fn=X,Y        transitive callers and tasks affected by changing X, Y
+    /reachable?task=T     functions reachable from task T
+    /path?src=A&dst=B     shortest call chain
+    /file?path=P          functions per file (full path or suffix)
+    /function?name=X      /stats      /reload
+
+The IR is reloaded automatically when the file changes on disk (e.g. while
+pipeline_runner.py --watch is running). Use pipeline.query.QueryClient.
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pipeline.query import QueryIndex
+
+
+class IRHolder:
+    """Current QueryIndex, rebuilt when firmware_ir.json changes."""
+
+    def __init__(self, ir_path):
+        self.ir_path = ir_path
+        self.signature = None
+        self.index = None
+        self.lock = threading.Lock()
+        self.reload()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.ir_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def reload(self):
+        with self.lock:
+            started = time.perf_counter()
+            self.signature = self._signature()
+            self.index = QueryIndex.load(self.ir_path)
+            print(
+                f"[query] Loaded {self.ir_path} ({self.index.stats()['functions']} functions) "
+                f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+
+    def current(self):
+        if self._signature() != self.signature:
+            self.reload()
+        return self.index
+
+
+def flag(params, key):
+    return params.get(key, "0").lower() in ("1", "true", "yes")
+
+
+def depth_of(params):
+    return int(params["depth"]) if params.get("depth") else None
+
+
+ROUTES = {
+    "callers": (("fn",), lambda ix, p: ix.callers(p["fn"], flag(p, "transitive"), depth_of(p))),
+    "callees": (("fn",), lambda ix, p: ix.callees(p["fn"], flag(p, "transitive"), depth_of(p))),
+    "tasks": (("fn",), lambda ix, p: ix.tasks_reaching(p["fn"])),
+    "impact": (("fn",), lambda ix, p: ix.impact([f for f in p["fn"].split(",") if f])),
+    "reachable": (("task",), lambda ix, p: ix.task_functions(p["task"])),
+    "path": (("src", "dst"), lambda ix, p: ix.path(p["src"], p["dst"])),
+    "file": (("path",), lambda ix, p: ix.functions_in(p["path"])),
+    "function": (("name",), lambda ix, p: ix.function(p["name"])),
+    "stats": ((), lambda ix, p: ix.stats()),
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    holder = None
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.strip("/")
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if endpoint == "reload":
+            self.holder.reload()
+            return self.reply(200, {"result": self.holder.index.stats()})
+
+        if endpoint not in ROUTES:
+            return self.reply(404, {"error": f"unknown endpoint '{endpoint}'", "endpoints": sorted(ROUTES) + ["reload"]})
+
+        required, handler = ROUTES[endpoint]
+        missing = [k for k in required if k not in params]
+        if missing:
+            return self.reply(400, {"error": f"missing parameter(s): {', '.join(missing)}"})
+
+        started = time.perf_counter()
+        try:
+            result = handler(self.holder.current(), params)
+        except ValueError as e:
+            return self.reply(400, {"error": str(e)})
+        elapsed_us = round((time.perf_counter() - started) * 1e6, 1)
+        self.reply(200, {"result": result, "elapsed_us": elapsed_us})
+
+    def log_message(self, format, *args):
+        # One line per request is too chatty for interactive use
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects an (host, port) client address
+        return request, ("local", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve call graph / task queries over the firmware IR")
+    parser.add_argument("--config", required=True, help="Path to project config JSON")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Serve on this Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    ir_path = os.path.abspath(config.get("firmware_ir", "analysis/firmware_ir.json"))
+    QueryHandler.holder = IRHolder(ir_path)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, QueryHandler)
+        where = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+        where = f"http://{args.host}:{args.port}"
+
+    print(f"[query] Serving on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
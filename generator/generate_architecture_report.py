@@ -22,6 +22,12 @@ from collections import defaultdict, Counter
 
 import pandas as pd
 import networkx as nx
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "extractor"))
+from pipeline.trace import TRACER
+from pipeline.artifacts import load_artifact
 
 
 # ==============================
@@ -30,8 +36,12 @@ import networkx as nx
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--config", required=True, help="Path to project config JSON")
+parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
 args = parser.parse_args()
 
+if args.trace:
+    TRACER.enable(args.trace, process_name="generate_architecture_report")
+
 with open(args.config, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
@@ -50,10 +60,8 @@ os.makedirs(OUT_DIR, exist_ok=True)
 # IO
 # ==============================
 def load_json(path):
-    if not os.path.exists(path):
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Cached per file: stages running in the same process share parsed artifacts
+    return load_artifact(path)
 
 
 # ==============================
@@ -290,7 +298,8 @@ def main():
 
     edges, modules = build_module_dependency(callgraph, functions_index)
 
-    df_metrics, G = compute_metrics(edges, modules)
+    with TRACER.span("compute_metrics", cat="graph", modules=len(modules), edges=len(edges)):
+        df_metrics, G = compute_metrics(edges, modules)
 
     sccs = compute_scc(G)
 
@@ -309,4 +318,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        TRACER.save()
@@ -19,12 +19,20 @@
 # GPL-3.0
 
 import json
-import requests
 import argparse
 import fnmatch
 from pathlib import Path
 import sys
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "extractor"))
+from pipeline.trace import TRACER
+from pipeline.artifacts import load_artifact
+from pipeline.base import write_text_atomic
+from pipeline.llm import DEFAULT_STALL_TIMEOUT, DEFAULT_URL, LLMClient, concurrency_from
+from pipeline.llm_cache import response_cache_from
+from pipeline.tiering import route, tiers_from
+from pipeline.prompts import FUNCTION_PROMPT_FIELDS, PromptBuilder, PromptStats, format_params, prompt_budget
+
 # -------------------------------------------------
 # ARGUMENT PARSING & CONFIG
 # -------------------------------------------------
@@ -35,14 +43,33 @@ parser.add_argument("--module", help="Generate docs only for this module (filena
 parser.add_argument("--pattern", help="Generate docs only for functions matching pattern")
 parser.add_argument("--exclude-drivers", action="store_true",
                     help="Exclude drivers/cmsis/middleware")
+parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
 args = parser.parse_args()
 
+if args.trace:
+    TRACER.enable(args.trace, process_name="generate_docs_details")
+
 with open(args.config, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
-OLLAMA_URL = CONFIG.get("llm_url", "http://localhost:11434/api/generate")
+OLLAMA_URL = CONFIG.get("llm_url", DEFAULT_URL)
 MODEL = CONFIG.get("llm_model", "mistral")
 
+# Sequential calls: the pool only matters for failover across several llm_url backends
+LLM = LLMClient(OLLAMA_URL, MODEL, concurrency=concurrency_from(CONFIG), timeout=180,
+                cache=response_cache_from(CONFIG),
+                stream=CONFIG.get("llm_stream", False),
+                stall_timeout=CONFIG.get("llm_stall_timeout", DEFAULT_STALL_TIMEOUT),
+                spool_dir=str(Path(CONFIG.get("docs_dir", "docs")) / ".partial"))
+
+# No num_predict is set here: prompts leave as much room for the answer as generate_docs_smart.py does
+ANSWER_TOKENS = 600
+STRIP_COMMENTS = CONFIG.get("llm_strip_comments", False)
+PROMPT_STATS = PromptStats()
+
+# llm_tiers: simple functions go to smaller models, see pipeline/tiering.py
+TIERS = tiers_from(CONFIG)
+
 FUNCTIONS_INDEX_PATH = Path(CONFIG.get("functions_index", "analysis/functions_index.json"))
 CALLGRAPH_PATH = Path(CONFIG.get("call_graph", "analysis/callgraph.json"))
 DETAILS_DIR = Path(CONFIG.get("functions_detail_dir", "analysis/functions_detail"))
@@ -56,25 +83,17 @@ ARCHITECTURE_OVERVIEW_PATH = Path(CONFIG.get("architecture_overview_md", "analys
 # Utils
 # -------------------------------------------------
 
-def call_llm(prompt):
+def call_llm(prompt, model=None):
     try:
-        r = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL, "prompt": prompt, "stream": False},
-            timeout=180
-        )
-        r.raise_for_status()
-        return r.json().get("response", "")
+        return LLM.generate(prompt, model=model)
     except Exception as e:
         print("LLM ERROR:", e)
         return "LLM generation failed."
 
 
 def load_json(path):
-    if not path.exists():
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Cached per file: stages running in the same process share parsed artifacts
+    return load_artifact(path)
 
 
 def extract_function_body(file_path, start_line):
@@ -112,8 +131,9 @@ def load_function_details():
         return details
 
     for file in DETAILS_DIR.glob("*.json"):
-        with open(file, "r", encoding="utf-8") as f:
-            details[file.stem] = json.load(f)
+        # Detail files are named <name>_<hash>.json: key by the function name they describe
+        detail = load_json(file)
+        details[detail.get("name", file.stem)] = detail
 
     return details
 
@@ -124,29 +144,31 @@ def load_function_details():
 
 def generate_function_doc(name, index_meta, detail_meta, callgraph):
 
-    body = ""
-    if index_meta.get("file") and index_meta.get("line"):
+    # raw_body is the same code as the Code section: it is sent once, there
+    body = detail_meta.get("raw_body", "")
+    if not body and index_meta.get("file") and index_meta.get("line"):
         body = extract_function_body(
             index_meta["file"],
             index_meta["line"]
         )
 
     calls = callgraph.get(name, [])
+    model = route(detail_meta, TIERS, MODEL)
 
-    prompt = f"""
+    prompt = PromptBuilder(prompt_budget(CONFIG, model, ANSWER_TOKENS), strip=STRIP_COMMENTS, stats=PROMPT_STATS).add(f"""
 You are an embedded firmware documentation assistant.
 Write professional Markdown documentation.
 
 Function: {name}
 Return type: {index_meta.get("return")}
-Parameters: {index_meta.get("params")}
-Calls: {calls}
+Parameters: {format_params(index_meta.get("params"))}
+Calls: {", ".join(calls) or "none"}
 
 Static analysis details (authoritative, do NOT invent missing data):
-{json.dumps(detail_meta, indent=2)}
+""").add_json(detail_meta, omit=FUNCTION_PROMPT_FIELDS).add("""
 
 Code:
-{body}
+""").add_code(body).add(f"""
 
 Output structure:
 # {name}
@@ -157,9 +179,9 @@ Output structure:
 ## Internal Logic
 ## Global interactions (if present)
 ## Edge cases
-"""
+""").build()
 
-    return call_llm(prompt)
+    return call_llm(prompt, model)
 
 
 def generate_module_doc(file_path, functions):
@@ -266,8 +288,7 @@ def main():
         detail = function_details.get(name, {})
         doc = generate_function_doc(name, meta, detail, callgraph)
 
-        with open(FUNCTIONS_DOC / f"{name}.md", "w", encoding="utf-8") as f:
-            f.write(doc)
+        write_text_atomic(str(FUNCTIONS_DOC / f"{name}.md"), doc)
 
         if file_path:
             file_map.setdefault(file_path, []).append(name)
@@ -290,8 +311,7 @@ def main():
         doc = generate_module_doc(file_path, funcs)
         module_name = Path(file_path).stem
 
-        with open(MODULES_DOC / f"{module_name}.md", "w", encoding="utf-8") as f:
-            f.write(doc)
+        write_text_atomic(str(MODULES_DOC / f"{module_name}.md"), doc)
 
     # -------------------------------------------------
     # Master index
@@ -346,6 +366,13 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        for line in [PROMPT_STATS.report_line()] + LLM.report_lines():
+            if line:
+                print(line)
+        LLM.close()
+        TRACER.save()
 
 #python generate_docs.py --module source/application/BLE_App.c
\ No newline at end of file
@@ -14,11 +14,26 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
 import json
-import requests
+import asyncio
 import hashlib
 import argparse
 from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "extractor"))
+from pipeline.trace import TRACER
+from pipeline.artifacts import load_artifact
+from pipeline.base import write_text_atomic
+from pipeline.call_order import bottom_up
+from pipeline.impact import mark_consumed, pending_impact
+from pipeline.journal import Journal
+from pipeline.llm import DEFAULT_STALL_TIMEOUT, DEFAULT_URL, LLMClient, concurrency_from
+from pipeline.llm_cache import response_cache_from
+from pipeline.tiering import largest, route, tiers_from
+from pipeline.prompts import (FUNCTION_PROMPT_FIELDS, PACK_BEGIN, PACK_END, PromptBuilder, PromptStats,
+                              context_tokens, estimate_tokens, format_params, pack, prompt_budget, split_packed)
 
 # ==============================
 # ARGUMENT PARSING & CONFIG
@@ -27,15 +42,61 @@ from pathlib import Path
 parser = argparse.ArgumentParser()
 parser.add_argument("--config", required=True, help="Path to project config JSON")
 parser.add_argument("--mode", choices=["architecture", "modules", "functions"], required=True)
-parser.add_argument("--batch-size", type=int, default=30)
+parser.add_argument("--batch-size", type=int, default=30, help="Save the doc cache every N generated docs")
+parser.add_argument("--concurrency", type=int,
+                    help="Prompts in flight per LLM backend (default: llm_concurrency from the config, else 4)")
+parser.add_argument("--order", choices=["name", "bottom-up"], default="name",
+                    help="functions mode: 'bottom-up' documents callees before their callers "
+                         "and gives callers a short summary of each callee")
+parser.add_argument("--pack", action="store_true",
+                    help="functions mode: document small functions of the same file several per prompt")
+parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
 args = parser.parse_args()
 
+if args.pack and args.order == "bottom-up":
+    # Functions of one file would wait for each other's summaries inside a single prompt
+    parser.error("--pack cannot be combined with --order bottom-up")
+
+if args.trace:
+    TRACER.enable(args.trace, process_name="generate_docs_smart")
+
 with open(args.config, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
-OLLAMA_URL = CONFIG.get("llm_url", "http://localhost:11434/api/generate")
+OLLAMA_URL = CONFIG.get("llm_url", DEFAULT_URL)
 MODEL = CONFIG.get("llm_model", "mistral")
 
+NUM_PREDICT = 600
+
+LLM = LLMClient(
+    OLLAMA_URL, MODEL,
+    concurrency=concurrency_from(CONFIG, args.concurrency),
+    timeout=600,
+    options={
+        "num_predict": NUM_PREDICT,     # limite output
+        "temperature": 0.2
+    },
+    cache=response_cache_from(CONFIG),
+    # llm_stream: read answers token by token, fail a request once no token came for llm_stall_timeout s
+    stream=CONFIG.get("llm_stream", False),
+    stall_timeout=CONFIG.get("llm_stall_timeout", DEFAULT_STALL_TIMEOUT),
+    spool_dir=str(Path(CONFIG.get("docs_dir", "docs")) / ".partial"),
+)
+
+# Tokens a prompt may use (llm_context_tokens minus the answer), see pipeline/prompts.py
+PROMPT_BUDGET = prompt_budget(CONFIG, MODEL, NUM_PREDICT)
+STRIP_COMMENTS = CONFIG.get("llm_strip_comments", False)
+PROMPT_STATS = PromptStats()
+
+# llm_tiers: simple functions go to smaller models, see pipeline/tiering.py
+TIERS = tiers_from(CONFIG)
+
+# --pack: functions whose section fits SMALL_FUNCTION_TOKENS share a prompt, up to PACK_MAX
+# per prompt and as many as the context holds with PACKED_DOC_TOKENS of answer each
+SMALL_FUNCTION_TOKENS = 250
+PACKED_DOC_TOKENS = 250
+PACK_MAX = 8
+
 FUNCTIONS_INDEX_PATH = Path(CONFIG.get("functions_index", "analysis/functions_index.json"))
 CALLGRAPH_PATH = Path(CONFIG.get("call_graph", "analysis/call_graph.json"))
 DETAILS_DIR = Path(CONFIG.get("functions_detail_dir", "analysis/functions_detail"))
@@ -46,31 +107,30 @@ MODULES_DOC = DOCS_DIR / "modules"
 
 CACHE_FILE = DOCS_DIR / "doc_cache.json"
 
+# Module and subsystem summaries behind Architecture.md, by prompt hash
+ARCH_CACHE_FILE = DOCS_DIR / "architecture_cache.json"
+PROJECT_ROOT = CONFIG.get("project_root")
+
+# Write-ahead log of completed function docs: nothing generated is lost between cache saves
+JOURNAL = Journal(str(DOCS_DIR / "doc_journal.jsonl"))
+
+# Which impact set (see pipeline/impact.py) each mode has already handled
+IMPACT_STATE = DOCS_DIR / "impact_seen.json"
+IMPACT_CONFIG = dict(CONFIG, functions_index=str(FUNCTIONS_INDEX_PATH))
+
+# Callee summaries given to callers in --order bottom-up
+SUMMARY_CHARS = 300
+
 
 # ==============================
 # UTILITIES
 # ==============================
 
-def call_llm(prompt):
+async def call_llm(prompt, options=None, model=None):
 
     print(f"Prompt length: {len(prompt)}")
 
-    r = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "num_predict": 600,     # limite output
-                "temperature": 0.2
-            }
-        },
-        timeout=600
-    )
-
-    r.raise_for_status()
-    return r.json()["response"]
+    return await LLM.generate_async(prompt, options, model)
 
 
 
@@ -79,26 +139,47 @@ def compute_hash(content):
 
 
 def load_json(path):
-    if not path.exists():
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Cached per file: stages running in the same process share parsed artifacts
+    return load_artifact(path)
 
 
 def load_cache():
-    return load_json(CACHE_FILE) if CACHE_FILE.exists() else {}
+    # Not an artifact: the cache is mutated, so never share it through load_artifact
+    if not CACHE_FILE.exists():
+        return {}
+    with open(CACHE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
 
 
-def save_cache(cache):
-    with open(CACHE_FILE, "w") as f:
+def save_cache(cache, path=CACHE_FILE):
+    # Replace in one step: an interrupted run never leaves a truncated cache
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w") as f:
         json.dump(cache, f, indent=2)
+    os.replace(tmp, path)
+
+
+def resume_from_journal(cache):
+    """Re-apply the docs a previous (interrupted) run completed after its last cache save."""
+    records = JOURNAL.replay()
+    for rec in records:
+        out_path = FUNCTIONS_DOC / f"{rec['name']}.md"
+        if not out_path.exists() or out_path.read_text(encoding="utf-8") != rec["doc"]:
+            write_text_atomic(str(out_path), rec["doc"])
+        cache[rec["name"]] = rec["hash"]
+    if records:
+        save_cache(cache)
+        JOURNAL.clear()
+        print(f"Resumed {len(records)} completed generations from the journal")
 
 
 def load_function_details():
     details = {}
     if DETAILS_DIR.exists():
         for file in DETAILS_DIR.glob("*.json"):
-            details[file.stem] = load_json(file)
+            # Detail files are named <name>_<hash>.json: key by the function name they describe
+            detail = load_json(file)
+            details[detail.get("name", file.stem)] = detail
     return details
 
 
@@ -125,6 +206,37 @@ def extract_function_body(file_path, start_line):
     return "\n".join(body)
 
 
+def summarize_doc(doc):
+    """First paragraph of the Purpose section (else of the doc), on one line."""
+    lines = doc.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().lower().lstrip("#").strip() == "purpose":
+            lines = lines[i + 1:]
+            break
+
+    paragraph = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#") or not line:
+            if paragraph:
+                break
+            continue
+        paragraph.append(line)
+
+    summary = " ".join(paragraph)
+    if len(summary) > SUMMARY_CHARS:
+        summary = summary[:SUMMARY_CHARS].rsplit(" ", 1)[0] + "..."
+    return summary
+
+
+def callee_summary(name, summaries):
+    """Summary of an already documented function: from this run, else from its doc file."""
+    if name not in summaries:
+        doc_path = FUNCTIONS_DOC / f"{name}.md"
+        summaries[name] = summarize_doc(doc_path.read_text(encoding="utf-8")) if doc_path.exists() else ""
+    return summaries[name]
+
+
 # ==============================
 # INTELLIGENT FILTERING
 # ==============================
@@ -163,31 +275,42 @@ def is_interesting_function(name, detail, callgraph, fan_in):
 # DOC GENERATORS
 # ==============================
 
-def generate_function_doc(name, meta, detail, callgraph):
+async def generate_function_doc(name, meta, detail, callgraph, callee_summaries=None):
 
-    body = ""
-    if meta.get("file") and meta.get("line"):
+    # The detail already holds the body (clang extent): no need to re-read the source file
+    body = detail.get("raw_body", "")
+    if not body and meta.get("file") and meta.get("line"):
         body = extract_function_body(meta["file"], meta["line"])
 
-    # âš  Rimuoviamo raw_body e body_hash dal JSON passato al LLM
-    detail_for_llm = dict(detail)
-    detail_for_llm.pop("raw_body", None)
-    detail_for_llm.pop("body_hash", None)
-
-    prompt = f"""
+    calls = callgraph.get(name, [])
+    if callee_summaries is not None:
+        # What each callee does, instead of leaving the model to guess from its name
+        lines = []
+        for callee in calls:
+            summary = callee_summaries.get(callee)
+            lines.append(f"- {callee}: {summary}" if summary else f"- {callee}")
+        calls = "\n" + "\n".join(lines) if lines else "none"
+    else:
+        calls = ", ".join(calls) or "none"
+
+    model = route(detail, TIERS, MODEL)
+
+    # Fields stated in the header or the Code section are not repeated in the JSON
+    budget = prompt_budget(CONFIG, model, NUM_PREDICT)
+    prompt = PromptBuilder(budget, strip=STRIP_COMMENTS, stats=PROMPT_STATS).add(f"""
 You are an embedded firmware documentation assistant.
 Write professional Markdown.
 
 Function: {name}
 Return type: {meta.get("return")}
-Parameters: {meta.get("params")}
-Calls: {callgraph.get(name, [])}
+Parameters: {format_params(meta.get("params"))}
+Calls: {calls}
 
 Static analysis details:
-{json.dumps(detail_for_llm, indent=2)}
+""").add_json(detail, omit=FUNCTION_PROMPT_FIELDS).add("""
 
 Code:
-{body}
+""").add_code(body).add(f"""
 
 Output:
 # {name}
@@ -197,13 +320,90 @@ Output:
 ## Dependencies
 ## Internal Logic
 ## Side Effects
+""").build()
+
+    return await call_llm(prompt, model=model)
+
+
+
+PACKED_PROMPT = """
+You are an embedded firmware documentation assistant.
+Document each of the {count} functions below in professional Markdown.
+For every function, in the same order, write exactly:
+{begin}
+# <function name>
+## Purpose
+## Parameters
+## Return
+## Side Effects
+{end}
+{sections}
 """
 
-    return call_llm(prompt)
 
+def function_section(name, meta, detail, callgraph):
+    """One function of a packed prompt: header, compact details and code, no output instructions."""
+    body = detail.get("raw_body", "")
+    if not body and meta.get("file") and meta.get("line"):
+        body = extract_function_body(meta["file"], meta["line"])
 
+    return PromptBuilder(PROMPT_BUDGET, strip=STRIP_COMMENTS).add(f"""
+Function: {name}
+Return type: {meta.get("return")}
+Parameters: {format_params(meta.get("params"))}
+Calls: {", ".join(callgraph.get(name, [])) or "none"}
+Static analysis details: """).add_json(detail, omit=FUNCTION_PROMPT_FIELDS).add("""
+Code:
+""").add_code(body).add("\n").build()
+
+
+def packed_prompt(sections):
+    return PACKED_PROMPT.format(count=len(sections), begin=PACK_BEGIN.format("<function name>"),
+                                end=PACK_END.format("<function name>"), sections="".join(sections))
+
+
+def plan_packs(names, functions_index, sections):
+    """
+    Group the small functions of each file, keeping the prompt plus PACKED_DOC_TOKENS
+    of answer per function within the model context. Single functions stay unpacked.
+    """
+    # Whichever model a group is routed to, its prompt has to fit
+    context = min(context_tokens(CONFIG, model) for model in [MODEL] + [tier["model"] for tier in TIERS])
+    overhead = estimate_tokens(packed_prompt([]))
+
+    by_file = {}
+    for name in names:
+        if estimate_tokens(sections[name]) <= SMALL_FUNCTION_TOKENS:
+            by_file.setdefault(functions_index[name].get("file"), []).append(name)
+
+    groups = []
+    for members in by_file.values():
+        group, used = [], overhead
+        for name in members:
+            cost = estimate_tokens(sections[name]) + PACKED_DOC_TOKENS
+            if group and (used + cost > context or len(group) == PACK_MAX):
+                groups.append(tuple(group))
+                group, used = [], overhead
+            group.append(name)
+            used += cost
+        groups.append(tuple(group))
+    return [g for g in groups if len(g) > 1]
+
+
+async def generate_packed_docs(group, sections, details):
+    """Docs by name for the functions of `group` the answer covers; {} if the request failed."""
+    prompt = packed_prompt([sections[name] for name in group])
+    # The model the most demanding member needs
+    model = largest([route(details.get(name, {}), TIERS, MODEL) for name in group], TIERS, MODEL)
+    try:
+        response = await call_llm(prompt, {"num_predict": PACKED_DOC_TOKENS * len(group)}, model)
+    except Exception as e:
+        print(f"Packed prompt for {', '.join(group)} failed ({e}): single prompts")
+        return {}
+    return split_packed(response, group)
 
-def generate_module_doc(file_path, functions):
+
+async def generate_module_doc(file_path, functions):
 
     prompt = f"""
 Document firmware module.
@@ -219,25 +419,190 @@ Output:
 ## Design Notes
 """
 
-    return call_llm(prompt)
-
+    return await call_llm(prompt)
 
-def generate_architecture_doc(callgraph):
 
-    prompt = f"""
-Document firmware architecture from callgraph.
+SUMMARY_PROMPT = """
+You are an embedded firmware documentation assistant.
+{task}
 
-Callgraph:
-{json.dumps(callgraph, indent=2)[:15000]}
+{items}
 
 Output:
-# Architecture
+{output}
+"""
+
+PART_OUTPUT = "One paragraph summarizing this part."
+MODULE_OUTPUT = "One paragraph: the responsibility of the module and its key functions."
+SUBSYSTEM_OUTPUT = "One paragraph: the role of the subsystem, its main modules and what it depends on."
+ARCHITECTURE_OUTPUT = """# Architecture
 ## Overview
 ## Main Subsystems
-## Call Flow Highlights
-"""
+## Call Flow Highlights"""
+
+
+class PartialSummaries:
+    """Cached map-reduce steps: key -> (prompt hash, summary). Only the keys used in a run are kept."""
+
+    def __init__(self, path):
+        self.path = path
+        self.old = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.old = json.load(f)
+        self.new = {}
+        self.reused = 0
+
+    def get(self, key, prompt_hash):
+        entry = self.old.get(key)
+        if entry and entry["hash"] == prompt_hash:
+            self.reused += 1
+            self.new[key] = entry
+            return entry["summary"]
+        return None
+
+    def put(self, key, prompt_hash, summary):
+        self.new[key] = {"hash": prompt_hash, "summary": summary}
+
+    def save(self):
+        save_cache(self.new, self.path)
+
+
+async def summarize(partials, key, task, items, output):
+    """
+    One map-reduce step. If `items` fit the prompt budget this is a single prompt; otherwise
+    budget-sized groups are summarized concurrently and their summaries reduced the same way.
+    """
+    overhead = estimate_tokens(SUMMARY_PROMPT.format(task=task, items="", output=output))
+    groups = pack(items, PROMPT_BUDGET - overhead)
+
+    if len(groups) > 1 and len(groups) < len(items):
+        parts = await asyncio.gather(*(
+            summarize(partials, f"{key}#{i}", f"{task} (part {i + 1} of {len(groups)})", group, PART_OUTPUT)
+            for i, group in enumerate(groups)
+        ))
+        return await summarize(partials, key, task, [f"- Part {i + 1}: {p}" for i, p in enumerate(parts)], output)
+
+    # Groups no longer shrink (budget smaller than two summaries): keep what fits
+    body = groups[0]
+    if len(groups) > 1:
+        body = body + [f"[{len(items) - len(body)} more entries omitted]"]
+
+    prompt = SUMMARY_PROMPT.format(task=task, items="\n".join(body), output=output)
+    prompt_hash = compute_hash(prompt)
+    summary = partials.get(key, prompt_hash)
+    if summary is None:
+        summary = (await call_llm(prompt)).strip()
+        partials.put(key, prompt_hash, summary)
+    return summary
+
+
+def subsystem_of(file_path):
+    """Subsystem = source directory, relative to project_root when inside it."""
+    directory = os.path.dirname(os.path.normpath(file_path))
+    if PROJECT_ROOT:
+        rel = os.path.relpath(directory, PROJECT_ROOT)
+        if not rel.startswith(".."):
+            return "(root)" if rel == "." else rel.replace(os.sep, "/")
+    return directory
+
+
+def module_dependencies(callgraph, functions_index):
+    """(caller file, callee file) -> number of call edges, across files only."""
+    edges = {}
+    for caller, callees in callgraph.items():
+        src = functions_index.get(caller, {}).get("file")
+        if not src:
+            continue
+        for callee in callees:
+            dst = functions_index.get(callee, {}).get("file")
+            if dst and dst != src:
+                edges[(src, dst)] = edges.get((src, dst), 0) + 1
+    return edges
+
+
+def function_line(name, meta, summaries):
+    line = f"- {name}({format_params(meta.get('params'))}) -> {meta.get('return')}"
+    summary = callee_summary(name, summaries)
+    return f"{line}: {summary}" if summary else line
+
+
+async def generate_architecture_doc(callgraph, functions_index):
+    """
+    Modules are summarized from their functions, subsystems from their module summaries and
+    the module dependency graph, the architecture from the subsystems. Each level runs
+    concurrently. Returns (doc, failures); doc is None when a level failed.
+    """
+    partials = PartialSummaries(ARCH_CACHE_FILE)
+    edges = module_dependencies(callgraph, functions_index)
+    summaries = {}
+
+    file_map = {}
+    for name, meta in functions_index.items():
+        if meta.get("file"):
+            file_map.setdefault(meta["file"], []).append(name)
 
-    return call_llm(prompt)
+    async def run_level(label, keys, run):
+        results = {}
+        started = len(partials.new)
+        failures = await LLM.map_ordered(keys, run, results.__setitem__)
+        partials.save()
+        print(f"{label}: {len(results)} summarized ({len(partials.new) - started} steps, "
+              f"{partials.reused} reused so far)")
+        return results, failures
+
+    # ---- modules
+    async def module(file_path):
+        items = [function_line(n, functions_index[n], summaries) for n in sorted(file_map[file_path])]
+        return await summarize(partials, f"module:{file_path}",
+                               f"Firmware module {file_path}. Its functions:", items, MODULE_OUTPUT)
+
+    modules, failures = await run_level("Modules", sorted(file_map), module)
+    if failures:
+        return None, failures
+
+    # ---- subsystems
+    subsystems = {}
+    for file_path in modules:
+        subsystems.setdefault(subsystem_of(file_path), []).append(file_path)
+
+    def module_name(file_path, here):
+        sub = subsystem_of(file_path)
+        return Path(file_path).name if sub == here else f"{sub}/{Path(file_path).name}"
+
+    async def subsystem(sub):
+        files = set(subsystems[sub])
+        items = [f"- {Path(f).name}: {modules[f]}" for f in sorted(files)]
+        items += [
+            f"- {module_name(a, sub)} -> {module_name(b, sub)} ({n} calls)"
+            for (a, b), n in sorted(edges.items()) if a in files or b in files
+        ]
+        return await summarize(partials, f"subsystem:{sub}",
+                               f"Firmware subsystem {sub}. Its modules, then the calls between modules:",
+                               items, SUBSYSTEM_OUTPUT)
+
+    subsystem_docs, failures = await run_level("Subsystems", sorted(subsystems), subsystem)
+    if failures:
+        return None, failures
+
+    # ---- architecture
+    sub_edges = {}
+    for (a, b), n in edges.items():
+        key = (subsystem_of(a), subsystem_of(b))
+        if key[0] != key[1]:
+            sub_edges[key] = sub_edges.get(key, 0) + n
+
+    items = [f"- {sub}: {doc}" for sub, doc in subsystem_docs.items()]
+    items += [f"- {a} -> {b} ({n} calls)" for (a, b), n in sorted(sub_edges.items())]
+    try:
+        doc = await summarize(partials, "architecture",
+                              "Document the firmware architecture. Its subsystems, then the calls between them:",
+                              items, ARCHITECTURE_OUTPUT)
+    except Exception as e:
+        return None, [("architecture", e)]
+    finally:
+        partials.save()
+    return doc, []
 
 
 # ==============================
@@ -259,10 +624,20 @@ def main():
 
     # ---------------- ARCHITECTURE ----------------
 
+    impact = pending_impact(IMPACT_CONFIG, IMPACT_STATE, args.mode)
+
     if args.mode == "architecture":
-        print("Generating architecture...")
-        doc = generate_architecture_doc(callgraph)
-        (DOCS_DIR / "Architecture.md").write_text(doc, encoding="utf-8")
+        out_path = DOCS_DIR / "Architecture.md"
+        if impact is not None and not impact["structural_functions"] and out_path.exists():
+            print("Architecture up to date (no call graph change).")
+        else:
+            print("Generating architecture...")
+            doc, failures = asyncio.run(generate_architecture_doc(callgraph, functions_index))
+            if failures:
+                report_failures(failures)
+                return failures
+            write_text_atomic(str(out_path), doc)
+        mark_consumed(IMPACT_CONFIG, IMPACT_STATE, args.mode)
         print("Done.")
         return
 
@@ -273,18 +648,39 @@ def main():
         for name, meta in functions_index.items():
             file_map.setdefault(meta["file"], []).append(name)
 
+        changed_files = None if impact is None else set(impact["changed_files"])
+        skipped = 0
+        todo = []
+
         for file_path, funcs in file_map.items():
+            out_path = MODULES_DOC / f"{Path(file_path).stem}.md"
+            if changed_files is not None and os.path.normpath(file_path) not in changed_files and out_path.exists():
+                skipped += 1
+                continue
+            todo.append(file_path)
+
+        async def document(file_path):
             print(f"Module: {file_path}")
-            doc = generate_module_doc(file_path, funcs)
-            (MODULES_DOC / f"{Path(file_path).stem}.md").write_text(doc, encoding="utf-8")
+            return await generate_module_doc(file_path, file_map[file_path])
 
-        print("Done.")
-        return
+        def write(file_path, doc):
+            write_text_atomic(str(MODULES_DOC / f"{Path(file_path).stem}.md"), doc)
+
+        failures = asyncio.run(LLM.map_ordered(todo, document, write))
+        report_failures(failures)
+
+        # A failed module must be retried next run even if its file does not change
+        if not failures:
+            mark_consumed(IMPACT_CONFIG, IMPACT_STATE, args.mode)
+        print(f"Done. ({skipped} unaffected modules skipped)")
+        return failures
 
     # ---------------- FUNCTIONS ----------------
 
     if args.mode == "functions":
 
+        resume_from_journal(cache)
+
         all_functions = sorted(functions_index.keys())
 
         interesting = [
@@ -297,52 +693,164 @@ def main():
             )
         ]
 
-        total = len(interesting)
-        batch_size = args.batch_size
-
-        print(f"Total interesting functions: {total}")
-
-        for start in range(0, total, batch_size):
-
-            batch = interesting[start:start + batch_size]
-            print(f"\n=== Processing functions {start} to {start + len(batch)} ===")
-
-            for name in batch:
-
-                meta = functions_index[name]
-                detail = function_details.get(name, {})
-                calls = callgraph.get(name, [])
-
-                body = ""
-                if meta.get("file") and meta.get("line"):
-                    body = extract_function_body(meta["file"], meta["line"])
-
-                hash_input = json.dumps(meta, sort_keys=True) + \
-                             json.dumps(detail, sort_keys=True) + \
-                             json.dumps(calls, sort_keys=True) + \
-                             body
-
-                current_hash = compute_hash(hash_input)
-
-                if cache.get(name) == current_hash:
-                    print(f"SKIP {name}")
-                    continue
-
-                print(f"Generating {name}")
-
-                doc = generate_function_doc(name, meta, detail, callgraph)
-                (FUNCTIONS_DOC / f"{name}.md").write_text(doc, encoding="utf-8")
-
-                cache[name] = current_hash
-
+        # Only functions in the impact set (or never documented) can need a new doc
+        if impact is not None:
+            changed = set(impact["changed_functions"])
+            if args.order == "bottom-up":
+                # A caller's prompt holds its callees' summaries
+                changed |= set(impact["impacted_callers"])
+            candidates = [f for f in interesting if f in changed or f not in cache]
+            print(f"Impact set: {len(candidates)} of {len(interesting)} interesting functions to check")
+            interesting = candidates
+
+        todo = {}
+        for name in interesting:
+
+            meta = functions_index[name]
+            detail = function_details.get(name, {})
+            calls = callgraph.get(name, [])
+
+            body = ""
+            if meta.get("file") and meta.get("line"):
+                body = extract_function_body(meta["file"], meta["line"])
+
+            hash_input = json.dumps(meta, sort_keys=True) + \
+                         json.dumps(detail, sort_keys=True) + \
+                         json.dumps(calls, sort_keys=True) + \
+                         body
+
+            current_hash = compute_hash(hash_input)
+
+            # Bottom-up keys also cover the callee summaries, known once the callees are done
+            if args.order != "bottom-up" and cache.get(name) == current_hash:
+                print(f"SKIP {name}")
+                continue
+
+            todo[name] = current_hash
+
+        total = len(todo)
+        print(f"Total interesting functions: {len(interesting)} "
+              f"({total} to {'check' if args.order == 'bottom-up' else 'generate'}, {LLM.concurrency} in flight)")
+
+        order = list(todo)
+        keys = dict(todo)
+        waits_for = {}
+        summaries = None
+        if args.order == "bottom-up":
+            # Callees first; a caller waits for the callees documented in this run (except
+            # those in its own recursion cycle), so independent branches still run in parallel
+            order, waits_for = bottom_up(callgraph, functions_index, todo)
+            summaries = {}
+        finished = {name: asyncio.Event() for name in order}
+
+        pack_of = {}
+        packed = {}
+        fallbacks = 0
+        if args.pack:
+            sections = {
+                name: function_section(name, functions_index[name], function_details.get(name, {}), callgraph)
+                for name in order
+            }
+            groups = plan_packs(order, functions_index, sections)
+            for group in groups:
+                for name in group:
+                    pack_of[name] = group
+            print(f"Packing {len(pack_of)} small functions into {len(groups)} prompts")
+
+        async def packed_doc(name):
+            # The first member of a group sends its prompt; the others await the same answer
+            group = pack_of[name]
+            if group not in packed:
+                packed[group] = asyncio.ensure_future(generate_packed_docs(group, sections, function_details))
+            return (await packed[group]).get(name)
+
+        async def document(name):
+            nonlocal fallbacks
+            try:
+                for callee in waits_for.get(name, ()):
+                    await finished[callee].wait()
+                context = None
+                if summaries is not None:
+                    # Callees in the same recursion cycle may not be done yet: leave them out so
+                    # the prompt (and its response cache key) does not depend on timing
+                    context = {
+                        callee: callee_summary(callee, summaries) for callee in callgraph.get(name, [])
+                        if callee not in todo or callee in waits_for[name]
+                    }
+                    # A new callee summary makes the cached doc of its caller outdated
+                    keys[name] = compute_hash(todo[name] + json.dumps(context, sort_keys=True))
+                    if cache.get(name) == keys[name]:
+                        print(f"SKIP {name}")
+                        return None
+                doc = None
+                if name in pack_of:
+                    doc = await packed_doc(name)
+                    if doc is None:
+                        fallbacks += 1
+                if doc is None:
+                    print(f"Generating {name}")
+                    doc = await generate_function_doc(name, functions_index[name], function_details.get(name, {}),
+                                                      callgraph, context)
+                if summaries is not None:
+                    summaries[name] = summarize_doc(doc)
+                # Durable before it waits for its turn to be written
+                JOURNAL.append({"name": name, "hash": keys[name], "doc": doc})
+                return doc
+            finally:
+                # A failed callee must not block its callers: they go on without its summary
+                finished[name].set()
+
+        # Runs in the event loop thread, in job order: no lock needed around the cache
+        written = 0
+
+        def write(name, doc):
+            nonlocal written
+            if doc is None:
+                # Bottom-up: cached doc still matches its callee summaries
+                return
+            write_text_atomic(str(FUNCTIONS_DOC / f"{name}.md"), doc)
+            cache[name] = keys[name]
+            written += 1
+            if written % args.batch_size == 0:
+                save_cache(cache)
+                print(f"\n=== {written} of {total} functions written ===")
+
+        try:
+            failures = asyncio.run(LLM.map_ordered(order, document, write))
+        finally:
             save_cache(cache)
-
+            JOURNAL.close()
+        # Every journaled doc is now written and in the cache
+        JOURNAL.clear()
+        report_failures(failures)
+        if pack_of:
+            print(f"Packed prompts: {len(packed)} sent, {fallbacks} function(s) missing from the answers "
+                  f"were documented with single prompts")
+
+        if not failures:
+            mark_consumed(IMPACT_CONFIG, IMPACT_STATE, args.mode)
         print("All batches completed.")
-        return
+        return failures
+
+
+def report_failures(failures):
+    for item, error in failures:
+        print(f"LLM ERROR {item}: {error}")
+    if failures:
+        print(f"{len(failures)} prompt(s) failed; they are retried on the next run")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        failed = main()
+    finally:
+        for line in [PROMPT_STATS.report_line()] + LLM.report_lines():
+            if line:
+                print(line)
+        LLM.close()
+        TRACER.save()
+    if failed:
+        sys.exit(1)
 
 
 
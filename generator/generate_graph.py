@@ -19,6 +19,13 @@ import json
 import argparse
 from collections import defaultdict
 from graphviz import Digraph
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "extractor"))
+from pipeline.trace import TRACER
+from pipeline.artifacts import load_artifact
+from pipeline.impact import mark_consumed, pending_impact
 
 # ==========================================
 # CONFIG SETUP
@@ -26,8 +33,12 @@ from graphviz import Digraph
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--config", required=True, help="Path to project config JSON")
+parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
 args = parser.parse_args()
 
+if args.trace:
+    TRACER.enable(args.trace, process_name="generate_graph")
+
 with open(args.config, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
@@ -43,16 +54,17 @@ os.makedirs(OUT_DIR, exist_ok=True)
 
 OUTPUT_FILE = os.path.join(OUT_DIR, "architecture_final")
 
+IMPACT_STATE = os.path.join(OUT_DIR, "impact_seen.json")
+IMPACT_CONFIG = dict(CONFIG, functions_index=FUNCTIONS_INDEX_PATH)
+
 
 # ==========================================
 # UTIL
 # ==========================================
 
 def load_json(path):
-    if not os.path.exists(path):
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Cached per file: stages running in the same process share parsed artifacts
+    return load_artifact(path)
 
 
 def is_application_file(path):
@@ -154,7 +166,8 @@ def build_architecture_graph(callgraph, functions_index, tasks):
     # RENDER PNG
     # --------------------------------------
 
-    dot.render(OUTPUT_FILE, format="png", cleanup=True)
+    with TRACER.span("render_graph", cat="graph", output=OUTPUT_FILE + ".png", modules=len(modules)):
+        dot.render(OUTPUT_FILE, format="png", cleanup=True)
     print(f"[âœ“] Generated {OUTPUT_FILE}.png")
 
 
@@ -169,10 +182,20 @@ def main():
     functions_index = load_json(FUNCTIONS_INDEX_PATH)
     tasks = load_json(TASKS_PATH)
 
-    build_architecture_graph(callgraph, functions_index, tasks)
+    # Tasks and module edges only change with the call structure, not with function bodies
+    impact = pending_impact(IMPACT_CONFIG, IMPACT_STATE, "graph")
+    if (impact is not None and not impact["structural_files"] and not impact["tasks_changed"]
+            and os.path.exists(OUTPUT_FILE + ".png")):
+        print(f"[=] {OUTPUT_FILE}.png unchanged (not affected by the impact set)")
+    else:
+        build_architecture_graph(callgraph, functions_index, tasks)
+    mark_consumed(IMPACT_CONFIG, IMPACT_STATE, "graph")
 
     print("\nðŸŽ¯ Done.\n")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        TRACER.save()
@@ -18,6 +18,13 @@ import os
 import json
 import argparse
 from collections import defaultdict
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "extractor"))
+from pipeline.trace import TRACER
+from pipeline.artifacts import load_artifact
+from pipeline.impact import mark_consumed, pending_impact
 
 # ==========================================
 # CONFIG SETUP
@@ -25,8 +32,12 @@ from collections import defaultdict
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--config", required=True, help="Path to project config JSON")
+parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
 args = parser.parse_args()
 
+if args.trace:
+    TRACER.enable(args.trace, process_name="generate_graph_mermaid")
+
 with open(args.config, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
@@ -40,16 +51,17 @@ TASKS_PATH = get_path("tasks", "analysis/tasks.json")
 OUT_DIR = get_path("architecture_dir", "analysis/architecture")
 os.makedirs(OUT_DIR, exist_ok=True)
 
+IMPACT_STATE = os.path.join(OUT_DIR, "impact_seen.json")
+IMPACT_CONFIG = dict(CONFIG, functions_index=FUNCTIONS_INDEX_PATH)
+
 
 # ==========================================
 # UTIL
 # ==========================================
 
 def load_json(path):
-    if not os.path.exists(path):
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Cached per file: stages running in the same process share parsed artifacts
+    return load_artifact(path)
 
 
 def classify_layer(file_path):
@@ -198,6 +210,21 @@ def generate_file_dependency_diagram(callgraph, functions_index):
 # MAIN
 # ==========================================
 
+def affected_diagrams(impact):
+    """Diagrams whose inputs the impact set touches; None means all of them."""
+    if impact is None:
+        return None
+    affected = set()
+    structural_files = impact["structural_files"]
+    if structural_files:
+        affected.add("file_dependencies.mmd")
+    if structural_files or impact["tasks_changed"]:
+        affected.add("layered_architecture.mmd")
+    if any("application" in f.lower() for f in structural_files):
+        affected.add("application_modules.mmd")
+    return affected
+
+
 def main():
     print("\n=== GENERATE MERMAID ARCHITECTURE DIAGRAMS ===\n")
 
@@ -205,12 +232,26 @@ def main():
     functions_index = load_json(FUNCTIONS_INDEX_PATH)
     tasks = load_json(TASKS_PATH)
 
-    generate_layered_diagram(callgraph, functions_index, tasks)
-    generate_application_module_diagram(callgraph, functions_index)
-    generate_file_dependency_diagram(callgraph, functions_index)
+    affected = affected_diagrams(pending_impact(IMPACT_CONFIG, IMPACT_STATE, "mermaid"))
+    diagrams = [
+        ("layered_architecture.mmd", lambda: generate_layered_diagram(callgraph, functions_index, tasks)),
+        ("application_modules.mmd", lambda: generate_application_module_diagram(callgraph, functions_index)),
+        ("file_dependencies.mmd", lambda: generate_file_dependency_diagram(callgraph, functions_index)),
+    ]
+    for output, render in diagrams:
+        if affected is not None and output not in affected and os.path.exists(os.path.join(OUT_DIR, output)):
+            print(f"[=] {output} unchanged (not affected by the impact set)")
+            continue
+        with TRACER.span("render_graph", cat="graph", output=output):
+            render()
+
+    mark_consumed(IMPACT_CONFIG, IMPACT_STATE, "mermaid")
 
     print("\nðŸŽ¯ Done.\n")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        TRACER.save()
@@ -16,15 +16,23 @@
 
 import argparse
 import json
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "extractor"))
+from pipeline.trace import TRACER
+
 # ==========================================
 # CONFIG SETUP
 # ==========================================
 parser = argparse.ArgumentParser()
 parser.add_argument("--config", required=True, help="Path to project config JSON")
+parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) to this path")
 args = parser.parse_args()
 
+if args.trace:
+    TRACER.enable(args.trace, process_name="merge_docs")
+
 with open(args.config, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
@@ -83,5 +91,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        TRACER.save()
 
@@ -0,0 +1,71 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+firmware-lens: single entry point for every pipeline stage.
+
+    python orchestrator/script/firmware_lens.py all --config config.json
+    python orchestrator/script/firmware_lens.py extract --config config.json --force
+    python orchestrator/script/firmware_lens.py docs --config config.json --mode modules
+    python orchestrator/script/firmware_lens.py serve --config config.json
+
+Subcommands are resolved lazily: only the selected stage script (and its
+dependencies) is imported. Options after the subcommand are passed through
+unchanged to the underlying script.
+"""
+
+import argparse
+import sys
+
+from stages import STAGES, run_stage
+
+DESCRIPTIONS = {
+    "extract": "Pipeline Extractor",
+    "docs": "Generate Docs (smart)",
+    "details": "Generate Docs (detailed)",
+    "report": "Generate Architecture Report (CSV/Metadata)",
+    "graph": "Generate Architecture Graph (Graphviz)",
+    "mermaid": "Generate Architecture Graphs (Mermaid)",
+    "merge": "Merge Documentation into Final Output",
+    "serve": "Query Server (call graph / tasks)",
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="firmware-lens",
+        description="Run Firmware Lens stages in a single process.",
+    )
+    parser.add_argument("command", choices=["all"] + sorted(STAGES), help="Stage to run ('all' runs the full pipeline)")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Options passed through to the stage")
+    args = parser.parse_args(argv)
+
+    if args.command == "all":
+        import run_all
+        sys.argv = [run_all.__file__] + args.args
+        return run_all.entry()
+
+    stage_parser = argparse.ArgumentParser(prog=f"firmware-lens {args.command}", add_help=False)
+    stage_parser.add_argument("--isolate", action="store_true", help="Run the stage in a separate Python process")
+    stage_parser.add_argument("--in-process", action="store_true", help="Run the stage in this process even if it is isolated by default")
+    opts, rest = stage_parser.parse_known_args(args.args)
+
+    isolate = True if opts.isolate else (False if opts.in_process else None)
+    run_stage(args.command, rest, DESCRIPTIONS[args.command], isolate=isolate)
+
+
+if __name__ == "__main__":
+    main()
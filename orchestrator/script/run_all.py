@@ -1,6 +1,6 @@
 import os
+import atexit
 import argparse
-import subprocess
 import sys
 import datetime
 from pathlib import Path
@@ -47,33 +47,15 @@ class LoggerWriter:
     def close(self):
         self.log_file.close()
 
-def run_command(command, description):
-    print(f"\n{'='*60}")
-    print(f"🚀 RUNNING: {description}")
-    print(f"➜ {' '.join(command)}")
-    print(f"{'='*60}\n")
-    
-    # Use Popen to capture stdout and stderr and print it line by line
-    # so that our LoggerWriter can intercept it and save it to the log file.
-    process = subprocess.Popen(
-        command, 
-        stdout=subprocess.PIPE, 
-        stderr=subprocess.STDOUT, 
-        text=True,
-        bufsize=1  # Line buffered
-    )
-    
-    # Read output line by line as it is generated
-    if process.stdout:
-        for line in process.stdout:
-            print(line, end="")
-        
-    process.wait()
-    
-    if process.returncode != 0:
-        print(f"\n❌ ERROR: Step '{description}' failed with code {process.returncode}")
-        # non facciamo sys.exit prima di chiudere i log, usiamo un'eccezione o usciamo puliti
-        raise SystemExit(process.returncode)
+def finalize_trace(trace_path, parts):
+    """Merge the orchestrator trace with the traces of isolated stages into a single file."""
+    from pipeline.trace import TRACER, merge_traces
+
+    TRACER.save()
+    merge_traces([TRACER.path] + parts, trace_path)
+    for part in parts:
+        if os.path.exists(part):
+            os.remove(part)
 
 def main():
     # Force UTF-8 encoding for standard output on Windows to support emojis
@@ -91,6 +73,10 @@ def main():
     parser.add_argument("--skip-generator", action="store_true", help="Skip the documentation generation phase")
     parser.add_argument("--skip-graphs", action="store_true", help="Skip the graph generation phase")
     parser.add_argument("--skip-merge", action="store_true", help="Skip the final merge phase")
+    parser.add_argument("--trace", help="Write a Chrome trace event JSON (Perfetto) covering every stage to this path")
+    parser.add_argument("--isolate", nargs="*", metavar="STAGE",
+                        help="Stages to run in a separate Python process (default: extract). "
+                             "Pass with no value to run everything in-process.")
     
     args = parser.parse_args()
     config_path = args.config
@@ -156,55 +142,55 @@ def main():
     sys.stdout = LoggerWriter(sys.stdout, log_file_path)
     sys.stderr = LoggerWriter(sys.stderr, log_file_path)
 
-    # Resolve project root dynamically so we can run this from anywhere
-    project_root = Path(__file__).resolve().parent.parent.parent
-    
-    # Helper per costruire i comandi con path assoluti
-    def get_script_path(*parts):
-        return str(project_root.joinpath(*parts))
+    # Stages run in this interpreter unless they need isolation (see stages.py)
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from stages import ISOLATED_BY_DEFAULT, run_stage
+    from pipeline.trace import TRACER
+
+    isolated = ISOLATED_BY_DEFAULT if args.isolate is None else set(args.isolate)
+    trace_parts = []
+
+    def stage(name, argv, description, part_name):
+        isolate = name in isolated
+        if args.trace and isolate:
+            # Isolated stages write their own trace part; parts are merged on exit
+            part = f"{args.trace}.{part_name}.part"
+            trace_parts.append(part)
+            argv = argv + ["--trace", part]
+        run_stage(name, argv, description, isolate=isolate)
+
+    if args.trace:
+        TRACER.enable(args.trace, process_name="run_all")
+        atexit.register(finalize_trace, args.trace, trace_parts)
+        print(f"🧭 Tracing to: {args.trace}")
+
+    base_args = ["--config", config_path]
 
     # 1. Extractor Pipeline
     if not args.skip_extractor:
-        run_command(
-            [sys.executable, get_script_path("extractor", "pipeline_runner.py"), "--config", config_path],
-            "Pipeline Extractor"
-        )
+        stage("extract", base_args, "Pipeline Extractor", "extractor")
     else:
         print("\n⏭️  SKIPPING Pipeline Extractor")
 
     # 2. Document Generators
     if not args.skip_generator:
-        base_gen_cmd = [sys.executable, get_script_path("generator", "generate_docs_smart.py"), "--config", config_path]
-        
-        run_command(base_gen_cmd + ["--mode", "architecture"], "Generate Architecture Docs")
-        run_command(base_gen_cmd + ["--mode", "modules"], "Generate Module Docs")
-        run_command(base_gen_cmd + ["--mode", "functions", "--batch-size", "30"], "Generate Function Docs")
+        stage("docs", base_args + ["--mode", "architecture"], "Generate Architecture Docs", "docs_architecture")
+        stage("docs", base_args + ["--mode", "modules"], "Generate Module Docs", "docs_modules")
+        stage("docs", base_args + ["--mode", "functions", "--batch-size", "30"], "Generate Function Docs", "docs_functions")
     else:
         print("\n⏭️  SKIPPING Document Generation")
 
     # 3. Graph Generators
     if not args.skip_graphs:
-        run_command(
-            [sys.executable, get_script_path("generator", "generate_architecture_report.py"), "--config", config_path],
-            "Generate Architecture Report (CSV/Metadata)"
-        )
-        run_command(
-            [sys.executable, get_script_path("generator", "generate_graph.py"), "--config", config_path],
-            "Generate Architecture Graph (Graphviz)"
-        )
-        run_command(
-            [sys.executable, get_script_path("generator", "generate_graph_mermaid.py"), "--config", config_path],
-            "Generate Architecture Graphs (Mermaid)"
-        )
+        stage("report", base_args, "Generate Architecture Report (CSV/Metadata)", "report")
+        stage("graph", base_args, "Generate Architecture Graph (Graphviz)", "graph")
+        stage("mermaid", base_args, "Generate Architecture Graphs (Mermaid)", "mermaid")
     else:
         print("\n⏭️  SKIPPING Graph Generation")
 
     # 4. Merge
     if not args.skip_merge:
-        run_command(
-            [sys.executable, get_script_path("merge", "merge_docs.py"), "--config", config_path],
-            "Merge Documentation into Final Output"
-        )
+        stage("merge", base_args, "Merge Documentation into Final Output", "merge")
     else:
         print("\n⏭️  SKIPPING Merge Step")
 
@@ -218,7 +204,7 @@ def main():
     if hasattr(sys.stderr, "close"):
         sys.stderr.close()
 
-if __name__ == "__main__":
+def entry():
     try:
         main()
     except SystemExit as e:
@@ -228,3 +214,6 @@ if __name__ == "__main__":
         if hasattr(sys.stderr, "close"):
             sys.stderr.close()
         sys.exit(e.code)
+
+if __name__ == "__main__":
+    entry()
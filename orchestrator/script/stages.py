@@ -0,0 +1,126 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Stage runner shared by run_all.py and firmware_lens.py.
+
+Stages are the existing pipeline scripts. By default they are executed
+in-process with runpy, so heavy imports (pandas, networkx, requests,
+graphviz, clang) are paid once per run and artifacts loaded through
+pipeline.artifacts are shared between stages. A stage can still be run in a
+subprocess when it needs isolation (libclang is native code and its library
+path can only be set once per process).
+"""
+
+import runpy
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+STAGES = {
+    "extract": ("extractor", "pipeline_runner.py"),
+    "docs": ("generator", "generate_docs_smart.py"),
+    "details": ("generator", "generate_docs_details.py"),
+    "report": ("generator", "generate_architecture_report.py"),
+    "graph": ("generator", "generate_graph.py"),
+    "mermaid": ("generator", "generate_graph_mermaid.py"),
+    "merge": ("merge", "merge_docs.py"),
+    "serve": ("extractor", "query_server.py"),
+}
+
+# Stages that run in a subprocess unless the caller says otherwise
+ISOLATED_BY_DEFAULT = {"extract"}
+
+# Shared helpers (tracing, artifact cache) live in the extractor package
+if str(PROJECT_ROOT / "extractor") not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT / "extractor"))
+
+
+def script_path(stage):
+    return str(PROJECT_ROOT.joinpath(*STAGES[stage]))
+
+
+def banner(command, description):
+    print(f"\n{'='*60}")
+    print(f"🚀 RUNNING: {description}")
+    print(f"➜ {' '.join(command)}")
+    print(f"{'='*60}\n")
+
+
+def run_subprocess(command, description):
+    # Use Popen to capture stdout and stderr and print it line by line
+    # so that our LoggerWriter can intercept it and save it to the log file.
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1  # Line buffered
+    )
+
+    # Read output line by line as it is generated
+    if process.stdout:
+        for line in process.stdout:
+            print(line, end="")
+
+    process.wait()
+    return process.returncode
+
+
+def run_in_process(path, argv):
+    """Execute a script as __main__ with the given argv. Returns its exit code."""
+    saved_argv = sys.argv
+    saved_path = list(sys.path)
+
+    sys.argv = [path] + list(argv)
+    sys.path.insert(0, str(Path(path).parent))
+    try:
+        runpy.run_path(path, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    finally:
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+
+
+def run_stage(stage, argv, description, isolate=None):
+    from pipeline.trace import TRACER
+
+    if isolate is None:
+        isolate = stage in ISOLATED_BY_DEFAULT
+
+    path = script_path(stage)
+
+    if isolate:
+        command = [sys.executable, path] + list(argv)
+    else:
+        command = ["(in-process)", path] + list(argv)
+    banner(command, description)
+
+    with TRACER.span(description, cat="stage", stage=stage, isolated=isolate):
+        if isolate:
+            code = run_subprocess(command, description)
+        else:
+            code = run_in_process(path, argv)
+
+    if code != 0:
+        print(f"\n❌ ERROR: Step '{description}' failed with code {code}")
+        raise SystemExit(code)
@@ -0,0 +1,45 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Shared setup for the test suite: import paths and optional native dependencies."""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "extractor"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def libclang():
+    """LIBCLANG_PATH (or None for the bundled library); skips when libclang cannot be loaded."""
+    try:
+        from clang.cindex import Config, Index
+    except ImportError:
+        pytest.skip("clang bindings not installed")
+    path = os.environ.get("LIBCLANG_PATH")
+    try:
+        if path and not Config.loaded:
+            Config.set_library_file(path)
+        Index.create()
+    except Exception as e:
+        pytest.skip(f"libclang not loadable: {e}")
+    return path
@@ -0,0 +1,106 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+The multi-backend LLMClient against in-process mock Ollama servers
+(benchmarks/mock_llm_server.py).
+"""
+
+import asyncio
+import socket
+
+import pytest
+
+import mock_llm_server
+from pipeline.llm import LLMClient
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def url(port):
+    return f"http://127.0.0.1:{port}/api/generate"
+
+
+@pytest.fixture
+def backends():
+    ports = [free_port(), free_port()]
+    servers = mock_llm_server.start(mock_llm_server.parse_args(
+        ["--ports", *map(str, ports), "--delay", "0.05", "--parallel", "2"]))
+    yield ports
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def ask_all(client, prompts):
+    answers = []
+    failures = asyncio.run(client.map_ordered(
+        prompts, client.generate_async, lambda prompt, answer: answers.append((prompt, answer))))
+    return answers, failures
+
+
+def test_prompts_are_spread_over_backends(backends):
+    client = LLMClient([url(p) for p in backends], "mock", concurrency=2)
+    prompts = [f"prompt {i}" for i in range(12)]
+    try:
+        answers, failures = ask_all(client, prompts)
+        report = client.report()
+    finally:
+        client.close()
+
+    assert not failures
+    assert [prompt for prompt, _ in answers] == prompts
+    assert all(f"\n{prompt}\n" in answer for prompt, answer in answers)
+    assert [row["url"] for row in report] == [url(p) for p in backends]
+    assert all(row["requests"] > 0 and row["failures"] == 0 for row in report)
+    assert sum(row["requests"] for row in report) == len(prompts)
+
+
+def test_dead_backend_fails_over(backends):
+    dead = free_port()
+    client = LLMClient([url(dead), url(backends[0])], "mock", concurrency=2)
+    prompts = [f"prompt {i}" for i in range(6)]
+    try:
+        answers, failures = ask_all(client, prompts)
+        report = client.report()
+    finally:
+        client.close()
+
+    assert not failures
+    assert all(f"Mock response ({backends[0]})" in answer for _, answer in answers)
+    assert report[0]["failures"] >= 1
+    assert report[1]["requests"] - report[1]["failures"] == len(prompts)
+
+
+def test_streamed_answers_leave_no_spool(backends, tmp_path):
+    spool = tmp_path / "spool"
+    client = LLMClient([url(p) for p in backends], "mock", concurrency=2, stream=True, spool_dir=str(spool))
+    prompts = ["same prompt"] * 4 + ["other prompt"]
+    try:
+        answers, failures = ask_all(client, prompts)
+        report = client.report()
+    finally:
+        client.close()
+
+    assert not failures
+    assert all(answer.startswith("# Mock response") and f"\n{prompt}\n" in answer for prompt, answer in answers)
+    assert all(row["ttft_s"] is not None for row in report if row["requests"])
+    assert not list(spool.glob("*.part"))
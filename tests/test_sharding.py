@@ -0,0 +1,95 @@
+# Firmware Lens - A tool for firmware architecture analysis and documentation.
+# Copyright (C) 2026 Luca Miliciani
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Sharded extraction (`--shard I/N` in N processes, then `--merge-shards N`)
+must produce the same artifacts as one sequential run.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from synth_project import SynthSpec, generate
+
+RUNNER = ROOT / "extractor" / "pipeline_runner.py"
+SHARDS = 3
+ARTIFACTS = ["functions_index", "call_graph", "tasks", "task_call_graph"]
+
+
+def run(config_path, *extra):
+    subprocess.run([sys.executable, str(RUNNER), "--config", str(config_path), *extra],
+                   check=True, capture_output=True, text=True)
+
+
+@pytest.fixture(scope="module")
+def project(tmp_path_factory, libclang):
+    root = tmp_path_factory.mktemp("synth")
+    config_path = generate(str(root), SynthSpec(kind="compile_commands", files=12, functions=4, threads=3),
+                           libclang)
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    # Same project, second artifact directory for the sequential reference run
+    analysis = str(root / "analysis")
+    sequential = {k: v.replace(analysis, analysis + "_seq") if isinstance(v, str) else v
+                  for k, v in config.items()}
+    sequential_path = root / "config_seq.json"
+    sequential_path.write_text(json.dumps(sequential), encoding="utf-8")
+    return config, config_path, sequential, sequential_path
+
+
+def load(config, key):
+    with open(config[key], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_shards_merge_to_sequential_result(project):
+    config, config_path, sequential, sequential_path = project
+    run(sequential_path)
+
+    shards = [
+        subprocess.Popen([sys.executable, str(RUNNER), "--config", str(config_path), "--shard", f"{i}/{SHARDS}"],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        for i in range(1, SHARDS + 1)
+    ]
+    for shard in shards:
+        _, err = shard.communicate(timeout=300)
+        assert shard.returncode == 0, err
+    run(config_path, "--merge-shards", str(SHARDS))
+
+    for key in ARTIFACTS:
+        assert load(config, key) == load(sequential, key), key
+    assert load(config, "functions_index"), "the synthetic project produced no functions"
+
+    ir, reference = load(config, "firmware_ir"), load(sequential, "firmware_ir")
+    for section in ("functions", "call_graph", "tasks"):
+        assert ir[section] == reference[section], section
+
+
+def test_each_tu_is_in_exactly_one_shard(project):
+    from pipeline.sharding import partition
+
+    config, *_ = project
+    entries = load(config, "compile_commands")
+    shards = partition(entries, SHARDS)
+    assigned = sorted(i for shard in shards for i in shard)
+    assert assigned == list(range(len(entries)))
+    assert all(shards)